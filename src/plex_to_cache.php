@@ -13,12 +13,23 @@ $ptc_cfg = [
     "CLEANUP_MODE" => "none", "MOVIE_DELETE_DELAY" => "1800", "EPISODE_KEEP_PREVIOUS" => "2",
     "CACHE_MAX_DAYS" => "7", "EXCLUDE_DIRS" => "", "MEDIA_FILETYPES" => ".mkv .mp4 .avi",
     "ARRAY_ROOT" => "/mnt/user", "CACHE_ROOT" => "/mnt/cache", "DOCKER_MAPPINGS" => "",
+    "ENABLE_NOTIFICATIONS" => "True", "ENABLE_WEBHOOK" => "False", "WEBHOOK_PORT" => "8765",
+    "WEBHOOK_TOKEN" => "", "WEBHOOK_BIND" => "",
     "ENABLE_EPISODE_BATCHING" => "False", "EPISODE_BATCH_SIZE" => "30",
     "EPISODE_BATCH_TOLERANCE" => "10", "EPISODE_BATCH_PREFETCH" => "4",
-    "ENABLE_CACHE_EVICTION" => "True", "ENABLE_NEXT_SEASON_PREFETCH" => "False"
+    "ENABLE_CACHE_EVICTION" => "True", "EVICTION_POLICY" => "fifo",
+    "RECLAIM_HIGH_PCT" => "0", "RECLAIM_LOW_PCT" => "65", "ENABLE_NEXT_SEASON_PREFETCH" => "False",
+    "COPY_WORKERS" => "2", "COPY_PER_DISK" => "1", "COPY_ENGINE" => "native",
+    "ARRAY_DISKS" => "", "TRACKING_BACKEND" => "text",
+    "WARM_AHEAD_MB" => "256", "WARM_BUDGET_MB" => "1024",
+    "COPY_RATE_LIMIT_MB" => "0", "MOVE_RATE_LIMIT_MB" => "0", "STREAM_RATE_LIMIT_MB" => "0",
+    "FULL_SPEED_WINDOW" => "", "ENABLE_IO_GOVERNOR" => "False",
+    "GOVERNOR_PSI_THROTTLE" => "25", "GOVERNOR_PSI_PAUSE" => "60",
+    "GOVERNOR_UTIL_THROTTLE" => "80", "GOVERNOR_UTIL_PAUSE" => "95"
 ];
 
 $ptc_tracked_file  = "/boot/config/plugins/$ptc_plugin/cached_files.list";
+$ptc_tracked_db    = "/boot/config/plugins/$ptc_plugin/cached_files.db";
 $ptc_status_file   = "/var/run/plex_to_cache.status.json";
 $ptc_request_file  = "/var/run/plex_to_cache.flush";
 $ptc_daemon_script = "/usr/local/emhttp/plugins/$ptc_plugin/plex_to_cache.py";
@@ -107,15 +118,52 @@ function ptc_media_under($dir, $cap = 0) {
     return $out;
 }
 
-/** The tracked list as path => timestamp. */
+/** One tracked-list entry, "path|timestamp|size" or the older
+ *  "path|timestamp", as [path, timestamp]; null if it is neither. */
+function ptc_tracked_entry($text) {
+    $parts = explode('|', $text);
+    if (count($parts) >= 3 && ctype_digit(end($parts))) array_pop($parts);
+    if (count($parts) < 2) return null;
+    $ts = array_pop($parts);
+    return [implode('|', $parts), (float)$ts];
+}
+
+/** The tracked list as path => timestamp: the snapshot, with the changes the
+ *  service has journalled since its last compaction applied on top - or the
+ *  database, when the service keeps it in SQLite. */
 function ptc_tracked() {
-    global $ptc_tracked_file;
+    global $ptc_tracked_file, $ptc_tracked_db, $ptc_cfg;
     $out = [];
-    if (!is_readable($ptc_tracked_file)) return $out;
-    foreach (file($ptc_tracked_file, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES) as $line) {
-        $pos = strrpos($line, '|');
-        if ($pos === false) { $out[$line] = 0; continue; }
-        $out[substr($line, 0, $pos)] = (float)substr($line, $pos + 1);
+    if ($ptc_cfg['TRACKING_BACKEND'] === 'sqlite' && class_exists('SQLite3') && is_readable($ptc_tracked_db)) {
+        try {
+            $db = new SQLite3($ptc_tracked_db, SQLITE3_OPEN_READONLY);
+            $db->busyTimeout(2000);
+            $res = $db->query('SELECT path, cached_at FROM tracked');
+            while ($res && ($row = $res->fetchArray(SQLITE3_NUM))) $out[$row[0]] = (float)$row[1];
+            $db->close();
+            return $out;
+        } catch (Exception $e) {
+            // Fall through: right after switching back, the text list is current.
+        }
+    }
+    if (is_readable($ptc_tracked_file)) {
+        foreach (file($ptc_tracked_file, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES) as $line) {
+            $entry = ptc_tracked_entry($line);
+            if ($entry === null) { $out[$line] = 0; continue; }
+            $out[$entry[0]] = $entry[1];
+        }
+    }
+    $journal = $ptc_tracked_file . '.journal';
+    if (is_readable($journal)) {
+        foreach (file($journal, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES) as $line) {
+            $op = $line[0]; $rest = substr($line, 1);
+            if ($op === '+') {
+                $entry = ptc_tracked_entry($rest);
+                if ($entry !== null) $out[$entry[0]] = $entry[1];
+            } elseif ($op === '-') {
+                unset($out[$rest]);
+            }
+        }
     }
     return $out;
 }
@@ -824,9 +872,46 @@ table.ptc-list td[colspan] { white-space: normal; overflow-wrap: anywhere; }
 
             <div class="section-header"><i class="fa fa-cogs"></i> Tuning</div>
             <div class="form-pair"><label data-tooltip="Interval in seconds to check for active streams.">Interval:</label><div class="form-input-wrapper"><input type="number" name="CHECK_INTERVAL" value="<?= htmlspecialchars($ptc_cfg['CHECK_INTERVAL']) ?>" class="ptc-input input-small"><span class="unit-label">sec</span></div></div>
+            <div class="form-pair"><label data-tooltip="Listen for play and stop notifications from Plex, Emby and Jellyfin. A new stream is picked up right away, and while nothing plays the servers are asked only every few minutes instead of every Interval.">Notifications:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_NOTIFICATIONS" value="True" <?= $ptc_cfg['ENABLE_NOTIFICATIONS'] == 'True' ? 'checked' : '' ?>></div></div>
+            <div class="form-pair"><label data-tooltip="Accept playback webhooks on this port, so a stream is acted on the moment it starts. Point the webhook of Plex (Plex Pass), Emby or the Jellyfin webhook plugin at http://&lt;this server&gt;:&lt;port&gt;/?token=&lt;token&gt;. Does not start without a token.">Webhook:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_WEBHOOK" value="True" <?= $ptc_cfg['ENABLE_WEBHOOK'] == 'True' ? 'checked' : '' ?>><input type="number" name="WEBHOOK_PORT" value="<?= htmlspecialchars($ptc_cfg['WEBHOOK_PORT']) ?>" class="ptc-input input-small"><span class="unit-label">port</span></div></div>
+            <div class="form-pair expand-row"><label data-tooltip="Secret every webhook must carry, as ?token= in its URL or an X-Webhook-Token header.">Webhook Token:</label><div class="form-input-wrapper"><input type="password" name="WEBHOOK_TOKEN" value="<?= htmlspecialchars($ptc_cfg['WEBHOOK_TOKEN']) ?>" class="ptc-input" onmouseover="this.type='text'" onmouseout="this.type='password'" autocomplete="new-password"></div></div>
+            <div class="form-pair expand-row"><label data-tooltip="Only listen for webhooks on this address of the server. Empty listens on all of them.">Webhook Address:</label><div class="form-input-wrapper"><input type="text" name="WEBHOOK_BIND" value="<?= htmlspecialchars($ptc_cfg['WEBHOOK_BIND']) ?>" placeholder="all" class="ptc-input"></div></div>
             <div class="form-pair"><label data-tooltip="Delay before starting to copy files.">Copy Delay:</label><div class="form-input-wrapper"><input type="number" name="COPY_DELAY" value="<?= htmlspecialchars($ptc_cfg['COPY_DELAY']) ?>" class="ptc-input input-small"><span class="unit-label">sec</span></div></div>
             <div class="form-pair"><label data-tooltip="Maximum cache usage percentage before stopping copies.">Max Cache:</label><div class="form-input-wrapper"><input type="number" name="CACHE_MAX_USAGE" value="<?= htmlspecialchars($ptc_cfg['CACHE_MAX_USAGE']) ?>" class="ptc-input input-small"><span class="unit-label">%</span></div></div>
-            <div class="form-pair"><label data-tooltip="When the cache is full, move the oldest plugin-cached files back to the array to make room for the currently streamed media (LRU). Active streams and queued files are never evicted.">Eviction:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_CACHE_EVICTION" value="True" <?= $ptc_cfg['ENABLE_CACHE_EVICTION'] == 'True' ? 'checked' : '' ?>></div></div>
+            <div class="form-pair"><label data-tooltip="When the cache is full, move plugin-cached files back to the array to make room for the currently streamed media, in the order the Policy setting gives. Active streams and queued files are never evicted.">Eviction:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_CACHE_EVICTION" value="True" <?= $ptc_cfg['ENABLE_CACHE_EVICTION'] == 'True' ? 'checked' : '' ?>></div></div>
+            <div class="form-pair"><label data-tooltip="Which cached files eviction and days-based cleanup pick first. Oldest copy: cached longest ago. Least recently played: played longest ago (days-based cleanup then counts the days from the last play). Least often played: recent plays count more than old ones. Size-aware: like least often played, but a large film goes before several small episodes. Adaptive (ARC): balances files played once against files played again, learning from files played soon after being evicted. Whatever the policy, files whose array copy is missing are evicted last.">Policy:</label><div class="form-input-wrapper"><select name="EVICTION_POLICY" class="ptc-input input-small">
+                <option value="fifo" <?= $ptc_cfg['EVICTION_POLICY'] == 'fifo' ? 'selected' : '' ?>>Oldest copy</option>
+                <option value="lru" <?= $ptc_cfg['EVICTION_POLICY'] == 'lru' ? 'selected' : '' ?>>Least recently played</option>
+                <option value="lfu" <?= $ptc_cfg['EVICTION_POLICY'] == 'lfu' ? 'selected' : '' ?>>Least often played</option>
+                <option value="gdsf" <?= $ptc_cfg['EVICTION_POLICY'] == 'gdsf' ? 'selected' : '' ?>>Size-aware</option>
+                <option value="arc" <?= $ptc_cfg['EVICTION_POLICY'] == 'arc' ? 'selected' : '' ?>>Adaptive (ARC)</option>
+            </select></div></div>
+            <div class="form-pair"><label data-tooltip="Evict in the background once the cache - counting copies still waiting in the queue - is this full, until it is back down to the low mark. New copies then normally find room straight away instead of waiting for other files to be moved back first. 0 as the high mark turns this off; eviction then only happens when a copy does not fit.">Free Up At:</label><div class="form-input-wrapper"><input type="number" min="0" max="100" name="RECLAIM_HIGH_PCT" value="<?= htmlspecialchars($ptc_cfg['RECLAIM_HIGH_PCT']) ?>" class="ptc-input input-small"><span class="unit-label">%</span></div></div>
+            <div class="form-pair"><label data-tooltip="Background eviction stops once the cache, with queued copies, is down to this.">Free Up To:</label><div class="form-input-wrapper"><input type="number" min="0" max="100" name="RECLAIM_LOW_PCT" value="<?= htmlspecialchars($ptc_cfg['RECLAIM_LOW_PCT']) ?>" class="ptc-input input-small"><span class="unit-label">%</span></div></div>
+
+            <div class="form-pair"><label data-tooltip="How many files may be copied to the cache at the same time. Copies from different array disks run side by side.">Copy Workers:</label><div class="form-input-wrapper"><input type="number" min="1" name="COPY_WORKERS" value="<?= htmlspecialchars($ptc_cfg['COPY_WORKERS']) ?>" class="ptc-input input-small"><span class="unit-label">files</span></div></div>
+            <div class="form-pair"><label data-tooltip="How many of those copies may read from the same array disk. 1 keeps a disk from seeking between two files at once.">Per Disk:</label><div class="form-input-wrapper"><input type="number" min="1" name="COPY_PER_DISK" value="<?= htmlspecialchars($ptc_cfg['COPY_PER_DISK']) ?>" class="ptc-input input-small"><span class="unit-label">files</span></div></div>
+
+            <div class="form-pair"><label data-tooltip="Built-in copies files inside the service and reports progress. rsync starts one rsync process per file, as earlier versions did. Every transfer logs its speed, so the two can be compared.">Engine:</label><div class="form-input-wrapper"><select name="COPY_ENGINE" class="ptc-input input-small">
+                <option value="native" <?= $ptc_cfg['COPY_ENGINE'] != 'rsync' ? 'selected' : '' ?>>Built-in</option>
+                <option value="rsync" <?= $ptc_cfg['COPY_ENGINE'] == 'rsync' ? 'selected' : '' ?>>rsync</option>
+            </select></div></div>
+            <div class="form-pair expand-row"><label data-tooltip="Copies read from, and moves write to, the array disk holding the folder instead of going through the /mnt/user share, which is considerably faster. Leave blank to use every /mnt/diskN; list disks (separated by spaces) to limit it. Files no listed disk has go through the share as before.">Array Disks:</label><div class="form-input-wrapper"><input type="text" name="ARRAY_DISKS" value="<?= htmlspecialchars($ptc_cfg['ARRAY_DISKS']) ?>" placeholder="all /mnt/diskN" class="ptc-input"></div></div>
+            <div class="form-pair"><label data-tooltip="Where the list of files the plugin cached is kept. The text list is fine for a few thousand files; SQLite keeps it indexed, so eviction, cleanup and the status page stay quick on a cache with many more. Switching moves the list over by itself.">Tracking:</label><div class="form-input-wrapper"><select name="TRACKING_BACKEND" class="ptc-input input-small">
+                <option value="text" <?= $ptc_cfg['TRACKING_BACKEND'] != 'sqlite' ? 'selected' : '' ?>>Text list</option>
+                <option value="sqlite" <?= $ptc_cfg['TRACKING_BACKEND'] == 'sqlite' ? 'selected' : '' ?>>SQLite</option>
+            </select></div></div>
+
+            <div class="form-pair"><label data-tooltip="While a stream still plays from the array, read this far ahead of the playback position into RAM so playback stays smooth until the cached copy takes over. 0 turns it off.">Read-ahead:</label><div class="form-input-wrapper"><input type="number" min="0" name="WARM_AHEAD_MB" value="<?= htmlspecialchars($ptc_cfg['WARM_AHEAD_MB']) ?>" class="ptc-input input-small"><span class="unit-label">MB</span></div></div>
+
+            <div class="form-pair"><label data-tooltip="The most read-ahead held in RAM for all uncached streams together; each gets an equal share, up to the read-ahead above. 0 turns it off.">Read-ahead Budget:</label><div class="form-input-wrapper"><input type="number" min="0" name="WARM_BUDGET_MB" value="<?= htmlspecialchars($ptc_cfg['WARM_BUDGET_MB']) ?>" class="ptc-input input-small"><span class="unit-label">MB</span></div></div>
+
+            <div class="section-header"><i class="fa fa-tachometer"></i> Transfer Limits</div>
+            <div class="form-pair"><label data-tooltip="Maximum speed for copies from the array to the cache. 0 = unlimited.">To Cache:</label><div class="form-input-wrapper"><input type="number" min="0" name="COPY_RATE_LIMIT_MB" value="<?= htmlspecialchars($ptc_cfg['COPY_RATE_LIMIT_MB']) ?>" class="ptc-input input-small"><span class="unit-label">MB/s</span></div></div>
+            <div class="form-pair"><label data-tooltip="Maximum speed for moves from the cache back to the array. 0 = unlimited.">To Array:</label><div class="form-input-wrapper"><input type="number" min="0" name="MOVE_RATE_LIMIT_MB" value="<?= htmlspecialchars($ptc_cfg['MOVE_RATE_LIMIT_MB']) ?>" class="ptc-input input-small"><span class="unit-label">MB/s</span></div></div>
+            <div class="form-pair"><label data-tooltip="A stricter limit for all transfers while anything is being streamed, so a flush or a batch does not starve a viewer reading from the same disk. 0 = no extra limit.">While Streaming:</label><div class="form-input-wrapper"><input type="number" min="0" name="STREAM_RATE_LIMIT_MB" value="<?= htmlspecialchars($ptc_cfg['STREAM_RATE_LIMIT_MB']) ?>" class="ptc-input input-small"><span class="unit-label">MB/s</span></div></div>
+            <div class="form-pair expand-row"><label data-tooltip="Times of day when background work (prefetch, batches, emptying the cache, cleanup) runs at full speed, e.g. 02:00-07:00. Several windows are separated by commas.">Full Speed:</label><div class="form-input-wrapper"><input type="text" name="FULL_SPEED_WINDOW" value="<?= htmlspecialchars($ptc_cfg['FULL_SPEED_WINDOW']) ?>" placeholder="02:00-07:00" class="ptc-input"></div></div>
+            <div class="form-pair"><label data-tooltip="Slow transfers down, and pause background work, while the disks are busy with something else (Linux I/O pressure and disk utilisation). Speeds up again when they go quiet.">Back Off:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_IO_GOVERNOR" value="True" <?= $ptc_cfg['ENABLE_IO_GOVERNOR'] == 'True' ? 'checked' : '' ?>></div></div>
 
             <div class="section-header"><i class="fa fa-list-ol"></i> Season Batching</div>
             <div class="form-pair"><label data-tooltip="For long seasons, only cache one batch of episodes at a time instead of the whole season. The next batch starts copying automatically shortly before the current one runs out.">Enable:</label><div class="form-input-wrapper"><input type="checkbox" name="ENABLE_EPISODE_BATCHING" value="True" <?= $ptc_cfg['ENABLE_EPISODE_BATCHING'] == 'True' ? 'checked' : '' ?> onchange="updateBatchingUI()"></div></div>
@@ -926,10 +1011,45 @@ function refreshStatus() {
         if (!d || !d.updated) { $('#ptc-status').text(''); return; }
         var parts = [];
         parts.push('Cached: ' + d.cached_files + ' files / ' + (d.cached_bytes / 1073741824).toFixed(1) + ' GB');
-        if (d.cache_usage_pct !== null && d.cache_usage_pct !== undefined) parts.push('Cache used: ' + d.cache_usage_pct + '%');
-        parts.push('Queue: ' + d.queue_length);
-        if (d.copying) parts.push('Copying: ' + d.copying);
+        if (d.cache_usage_pct !== null && d.cache_usage_pct !== undefined) {
+            parts.push('Cache used: ' + d.cache_usage_pct + '%'
+                       + (d.reserved_bytes ? ' (+' + ptcBytes(d.reserved_bytes) + ' reserved for copies)' : ''));
+        }
+        parts.push('Queue: ' + d.queue_length
+                   + (d.queue_length && d.queue_eta ? ' (~' + ptcDuration(d.queue_eta) + ')' : ''));
+        if (d.transfers && d.transfers.length) {
+            parts.push('Copying: ' + d.transfers.map(function(t) {
+                return t.file + (t.size ? ' (' + Math.floor(t.done_bytes * 100 / t.size) + '%'
+                                 + (t.eta ? ', ' + ptcDuration(t.eta) + ' left' : '') + ')' : '');
+            }).join(', '));
+        } else if (d.copying && d.copying.length) {
+            parts.push('Copying: ' + [].concat(d.copying).join(', '));
+        }
+        if (d.qos && d.qos.rate) parts.push('Rate: ' + ptcBytes(d.qos.rate) + '/s'
+                                            + (d.qos.copy_cap ? ' (cap ' + ptcBytes(d.qos.copy_cap) + '/s)' : ''));
+        if (d.governor && d.governor.enabled && d.governor.state !== 'full') {
+            parts.push('Backing off: ' + d.governor.state
+                       + (d.governor.state === 'throttled' ? ' ' + Math.round(d.governor.factor * 100) + '%' : '')
+                       + ' (' + d.governor.reason + ')');
+        }
+        if (d.suspended && d.suspended.length) {
+            parts.push('Suspended: ' + d.suspended.map(function(t) {
+                return t.file + (t.size ? ' (' + Math.floor(t.done_bytes * 100 / t.size) + '%)' : '');
+            }).join(', '));
+        }
+        if (d.deferred) parts.push('Waiting for a sleeping disk: ' + d.deferred);
+        if (d.reclaim && d.reclaim.high !== null) {
+            parts.push((d.reclaim.active ? 'Freeing up space' : 'Free up at')
+                       + ' ' + d.reclaim.high + '% → ' + d.reclaim.low + '%'
+                       + (d.reclaim.files ? ' (' + d.reclaim.files + ' files / ' + ptcBytes(d.reclaim.bytes) + ' so far)' : ''));
+        }
         if (d.active_streams && d.active_streams.length) parts.push('Streams: ' + d.active_streams.length);
+        if (d.notify) {
+            var listening = Object.keys(d.notify).filter(function(k) { return d.notify[k].connected; });
+            if (listening.length) parts.push('Notifications: ' + listening.join(', '));
+        }
+        if (d.webhook) parts.push('Webhook: port ' + d.webhook.port + ', ' + d.webhook.received + ' events'
+                                  + (d.webhook.dropped ? ', ' + d.webhook.dropped + ' dropped' : ''));
 
         var f = d.flush;
         if (f && f.active) {
@@ -955,6 +1075,12 @@ function ptcBytes(n) {
     return (n / 1024).toFixed(0) + ' KB';
 }
 
+function ptcDuration(s) {
+    if (s >= 3600) return Math.floor(s / 3600) + 'h ' + Math.round((s % 3600) / 60) + 'm';
+    if (s >= 60)   return Math.round(s / 60) + ' min';
+    return Math.max(1, Math.round(s)) + 's';
+}
+
 var ptcBrowsePath = '';   // '' = the list of mapped media folders
 
 function refreshCached() { browseCache(ptcBrowsePath); }
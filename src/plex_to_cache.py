@@ -13,12 +13,21 @@ daemon would need internet on every boot to reinstall it.
 Architecture:
   - Main thread: polls media server APIs, decides what should be cached,
     runs cleanup. Never blocks on file transfers.
-  - Copy worker thread: processes the copy queue one file at a time, so a
+  - Copy worker threads: a small pool drains the copy queue. At most
+    COPY_WORKERS transfers run at once and at most COPY_PER_DISK of them read
+    from the same array disk, so copies from independent disks proceed in
+    parallel while one spindle never serves two competing readers. A
     multi-gigabyte rsync never stalls stream detection.
 """
 
 import os
 import sys
+import abc
+import base64
+import hashlib
+import hmac
+import socket
+import struct
 import re
 import time
 import json
@@ -28,12 +37,25 @@ import logging
 from logging.handlers import RotatingFileHandler
 import shutil
 import signal
-import queue
 import threading
 import subprocess
-import urllib.request
+import glob
+import errno
+import stat
+import heapq
+from collections import OrderedDict
+try:
+    import sqlite3
+except ImportError:     # a Python built without it can still use the text list
+    sqlite3 = None
+import concurrent.futures
+import email.parser
+import gzip
+import http.client
+import http.server
+import queue
 import urllib.parse
-import urllib.error
+import zlib
 from pathlib import Path
 
 # =============================================================================
@@ -42,22 +64,74 @@ from pathlib import Path
 
 CONFIG_FILE   = "/boot/config/plugins/plex_to_cache/settings.cfg"
 TRACKED_FILES = "/boot/config/plugins/plex_to_cache/cached_files.list"
+THROUGHPUT_FILE = "/boot/config/plugins/plex_to_cache/throughput.json"
+ACCESS_FILE   = "/boot/config/plugins/plex_to_cache/access.json"
+RECONCILE_INDEX = "/boot/config/plugins/plex_to_cache/reconcile_index.json"
+TRACKED_DB    = "/boot/config/plugins/plex_to_cache/cached_files.db"
+TRACKED_COMPACT_LINES = 1000      # journal lines after which the tracked list is rewritten
+TRACKED_COMPACT_EVERY = 6 * 3600  # ... and the longest the journal is left to grow
+TRACKED_VERIFY_BATCH  = 50        # tracked files re-checked against the cache per reclaimer pass
+RECONCILE_WORKERS     = 4         # mapped cache folders scanned side by side at startup
 LOCK_FILE     = "/tmp/media_cache_cleaner.lock"
 LOG_FILE      = "/var/log/plex_to_cache.log"
 LOG_MAX_BYTES = 5 * 1024 * 1024   # rotate when the log reaches 5 MB
 ARRAY_ROOT    = "/mnt/user0"      # physical array path (no cache) — used for permission cloning
+DISK_MOUNTS   = "/mnt/disk[0-9]*" # the individual array disks behind the user shares
+PROC_PRESSURE_IO = "/proc/pressure/io"  # Linux PSI for block I/O
+PROC_DISKSTATS   = "/proc/diskstats"
+PROC_MOUNTS      = "/proc/mounts"
+EMHTTP_DISKS_INI = "/var/local/emhttp/disks.ini"  # Unraid's view of the array, incl. spin state
 
 RSYNC_RETRIES        = 3          # attempts per file before giving up
 RSYNC_RETRY_DELAY    = 5          # seconds between attempts
 COPY_FAIL_COOLDOWN   = 300        # seconds before re-trying a file that failed all attempts
-METADATA_CACHE_LIMIT = 500        # max entries kept in the Plex ratingKey→path cache
+COPY_CHUNK           = 64 * 1024 * 1024  # bytes per copy_file_range/sendfile call
+COPY_BUFFER          = 8 * 1024 * 1024   # read/write buffer when neither is available
+METADATA_CACHE_LIMIT = 500        # max entries kept in the Plex ratingKey→metadata cache
+METADATA_TTL         = 24 * 3600  # seconds a cached Plex lookup stays valid
+METADATA_NEGATIVE_TTL = 600       # ... and one that found no file
+HTTP_MAX_REDIRECTS   = 3          # redirects an API request follows, like urllib did
+POLL_DEADLINE        = 6          # seconds a pass waits for the media servers to answer
+POLL_SLOW            = 2          # a server taking longer than this to answer gets logged
+NOTIFY_POLL_INTERVAL = 300        # seconds between polls while notifications arrive and nothing plays
+NOTIFY_KEEPALIVE     = 30         # seconds of silence on a notification socket before a keepalive
+NOTIFY_BACKOFF_MIN   = 5          # seconds before reconnecting a dropped notification socket ...
+NOTIFY_BACKOFF_MAX   = 300        # ... doubling per failed attempt up to this
+NOTIFY_MAX_MESSAGE   = 4 * 1024 * 1024  # a notification larger than this drops the connection
+WEBHOOK_MAX_BODY     = 2 * 1024 * 1024  # largest webhook accepted (Plex attaches a thumbnail)
+WEBHOOK_QUEUE        = 100        # webhook events waiting for the main loop before more are refused
+WEBHOOK_GRACE        = 60         # seconds a webhook's stream counts before a poll has to confirm it
 
 STATUS_FILE          = "/var/run/plex_to_cache.status.json"  # snapshot for the web UI
 FLUSH_REQUEST        = "/var/run/plex_to_cache.flush"        # web UI asks for a full flush
+METADATA_CACHE_FILE  = "/var/run/plex_to_cache.metadata.json" # Plex lookups kept over a restart
 STATUS_INTERVAL      = 30         # seconds between status snapshots
 EVICT_MAX_FILES      = 25         # max files moved back per eviction pass
+EVICT_WARN_EVERY     = 3600       # seconds before the same shortfall is logged again
+CACHE_HEADROOM       = 512 * 1024 * 1024  # free space always left on the cache
+RECLAIM_INTERVAL     = 60         # seconds between background checks of cache usage
+RECLAIM_STUCK_RETRY  = 900        # seconds before retrying a reclaim that could not reach the low mark
+COPY_AGING_SECONDS   = 600        # queued this long, a copy counts one priority level more urgent
+COPY_BATCH_MAX       = 64         # files from one folder that go over in a single transfer
 MOVE_MIN_AGE         = 30 * 60    # a file written this recently is left where it is
 WATCHED_MIN_PROGRESS = 0.90       # session progress at which media counts as watched
+WARM_INTERVAL        = 5          # seconds between page-cache read-ahead passes
+WARM_MAX_STREAMS     = 6          # more uncached streams than this and read-ahead stops
+GOVERNOR_SAMPLE      = 2          # seconds between I/O pressure samples
+GOVERNOR_FOREIGN_MIN = 0.25       # share of a disk's traffic that must be someone else's
+GOVERNOR_URGENT_MIN  = 0.25       # the playing file's copy never drops below this speed factor
+STANDBY_REFRESH      = 10         # seconds a read of the disks' spin state stays valid
+DISK_MISS_TTL        = 60         # seconds a file no array disk had is not looked for again
+THROUGHPUT_ALPHA     = 0.3        # weight of the latest transfer in a device pair's speed estimate
+THROUGHPUT_MIN_BYTES = 64 * 1024 * 1024  # smaller transfers say more about latency than speed
+THROUGHPUT_SAVE_EVERY = 900       # seconds between writes of the speed estimates to flash
+TIMEOUT_BASE         = 120        # seconds a transfer gets on top of its expected duration
+TIMEOUT_FACTOR       = 3          # ... and how many times the expected duration it may take
+ACCESS_HALF_LIFE     = 14 * 86400 # a play counts half as much for LFU/GDSF after this long
+ACCESS_MAX_ENTRIES   = 20000      # files the play history remembers, least recently played dropped
+ACCESS_SAVE_EVERY    = 900        # seconds between writes of the play history to flash
+COPY_BACK_COST       = 4          # evicting a file with no array original costs this much more
+ARC_STEP             = 0.05       # how far one ghost hit moves ARC's recent/frequent balance
 
 DEFAULT_CONFIG = {
     "ENABLE_PLEX": "False", "PLEX_URL": "http://localhost:32400", "PLEX_TOKEN": "",
@@ -67,36 +141,93 @@ DEFAULT_CONFIG = {
     "CLEANUP_MODE": "none", "MOVIE_DELETE_DELAY": "1800", "EPISODE_KEEP_PREVIOUS": "2",
     "CACHE_MAX_DAYS": "7", "EXCLUDE_DIRS": "", "MEDIA_FILETYPES": ".mkv .mp4 .avi",
     "ARRAY_ROOT": "/mnt/user", "CACHE_ROOT": "/mnt/cache", "DOCKER_MAPPINGS": "",
+    # Listen for play/stop notifications from the media servers, so a new
+    # stream is seen right away and idle servers are polled rarely.
+    "ENABLE_NOTIFICATIONS": "True",
+    # Accept play/stop webhooks from the media servers on this port. They
+    # must carry WEBHOOK_TOKEN as ?token= or an X-Webhook-Token header; the
+    # listener does not start without one. WEBHOOK_BIND limits it to one
+    # address (empty: all).
+    "ENABLE_WEBHOOK": "False",
+    "WEBHOOK_PORT": "8765",
+    "WEBHOOK_TOKEN": "",
+    "WEBHOOK_BIND": "",
     # Season batching: for very long seasons, cache episodes in batches
     # instead of the whole season at once.
     "ENABLE_EPISODE_BATCHING": "False",
     "EPISODE_BATCH_SIZE": "30",        # episodes per batch
     "EPISODE_BATCH_TOLERANCE": "10",   # if the leftover after a batch is <= this, merge it in
     "EPISODE_BATCH_PREFETCH": "4",     # start next batch when this many episodes remain in the current one
-    # When the cache is full, move the oldest plugin-cached files back to
-    # the array to make room for the currently streamed media.
+    # When the cache is full, move plugin-cached files back to the array
+    # to make room for the currently streamed media.
     "ENABLE_CACHE_EVICTION": "True",
+    # Which files eviction and days-based cleanup pick: "fifo" (cached
+    # longest ago), "lru" (played longest ago), "lfu" (played least often,
+    # recent plays counting more), "gdsf" (like lfu, but large files go
+    # first) or "arc" (balances played-once against played-again).
+    "EVICTION_POLICY": "fifo",
+    # Background eviction: once cache usage (counting copies still queued)
+    # reaches the high mark in %, files are moved back until it is down to
+    # the low mark, so copies normally find room without waiting. Usage is
+    # that of the whole pool. 0 (the default) turns it off; eviction then
+    # only happens when a copy does not fit.
+    "RECLAIM_HIGH_PCT": "0",
+    "RECLAIM_LOW_PCT": "65",
     # Near the end of a season, pre-cache the beginning of the next season.
     "ENABLE_NEXT_SEASON_PREFETCH": "False",
+    # Parallel copies: total transfers at once, and how many of them may read
+    # from the same array disk.
+    "COPY_WORKERS": "2",
+    "COPY_PER_DISK": "1",
+    # Transfer engine: "native" copies in-process (copy_file_range, sendfile or
+    # plain read/write), "rsync" spawns rsync per file as before.
+    "COPY_ENGINE": "native",
+    # Array disk mounts to read from and write to directly instead of through
+    # the /mnt/user share (space-separated). Blank: every /mnt/diskN.
+    "ARRAY_DISKS": "",
+    # Where the list of cached files is kept: "text" (cached_files.list) or
+    # "sqlite" (cached_files.db, indexed - for caches with many thousands of
+    # files). Switching migrates the list once.
+    "TRACKING_BACKEND": "text",
+    # Read-ahead for streams whose copy has not finished yet: how far ahead of
+    # the playback position to pull into RAM, and the total across all streams.
+    "WARM_AHEAD_MB": "256",
+    "WARM_BUDGET_MB": "1024",
+    # Transfer speed caps in MB/s (0 = unlimited): copies to cache, moves back
+    # to the array, and a stricter cap for both while anything is streaming.
+    "COPY_RATE_LIMIT_MB": "0",
+    "MOVE_RATE_LIMIT_MB": "0",
+    "STREAM_RATE_LIMIT_MB": "0",
+    # Times of day when background work (prefetch, batches, flush, cleanup)
+    # ignores the caps above, e.g. "02:00-07:00" or "01:00-06:00,13:00-14:00".
+    "FULL_SPEED_WINDOW": "",
+    # Back off when the disks are busy with something else, going by Linux
+    # I/O pressure (%) and disk utilisation (%): slow down at the first
+    # threshold, pause background work at the second.
+    "ENABLE_IO_GOVERNOR": "False",
+    "GOVERNOR_PSI_THROTTLE": "25",
+    "GOVERNOR_PSI_PAUSE": "60",
+    "GOVERNOR_UTIL_THROTTLE": "80",
+    "GOVERNOR_UTIL_PAUSE": "95",
 }
 
 # Runtime state
 config          = dict(DEFAULT_CONFIG)
 docker_mappings = {}
-metadata_cache  = {}
 stream_timers   = {}
 deletion_queue  = {}
 move_queue      = []               # paths the web UI asked to move, oldest first
 failed_copies   = {}               # cache_path -> timestamp of last failed attempt
 active_cache_paths = set()         # cache paths of currently streamed files (never evicted)
 
-# Copy worker state
-copy_queue      = queue.Queue()
+# Copy worker state (copy_queue itself is created below CopyQueue)
 _pending_copies = set()            # array paths queued or currently copying
 _pending_lock   = threading.Lock()
-_current_copy   = None             # basename of the file being copied right now
-_current_rsync  = None             # running rsync Popen (for clean shutdown)
+_current_copies = {}               # worker name -> CopyJob it is working on
+_pending_sizes  = {}               # array path -> (disk, bytes), for the queue forecast
+_running_rsync  = set()            # running rsync Popens (for clean shutdown)
 _rsync_lock     = threading.Lock()
+_evict_lock     = threading.Lock() # one eviction pass at a time across workers
 _shutting_down  = threading.Event()
 
 # Manual flush state, shown in the web UI while it runs
@@ -176,77 +307,659 @@ def cfg(key, as_int=False, as_bool=False):
 class TrackedFiles:
     """Manages the list of plugin-cached files with timestamps.
     Thread-safe: accessed by both the main loop (cleanup) and the
-    copy worker (adding freshly cached files)."""
+    copy worker (adding freshly cached files).
+
+    The list is held in memory. TRACKED_FILES on the flash drive is a sorted
+    snapshot, and every change since is appended to a journal next to it -
+    one short line per file instead of re-reading and rewriting the whole list
+    for each copy, which with tens of thousands of entries was a lot of flash
+    I/O. compact() folds the journal back into the snapshot; it runs once the
+    journal reaches TRACKED_COMPACT_LINES, every TRACKED_COMPACT_EVERY seconds
+    from the main loop, and on shutdown. After a crash, load() replays the
+    journal over the snapshot. Replaying is idempotent, so a crash in the
+    middle of a compaction loses nothing either.
+
+    Entries are "path|timestamp|size" - the size as it was when the file was
+    tracked, so the cached total is a running sum rather than a stat of every
+    file for each status snapshot; lists written before sizes were kept have
+    "path|timestamp" and are sized on load. verify() re-checks a few entries
+    per call against the cache, dropping files removed behind our back and
+    correcting sizes, so the total cannot drift for long.
+
+    Journal lines are "+" plus an entry, and "-path". If either file changes
+    behind our back - a --flush run while the service was stopped - the next
+    access reads them again.
+
+    With TRACKING_BACKEND=sqlite everything goes to a TrackingDB instead, and
+    the queries - oldest(), older_than(), under(), total_bytes(), contains() -
+    become indexed lookups rather than passes over the whole list. The first
+    access after switching backends moves the list over once.
+    """
+
+    _lock    = threading.RLock()
+    _entries = None           # path -> timestamp, once read
+    _sizes   = {}             # path -> size in bytes (None: not known)
+    _bytes   = 0              # sum of _sizes
+    _stamp   = None           # what the files looked like when last read or written
+    _pending = 0              # journal lines since the last compaction
+    _sqlite  = None           # open TrackingDB while that backend is selected
+    _cursor  = ""             # where verify() continues
+
+    @staticmethod
+    def _db():
+        """The SQLite store if TRACKING_BACKEND selects it, else None. Opening
+        it the first time imports the text list."""
+        wanted = cfg("TRACKING_BACKEND").strip().lower() == "sqlite"
+        if wanted and sqlite3 is None:
+            log("[Tracking] sqlite3 is not available - using the text list", warn=True)
+            config["TRACKING_BACKEND"] = "text"
+            wanted = False
+        db = TrackedFiles._sqlite
+        if db is not None and (not wanted or db.path != TRACKED_DB):
+            db.close()
+            db = TrackedFiles._sqlite = None
+        if wanted and db is None:
+            db = TrackedFiles._sqlite = TrackingDB(TRACKED_DB)
+            if db.created and (os.path.exists(TRACKED_FILES)
+                               or os.path.exists(TrackedFiles._journal())):
+                TrackedFiles._migrate_to(db)
+            TrackedFiles._entries = None
+        return db
+
+    @staticmethod
+    def _migrate_to(db):
+        """Text list -> a new database. The text files are renamed, not
+        deleted, and would not be read again unless the database went away."""
+        tracked, sizes = TrackedFiles._read()
+        db.replace({p: (ts, sizes.get(p), None) for p, ts in tracked.items()})
+        for path in (TRACKED_FILES, TrackedFiles._journal()):
+            try:
+                os.replace(path, path + ".migrated")
+            except FileNotFoundError:
+                pass
+        log(f"[Tracking] Moved {len(tracked)} entries from {os.path.basename(TRACKED_FILES)} "
+            f"to {os.path.basename(db.path)}")
+
+    @staticmethod
+    def _migrate_from_db():
+        """Back from the database to the text list: the first access with the
+        text backend finding no list, but a database, takes its entries."""
+        if sqlite3 is None or not os.path.exists(TRACKED_DB):
+            return
+        try:
+            db = TrackingDB(TRACKED_DB)
+            tracked = db.all()
+            db.close()
+        except sqlite3.Error as e:
+            log(f"[Tracking] Cannot read {TRACKED_DB}: {e}", error=True)
+            return
+        TrackedFiles.save(tracked)
+        try:
+            os.replace(TRACKED_DB, TRACKED_DB + ".migrated")
+        except OSError:
+            pass
+        log(f"[Tracking] Moved {len(tracked)} entries from {os.path.basename(TRACKED_DB)} "
+            f"to {os.path.basename(TRACKED_FILES)}")
+
+    @staticmethod
+    def _journal():
+        return TRACKED_FILES + ".journal"
 
-    _lock = threading.RLock()
+    @staticmethod
+    def _file_stamp():
+        stamp = [TRACKED_FILES]
+        for path in (TRACKED_FILES, TrackedFiles._journal()):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    @staticmethod
+    def _entry(path, ts, size):
+        return f"{path}|{ts}" if size is None else f"{path}|{ts}|{size}"
+
+    @staticmethod
+    def _parse(text):
+        """"path|timestamp|size" or "path|timestamp" -> (path, ts, size), or
+        None for a line that is neither. A timestamp always has a decimal
+        point and a size never does, which keeps the two apart even for a
+        path containing '|'."""
+        parts = text.rsplit('|', 2)
+        if len(parts) == 3 and parts[2].isdigit():
+            try:
+                return parts[0], float(parts[1]), int(parts[2])
+            except ValueError:
+                pass
+        path, sep, ts = text.rpartition('|')
+        if not sep:
+            return None
+        try:
+            return path, float(ts), None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _read():
+        """Snapshot plus journal, as ({path: timestamp}, {path: size}).
+        Entries without a size are sized here."""
+        tracked, sizes = {}, {}
+        if os.path.exists(TRACKED_FILES):
+            try:
+                for line in Path(TRACKED_FILES).read_text().splitlines():
+                    entry = TrackedFiles._parse(line)
+                    if entry is not None:
+                        path, tracked[path], sizes[path] = entry
+                    elif line.strip():
+                        tracked[line.strip()] = time.time()
+                        sizes[line.strip()] = None
+            except OSError as e:
+                log(f"Tracking load failed: {e}", error=True)
+        replayed = 0
+        try:
+            with open(TrackedFiles._journal()) as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    # A line cut short by a crash has no timestamp, or
+                    # a path nothing was tracked under; either way it is skipped
+                    if line.startswith('+'):
+                        entry = TrackedFiles._parse(line[1:])
+                        if entry is None:
+                            continue
+                        path, tracked[path], sizes[path] = entry
+                    elif line.startswith('-'):
+                        tracked.pop(line[1:], None)
+                        sizes.pop(line[1:], None)
+                    else:
+                        continue
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log(f"Tracking journal load failed: {e}", error=True)
+        TrackedFiles._pending = replayed
+        for path, size in sizes.items():
+            if size is None:
+                sizes[path] = _size_or_none(path)
+        return tracked, sizes
+
+    @staticmethod
+    def _use(tracked, sizes):
+        TrackedFiles._entries = tracked
+        TrackedFiles._sizes   = sizes
+        TrackedFiles._bytes   = sum(size for size in sizes.values() if size)
+
+    @staticmethod
+    def _current():
+        """The in-memory list, read from flash first if it is not loaded yet
+        or the files changed since."""
+        stamp = TrackedFiles._file_stamp()
+        if TrackedFiles._entries is None and stamp[1] is None and stamp[2] is None:
+            TrackedFiles._migrate_from_db()
+            stamp = TrackedFiles._file_stamp()
+        if TrackedFiles._entries is None or stamp != TrackedFiles._stamp:
+            TrackedFiles._use(*TrackedFiles._read())
+            TrackedFiles._stamp = stamp
+        return TrackedFiles._entries
+
+    @staticmethod
+    def _append(lines):
+        """Record changes in the journal - one write for all of lines."""
+        try:
+            with open(TrackedFiles._journal(), 'a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+        except OSError as e:
+            log(f"Tracking journal write failed: {e}", error=True)
+        TrackedFiles._stamp    = TrackedFiles._file_stamp()
+        TrackedFiles._pending += len(lines)
+        if TrackedFiles._pending >= TRACKED_COMPACT_LINES:
+            TrackedFiles.compact()
 
     @staticmethod
     def load():
         """Load tracked files. Returns dict: {path: timestamp}"""
         with TrackedFiles._lock:
-            tracked = {}
-            if os.path.exists(TRACKED_FILES):
-                try:
-                    for line in Path(TRACKED_FILES).read_text().splitlines():
-                        if '|' in line:
-                            path, ts = line.rsplit('|', 1)
-                            try:
-                                tracked[path] = float(ts)
-                            except ValueError:
-                                continue
-                        elif line.strip():
-                            tracked[line.strip()] = time.time()
-                except OSError as e:
-                    log(f"Tracking load failed: {e}", error=True)
-            return tracked
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.all()
+            return dict(TrackedFiles._current())
 
     @staticmethod
     def save(tracked):
-        """Save tracked files dict to disk (atomic replace)."""
+        """Replace the whole list: write it as the new snapshot (atomic
+        replace) and start an empty journal."""
         with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                known = db.details()
+                db.replace({p: (ts,) + known.get(p, (_size_or_none(p), None))[:2]
+                            for p, ts in tracked.items()})
+                return
+            known = TrackedFiles._sizes
+            sizes = {p: known[p] if known.get(p) is not None else _size_or_none(p)
+                     for p in tracked}
             try:
-                content = '\n'.join(f"{p}|{t}" for p, t in sorted(tracked.items()))
+                content = '\n'.join(TrackedFiles._entry(p, t, sizes[p])
+                                    for p, t in sorted(tracked.items()))
                 tmp = TRACKED_FILES + ".tmp"
                 Path(tmp).write_text(content + '\n' if content else '')
                 os.replace(tmp, TRACKED_FILES)
+                try:
+                    os.remove(TrackedFiles._journal())
+                except FileNotFoundError:
+                    pass
             except OSError as e:
                 log(f"Tracking save failed: {e}", error=True)
+            TrackedFiles._use(dict(tracked), sizes)
+            TrackedFiles._stamp   = TrackedFiles._file_stamp()
+            TrackedFiles._pending = 0
 
     @staticmethod
-    def add(path):
+    def compact():
+        """Fold the journal into the snapshot, if there is anything to fold."""
         with TrackedFiles._lock:
-            tracked = TrackedFiles.load()
+            if TrackedFiles._db() is not None:
+                return
+            tracked = TrackedFiles._current()
+            if TrackedFiles._pending or os.path.exists(TrackedFiles._journal()):
+                TrackedFiles.save(tracked)
+
+    @staticmethod
+    def add(path, disk=None, size=None):
+        """Track path as cached now. size is what the caller already knows
+        it to be (else it is looked up); disk is the array disk its original
+        is on, kept by the SQLite backend."""
+        if size is None:
+            size = _size_or_none(path)
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                db.add(path, time.time(), size, disk)
+                return
+            tracked = TrackedFiles._current()
             if path not in tracked:
                 tracked[path] = time.time()
-                TrackedFiles.save(tracked)
+                TrackedFiles._sizes[path] = size
+                TrackedFiles._bytes += size or 0
+                TrackedFiles._append(["+" + TrackedFiles._entry(path, tracked[path], size)])
+
+    @staticmethod
+    def adopt(entries):
+        """Track {path: timestamp} entries not tracked yet, with one write.
+        Unlike save(), this leaves alone whatever else changed meanwhile."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            tracked = None if db is not None else TrackedFiles._current()
+            lines = []
+            for path, ts in entries.items():
+                size = _size_or_none(path)
+                if db is not None:
+                    db.add(path, ts, size, None)
+                elif path not in tracked:
+                    tracked[path] = ts
+                    TrackedFiles._sizes[path] = size
+                    TrackedFiles._bytes += size or 0
+                    lines.append("+" + TrackedFiles._entry(path, ts, size))
+            if lines:
+                TrackedFiles._append(lines)
+
+    @staticmethod
+    def _forget(path):
+        del TrackedFiles._entries[path]
+        TrackedFiles._bytes -= TrackedFiles._sizes.pop(path, None) or 0
 
     @staticmethod
     def remove(path):
         with TrackedFiles._lock:
-            tracked = TrackedFiles.load()
-            if path in tracked:
-                del tracked[path]
-                TrackedFiles.save(tracked)
+            db = TrackedFiles._db()
+            if db is not None:
+                db.remove_many([path])
+                return
+            if path in TrackedFiles._current():
+                TrackedFiles._forget(path)
+                TrackedFiles._append([f"-{path}"])
 
     @staticmethod
     def remove_many(paths):
         """Drop several entries with a single write. The list lives on the USB
-        flash drive, so a move of fifty files must not rewrite it fifty times."""
+        flash drive, so a move of fifty files must not write to it fifty times."""
         if not paths:
             return
         with TrackedFiles._lock:
-            tracked = TrackedFiles.load()
-            hit = False
-            for path in paths:
-                if tracked.pop(path, None) is not None:
-                    hit = True
-            if hit:
-                TrackedFiles.save(tracked)
+            db = TrackedFiles._db()
+            if db is not None:
+                db.remove_many(paths)
+                return
+            tracked = TrackedFiles._current()
+            gone = [p for p in dict.fromkeys(paths) if p in tracked]
+            for p in gone:
+                TrackedFiles._forget(p)
+            if gone:
+                TrackedFiles._append([f"-{p}" for p in gone])
+
+    @staticmethod
+    def remove_missing(paths):
+        """remove_many() for entries found stale a while ago: each file is
+        looked for again under the lock, so one copied back to the cache
+        since then stays tracked. Returns the entries dropped."""
+        with TrackedFiles._lock:
+            gone = [p for p in paths if not os.path.exists(p)]
+            TrackedFiles.remove_many(gone)
+        return gone
 
     @staticmethod
     def clear():
         TrackedFiles.save({})
 
+    @staticmethod
+    def touch(path):
+        """Note that path was just played from the cache (SQLite backend only:
+        the text list has no room for it and is not worth a flash write)."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                db.touch(path, time.time())
+
+    @staticmethod
+    def contains(path):
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.contains(path)
+            return path in TrackedFiles._current()
+
+    @staticmethod
+    def oldest(limit=None):
+        """[(path, timestamp)], longest cached first."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.oldest(limit)
+            items = sorted(TrackedFiles._current().items(), key=lambda kv: kv[1])
+            return items if limit is None else items[:limit]
+
+    @staticmethod
+    def entries():
+        """[(path, timestamp, size)] of everything tracked, for the eviction
+        policies to rank."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.entries()
+            sizes = TrackedFiles._sizes
+            return [(p, ts, sizes.get(p)) for p, ts in TrackedFiles._current().items()]
+
+    @staticmethod
+    def older_than(timestamp):
+        """{path: timestamp} of entries cached before timestamp."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.older_than(timestamp)
+            return {p: t for p, t in TrackedFiles._current().items() if t < timestamp}
+
+    @staticmethod
+    def under(folder):
+        """{path: timestamp} of entries in folder or any folder below it."""
+        folder = folder.rstrip(os.sep)
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.under(folder)
+            return {p: t for p, t in TrackedFiles._current().items()
+                    if p.startswith(folder + os.sep)}
+
+    @staticmethod
+    def total_bytes():
+        """(files, bytes) tracked - a running total, no filesystem access."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                return db.total()
+            return len(TrackedFiles._current()), TrackedFiles._bytes
+
+    @staticmethod
+    def verify(limit=TRACKED_VERIFY_BATCH):
+        """Check the next limit entries against the cache: drop the ones that
+        are gone, correct recorded sizes that are wrong. Successive calls work
+        through the whole list and start over."""
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                batch = db.after(TrackedFiles._cursor, limit)
+            else:
+                TrackedFiles._current()
+                sizes = TrackedFiles._sizes
+                batch = [(p, sizes.get(p)) for p in heapq.nsmallest(
+                    limit, (p for p in TrackedFiles._entries if p > TrackedFiles._cursor))]
+            TrackedFiles._cursor = batch[-1][0] if len(batch) == limit else ""
+
+        gone, resized = [], {}
+        for path, recorded in batch:
+            size = _size_or_none(path)
+            if size is None:
+                gone.append(path)
+            elif size != recorded:
+                resized[path] = size
+        # Looked for again under the lock: a copy of the same file may have
+        # landed since the stat above
+        gone = TrackedFiles.remove_missing(gone)
+        if gone:
+            log(f"[Tracking] {len(gone)} cached file(s) removed outside the plugin - no longer tracked")
+        if resized:
+            TrackedFiles._resize(resized)
+
+    @staticmethod
+    def _resize(sizes):
+        with TrackedFiles._lock:
+            db = TrackedFiles._db()
+            if db is not None:
+                db.resize(sizes)
+                return
+            tracked = TrackedFiles._current()
+            lines = []
+            for path, size in sizes.items():
+                if path in tracked:
+                    TrackedFiles._bytes += size - (TrackedFiles._sizes.get(path) or 0)
+                    TrackedFiles._sizes[path] = size
+                    lines.append("+" + TrackedFiles._entry(path, tracked[path], size))
+            if lines:
+                TrackedFiles._append(lines)
+
+def _size_or_none(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+class TrackingDB:
+    """The SQLite store behind TrackedFiles when TRACKING_BACKEND=sqlite.
+
+    One row per cached file: when it was cached, its size, the array disk its
+    original sits on, its folder and when it was last played. The indexes on
+    time, folder and size are what the eviction, cleanup and status queries
+    run on. Rollback journal rather than WAL: the database lives on the FAT
+    flash drive, and the web UI opens it read-only.
+
+    Not thread-safe on its own; TrackedFiles serialises access with its lock.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tracked (
+            path        TEXT PRIMARY KEY,
+            cached_at   REAL NOT NULL,
+            size        INTEGER,
+            disk        TEXT,
+            dir         TEXT NOT NULL,
+            last_access REAL
+        );
+        CREATE INDEX IF NOT EXISTS tracked_by_time ON tracked (cached_at);
+        CREATE INDEX IF NOT EXISTS tracked_by_dir  ON tracked (dir);
+        CREATE INDEX IF NOT EXISTS tracked_by_size ON tracked (size);
+    """
+
+    def __init__(self, path):
+        self.path    = path
+        self.created = not os.path.exists(path)
+        self.conn    = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def all(self):
+        return dict(self.conn.execute("SELECT path, cached_at FROM tracked"))
+
+    def details(self):
+        """{path: (size, disk)}"""
+        return {p: (size, disk) for p, size, disk in
+                self.conn.execute("SELECT path, size, disk FROM tracked")}
+
+    def add(self, path, ts, size, disk):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tracked (path, cached_at, size, disk, dir, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (path, ts, size, disk, os.path.dirname(path), ts))
+
+    def replace(self, entries):
+        """Make the table hold exactly entries: {path: (ts, size, disk)}."""
+        with self.conn:
+            self.conn.execute("DELETE FROM tracked")
+            self.conn.executemany(
+                "INSERT INTO tracked (path, cached_at, size, disk, dir, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(p, ts, size, disk, os.path.dirname(p), ts)
+                 for p, (ts, size, disk) in entries.items()])
+
+    def remove_many(self, paths):
+        with self.conn:
+            self.conn.executemany("DELETE FROM tracked WHERE path = ?", [(p,) for p in paths])
+
+    def after(self, path, limit):
+        """[(path, size)] of the limit entries following path, in path order."""
+        return self.conn.execute("SELECT path, size FROM tracked WHERE path > ? ORDER BY path LIMIT ?",
+                                 (path, limit)).fetchall()
+
+    def resize(self, sizes):
+        with self.conn:
+            self.conn.executemany("UPDATE tracked SET size = ? WHERE path = ?",
+                                  [(size, p) for p, size in sizes.items()])
+
+    def touch(self, path, ts):
+        with self.conn:
+            self.conn.execute("UPDATE tracked SET last_access = ? WHERE path = ?", (ts, path))
+
+    def contains(self, path):
+        return self.conn.execute("SELECT 1 FROM tracked WHERE path = ?", (path,)).fetchone() is not None
+
+    def oldest(self, limit=None):
+        return self.conn.execute("SELECT path, cached_at FROM tracked ORDER BY cached_at LIMIT ?",
+                                 (-1 if limit is None else limit,)).fetchall()
+
+    def entries(self):
+        return self.conn.execute("SELECT path, cached_at, size FROM tracked").fetchall()
+
+    def older_than(self, ts):
+        return dict(self.conn.execute("SELECT path, cached_at FROM tracked WHERE cached_at < ?",
+                                      (ts,)))
+
+    def under(self, folder):
+        # A range on dir instead of LIKE, so the index is used: every folder
+        # below "folder/" sorts between "folder/" and "folder0" ('0' follows '/').
+        return dict(self.conn.execute(
+            "SELECT path, cached_at FROM tracked WHERE dir = ? OR (dir >= ? AND dir < ?)",
+            (folder, folder + "/", folder + "0")))
+
+    def total(self):
+        files, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tracked").fetchone()
+        return files, size
+
+def _load_reconcile_index():
+    try:
+        data = json.loads(Path(RECONCILE_INDEX).read_text())
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_reconcile_index(index):
+    try:
+        tmp = RECONCILE_INDEX + ".tmp"
+        Path(tmp).write_text(json.dumps(index, sort_keys=True))
+        os.replace(tmp, RECONCILE_INDEX)
+    except OSError as e:
+        log(f"[Reconcile] Could not save the folder index: {e}", warn=True)
+
+def _reconcile_root(root, index, tracked):
+    """Scan one mapped cache folder for reconcile_tracked_files().
+
+    A directory whose mtime matches the index has the same entries as at the
+    last scan, so it is not listed again - only its subdirectories (from the
+    index) are visited, since changes further down do not show in its
+    mtime. A listed directory with untracked media in it gets one listing of
+    its array counterpart instead of an exists() per file.
+
+    Returns {"index", "listed": {dir: file names}, "orphans": {path: mtime},
+    "dirs", "skipped", "files", "scan", "array"} - the last two in seconds.
+    """
+    result = {"index": {}, "listed": {}, "orphans": {}, "dirs": 0, "skipped": 0,
+              "files": 0, "scan": 0.0, "array": 0.0}
+    started = time.monotonic()
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            continue
+        result["dirs"] += 1
+        known = index.get(d)
+        if known and known.get("mtime") == mtime:
+            result["skipped"] += 1
+            result["index"][d] = known
+            stack.extend(os.path.join(d, name) for name in known.get("dirs", ()))
+            continue
+
+        # stat before listing: a change in between leaves the older mtime in
+        # the index, and the directory is simply listed again next time
+        files, subdirs, mtimes = [], [], {}
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(entry.name)
+                            if is_media_file(entry.name) and entry.path not in tracked:
+                                mtimes[entry.name] = entry.stat().st_mtime
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        result["files"] += len(files)
+        result["listed"][d] = set(files)
+        result["index"][d] = {"mtime": mtime, "dirs": subdirs}
+        stack.extend(os.path.join(d, name) for name in subdirs)
+
+        if mtimes:
+            # A duplicate of an array file is one of ours
+            t = time.monotonic()
+            try:
+                on_array = set(os.listdir(cache_to_array(d)))
+            except OSError:
+                on_array = set()
+            result["array"] += time.monotonic() - t
+            for name, file_mtime in mtimes.items():
+                if name in on_array:
+                    result["orphans"][os.path.join(d, name)] = file_mtime
+    result["scan"] = time.monotonic() - started - result["array"]
+    return result
+
 def reconcile_tracked_files():
     """Startup consistency check for the tracked-files list.
 
@@ -258,36 +971,99 @@ def reconcile_tracked_files():
        scanned — never the whole cache pool, so appdata/system shares and
        legitimately cache-only files (e.g. fresh downloads awaiting the
        mover) are left alone.
+
+    The mapped folders are scanned side by side (_reconcile_root), skipping
+    directories unchanged since the last run by the index in
+    RECONCILE_INDEX, and checking the array once per directory rather than
+    once per file - on a big pool with the array asleep the old per-file
+    walk took minutes and woke every disk. Whether a tracked file still
+    exists is answered from the same listings: a file in an unchanged
+    directory is still there. Anything a skipped directory hides is caught
+    later by TrackedFiles.verify().
     """
+    started = time.monotonic()
     tracked = TrackedFiles.load()
-    removed = 0
-    for path in list(tracked):
-        if not os.path.exists(path):
-            del tracked[path]
-            removed += 1
-
-    adopted    = 0
     cache_root = cfg("CACHE_ROOT")
-    for cache_dir in sorted(_protected_cache_dirs()):
-        if cache_dir == cache_root or not os.path.isdir(cache_dir):
-            continue
-        for root, _dirs, files in os.walk(cache_dir):
-            for f in files:
-                cache_path = os.path.join(root, f)
-                if cache_path in tracked or not is_media_file(f):
-                    continue
-                # A duplicate of an array file is one of ours
-                if os.path.exists(cache_to_array(cache_path)):
-                    try:
-                        tracked[cache_path] = os.path.getmtime(cache_path)
-                    except OSError:
-                        tracked[cache_path] = time.time()
-                    adopted += 1
+    roots = [d for d in sorted(_protected_cache_dirs()) if d != cache_root and os.path.isdir(d)]
+    # A mapped folder inside another one is covered by the outer scan
+    roots = [r for r in roots if not any(_under(r, o) and r != o for o in roots)]
+
+    index = _load_reconcile_index()
+    results = {}
+    if roots:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(RECONCILE_WORKERS, len(roots)),
+                thread_name_prefix="reconcile") as pool:
+            futures = {pool.submit(_reconcile_root, r, index, tracked): r for r in roots}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    log(f"[Reconcile] Scanning {futures[future]} failed: {e}", error=True)
+    scanned = time.monotonic()
+
+    listed, known_dirs, orphans = {}, {}, {}
+    for result in results.values():
+        listed.update(result["listed"])
+        known_dirs.update(result["index"])
+        orphans.update(result["orphans"])
+
+    stale = []
+    for path in tracked:
+        d, name = os.path.split(path)
+        if d in listed:
+            present = name in listed[d]
+        elif d in known_dirs:
+            present = True                   # unchanged since the last scan
+        else:
+            # Gone, unreadable or outside the mapped folders - rare enough to ask
+            present = os.path.exists(path)
+        if not present:
+            stale.append(path)
+    adopted = {p: mtime for p, mtime in orphans.items() if p not in tracked}
+
+    # Changes only, not the whole list: this runs beside the copy workers,
+    # which keep adding to it - and may have copied a stale file back while
+    # the scan ran
+    if stale or adopted:
+        stale = TrackedFiles.remove_missing(stale)
+        TrackedFiles.adopt(adopted)
+        log(f"[Reconcile] Tracked list: {len(stale)} stale entries removed, "
+            f"{len(adopted)} orphaned cache copies adopted")
+    if len(results) == len(roots):
+        _save_reconcile_index(known_dirs)
+
+    per_root = ", ".join(f"{os.path.basename(r) or r} {res['scan'] + res['array']:.1f}s"
+                         for r, res in sorted(results.items()))
+    log(f"[Reconcile] {sum(r['dirs'] for r in results.values())} folders "
+        f"({sum(r['skipped'] for r in results.values())} unchanged), "
+        f"{sum(r['files'] for r in results.values())} files listed in "
+        f"{time.monotonic() - started:.1f}s: scan {scanned - started:.1f}s"
+        + (f" ({per_root})" if per_root else "")
+        + f", array checks {sum(r['array'] for r in results.values()):.1f}s, "
+        f"list update {time.monotonic() - scanned:.1f}s")
+
+_reconciled = threading.Event()   # set once the startup reconcile has finished
+
+def background_reconcile():
+    """Startup reconcile, run off the main loop so stream detection does not
+    wait for it. Until it is done, tracking_confirmed() holds eviction and
+    cleanup back from entries it has not checked."""
+    try:
+        reconcile_tracked_files()
+    except Exception as e:
+        log(f"[Reconcile] Failed: {e}", error=True)
+    finally:
+        _reconciled.set()
 
-    if removed or adopted:
-        TrackedFiles.save(tracked)
-        log(f"[Reconcile] Tracked list: {removed} stale entries removed, "
-            f"{adopted} orphaned cache copies adopted")
+def tracking_confirmed(cache_path):
+    """Whether eviction or cleanup may act on this tracked file yet. After the
+    startup reconcile, always. Before it, only if the file is a plain
+    duplicate - on the cache and on the array - so removing it from the
+    cache cannot cost anything, whatever the unchecked list claims."""
+    if _reconciled.is_set():
+        return True
+    return os.path.exists(cache_path) and os.path.exists(cache_to_array(cache_path))
 
 # =============================================================================
 # PATH UTILITIES
@@ -407,30 +1183,936 @@ def clone_permissions(dest_path):
     except OSError as e:
         log(f"Permission clone failed: {e}", error=True)
 
+# =============================================================================
+# ARRAY DISKS — reading and writing past the user-share FUSE layer
+# =============================================================================
+
+def array_disks():
+    """The array disk mounts, disk1 first. ARRAY_DISKS lists them explicitly
+    (space-separated); left blank, every /mnt/diskN is used."""
+    listed = cfg("ARRAY_DISKS").split()
+    disks  = [d.rstrip('/') for d in listed] if listed else glob.glob(DISK_MOUNTS)
+    return sorted(disks, key=lambda d: (len(d), d))
+
+def _share_relative(path):
+    """The part of path below a user share root (/mnt/user or /mnt/user0),
+    or None for a path outside them."""
+    for share_root in ("/mnt/user", ARRAY_ROOT):
+        rel = _relative_to(path, share_root)
+        if rel:
+            return rel
+    return None
+
+_standby_state = {"read": 0.0, "spundown": set()}
+
+def disk_in_standby(disk):
+    """True if the array disk mounted at disk is spun down.
+
+    Unraid keeps each disk's state in disks.ini, one ["diskN"] section with a
+    spundown="1" line while it sleeps. Reading that is free; asking the drive
+    itself (hdparm -C) is not always. A disk the file does not mention, or no
+    file at all, counts as awake - deferring work on a guess would stall it
+    for good on systems without Unraid's bookkeeping.
+    """
+    now = time.time()
+    if now - _standby_state["read"] >= STANDBY_REFRESH:
+        spundown, section = set(), None
+        try:
+            with open(EMHTTP_DISKS_INI) as f:
+                for line in f:
+                    line = line.strip()
+                    m = re.fullmatch(r'\["?([^"\]]+)"?\]', line)
+                    if m:
+                        section = m.group(1)
+                    elif section and re.fullmatch(r'spundown="?1"?', line):
+                        spundown.add(section)
+        except OSError:
+            pass
+        _standby_state.update(read=now, spundown=spundown)
+    return os.path.basename(disk.rstrip('/')) in _standby_state["spundown"]
+
+class DiskResolver:
+    """Maps user-share paths to the array disk that actually holds them.
+
+    Everything under /mnt/user goes through shfs, Unraid's FUSE layer, which
+    on a long sequential copy costs a good part of the disk's throughput and a
+    core's worth of CPU. The same file is reachable at the same relative path
+    on exactly one /mnt/diskN, without the detour. Which one is found by
+    looking, and remembered per directory - the files of a season nearly
+    always sit together - so a batch probes the disks once - and per file, so
+    asking about the same file again costs a single stat. A remembered disk
+    is checked before it is trusted: a file the mover or unBALANCE shifted
+    since just makes it look again. A file no disk has is not looked for
+    again for DISK_MISS_TTL, since that means trying every disk.
+    """
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._dirs  = {}          # share-relative directory -> disk
+        self._files = {}          # share path -> (disk or None, when a miss expires)
+
+    def _remember(self, folder, disk):
+        with self._lock:
+            if len(self._dirs) > 10000:
+                self._dirs.clear()
+            self._dirs[folder] = disk
+
+    def _candidates(self, folder):
+        """The disks to try for folder: the one remembered for it first, then
+        the ones spinning - looking for a file on a sleeping disk can wake it,
+        and it is only needed if no awake disk has the file."""
+        with self._lock:
+            known = self._dirs.get(folder)
+        disks = sorted(array_disks(), key=disk_in_standby)
+        if known in disks:
+            disks.remove(known)
+            disks.insert(0, known)
+        return disks
+
+    def disk_of(self, path):
+        """The disk mount holding path, or None if no disk has it."""
+        rel = _share_relative(path)
+        if not rel:
+            for disk in array_disks():
+                if _under(path, disk):
+                    return disk
+            return None
+        now = time.monotonic()
+        with self._lock:
+            known, expires = self._files.get(path, (None, 0.0))
+        if known is not None and os.path.exists(os.path.join(known, rel)):
+            return known
+        if known is None and expires > now:
+            return None
+        folder, found = os.path.dirname(rel), None
+        for disk in self._candidates(folder):
+            if os.path.exists(os.path.join(disk, rel)):
+                self._remember(folder, disk)
+                found = disk
+                break
+        with self._lock:
+            if len(self._files) > 10000:
+                self._files.clear()
+            self._files[path] = (found, now + DISK_MISS_TTL)
+        return found
+
+    def physical(self, path):
+        """The /mnt/diskN path to read path from, or path itself when no disk
+        has it - a file still on the cache pool, say, or one outside the
+        user shares."""
+        rel  = _share_relative(path)
+        disk = self.disk_of(path) if rel else None
+        return os.path.join(disk, rel) if disk else path
+
+    def for_write(self, path, size=0):
+        """Where to write a file that belongs at share path `path`: straight
+        onto a disk that already holds its directory and has room for it.
+        Failing that, the share path itself - shfs then places the file by the
+        share's allocation method and split level, which only it knows."""
+        rel = _share_relative(path)
+        if not rel:
+            return path
+        folder = os.path.dirname(rel)
+        margin = CACHE_HEADROOM
+        for disk in self._candidates(folder):
+            if not os.path.isdir(os.path.join(disk, folder)):
+                continue
+            try:
+                if shutil.disk_usage(disk).free <= size + margin:
+                    continue
+            except OSError:
+                continue
+            self._remember(folder, disk)
+            return os.path.join(disk, rel)
+        return path
+
+disk_resolver = DiskResolver()
+
+def source_disk(array_path):
+    """The array disk mount (/mnt/diskN) holding array_path, or None.
+
+    A user share spreads its files over several disks, and the share path says
+    nothing about which one. A path outside the user shares, or a file no disk
+    has, yields None.
+    """
+    return disk_resolver.disk_of(array_path)
+
+# =============================================================================
+# TRANSFER QoS — speed caps and full-speed windows
+# =============================================================================
+
+def in_time_window(spec, now=None):
+    """True if the local time lies in one of the comma-separated HH:MM-HH:MM
+    windows of spec. A window may run past midnight (22:00-06:00). Entries
+    that do not parse are ignored."""
+    t = time.localtime(now if now is not None else time.time())
+    minute = t.tm_hour * 60 + t.tm_min
+    for part in spec.split(','):
+        m = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*", part)
+        if not m:
+            continue
+        start = int(m.group(1)) * 60 + int(m.group(2))
+        end   = int(m.group(3)) * 60 + int(m.group(4))
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+def _mb_cap(key):
+    mb = cfg(key, as_int=True)
+    return mb * 1048576 if mb > 0 else None
+
+def transfer_cap(direction, urgent=False, now=None):
+    """Bytes per second a transfer may use right now, or None for no cap.
+
+    direction is "copy" (array to cache) or "move" (cache to array). Urgent
+    work - the file being played and the episode after it - always runs under
+    its direction's cap; background work runs at full speed inside a
+    FULL_SPEED_WINDOW. Either way, while something is streaming the stricter
+    STREAM_RATE_LIMIT_MB applies, so a flush cannot starve a viewer reading a
+    different title off the same disk."""
+    if not urgent and in_time_window(cfg("FULL_SPEED_WINDOW"), now):
+        cap = None
+    else:
+        cap = _mb_cap("COPY_RATE_LIMIT_MB" if direction == "copy" else "MOVE_RATE_LIMIT_MB")
+    stream_cap = _mb_cap("STREAM_RATE_LIMIT_MB")
+    if stream_cap and stream_timers:
+        cap = stream_cap if cap is None else min(cap, stream_cap)
+    return cap
+
+class TransferMeter:
+    """Bytes moved by the built-in engine over the last few seconds, for the
+    transfer rate in the status snapshot."""
+
+    def __init__(self, span=10.0):
+        self._lock    = threading.Lock()
+        self._span    = span
+        self._samples = []        # (time, bytes)
+
+    def add(self, nbytes):
+        now = time.time()
+        with self._lock:
+            self._samples.append((now, nbytes))
+            while self._samples and self._samples[0][0] < now - self._span:
+                self._samples.pop(0)
+
+    def rate(self):
+        now = time.time()
+        with self._lock:
+            total = sum(n for t, n in self._samples if t >= now - self._span)
+        return int(total / self._span)
+
+transfer_meter = TransferMeter()
+
+class IOGovernor:
+    """Slows transfers down, or pauses background ones, while the disks are
+    busy with something else - and lets them speed up again once they are not.
+
+    A fixed cap is wrong half the time: too slow at night, too much at peak.
+    This samples two signals every GOVERNOR_SAMPLE seconds:
+
+    - Linux pressure stall information (PROC_PRESSURE_IO): the share of time
+      some task was waiting for I/O, system-wide. That includes our own copy
+      threads, and one full-speed copy off a spinning disk stalls enough to
+      cross the thresholds by itself - so while we move data, pressure only
+      counts when a watched disk also shows foreign traffic.
+    - Utilisation of the cache device and of the array disks copies read from
+      (PROC_DISKSTATS). A disk is only counted as contended when at least
+      GOVERNOR_FOREIGN_MIN of its traffic is not ours - the disk a copy reads
+      from is always busy, and that alone is no reason to back off.
+
+    Above the pause thresholds background work stops until the pressure falls;
+    above the throttle thresholds the speed factor halves; below both it climbs
+    back by a quarter per sample. The copy of the file being played is never
+    slowed below GOVERNOR_URGENT_MIN. State changes are logged and the last
+    sample is part of the status snapshot, so the thresholds can be tuned.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self.factor_  = 1.0
+        self.state    = "full"
+        self.reason   = ""
+        self.psi      = None      # % of the last interval with I/O stalls
+        self.util     = {}        # device -> {"util": %, "foreign": %}
+        self._sampled = 0.0
+        self._psi_prev  = None    # (time, total stall µs)
+        self._disk_prev = {}      # device -> (time, io_ticks ms, sectors)
+        self._own       = {}      # device -> bytes we moved since the last sample
+        self._devices   = {}      # path -> block device name (or None)
+        self._waits     = threading.local()   # .seconds: this thread held back so far
+
+    @staticmethod
+    def _read_psi():
+        """Cumulative stall time in µs from the "some" line, or None."""
+        try:
+            for line in Path(PROC_PRESSURE_IO).read_text().splitlines():
+                if line.startswith("some"):
+                    fields = dict(f.split("=", 1) for f in line.split()[1:] if "=" in f)
+                    return int(fields["total"])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def _read_diskstats(names):
+        """device -> (io_ticks ms, sectors read + written) for the given names."""
+        out = {}
+        try:
+            for line in Path(PROC_DISKSTATS).read_text().splitlines():
+                parts = line.split()
+                if len(parts) >= 13 and parts[2] in names:
+                    out[parts[2]] = (int(parts[12]), int(parts[5]) + int(parts[9]))
+        except (OSError, ValueError):
+            pass
+        return out
+
+    def device_for(self, path):
+        """Block device name (as in diskstats) of the filesystem holding path."""
+        if path in self._devices:
+            return self._devices[path]
+        if len(self._devices) > 1000:
+            self._devices.clear()
+        best, dev = "", None
+        try:
+            for line in Path(PROC_MOUNTS).read_text().splitlines():
+                parts = line.split()
+                if len(parts) < 2 or not parts[0].startswith("/dev/"):
+                    continue
+                mount = parts[1]
+                if _under(path, mount) and len(mount) > len(best):
+                    best, dev = mount, os.path.basename(parts[0])
+        except OSError:
+            pass
+        self._devices[path] = dev
+        return dev
+
+    def account(self, paths, nbytes):
+        """Record nbytes of our own traffic on the devices behind paths."""
+        with self._lock:
+            for path in paths:
+                dev = self.device_for(os.path.dirname(path)) if path else None
+                if dev:
+                    self._own[dev] = self._own.get(dev, 0) + nbytes
+
+    def _watched(self):
+        paths = [cfg("CACHE_ROOT")] + [d for d in copy_queue.active_disks() if d]
+        return {dev for dev in (self.device_for(p) for p in paths) if dev}
+
+    def sample(self, now=None):
+        """Take a sample if the last one is old enough and update the factor."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._sampled < GOVERNOR_SAMPLE:
+                return
+            self._sampled = now
+
+            total = self._read_psi()
+            if total is not None and self._psi_prev and now > self._psi_prev[0]:
+                span = (now - self._psi_prev[0]) * 1e6
+                self.psi = round(min(100.0, (total - self._psi_prev[1]) / span * 100), 1)
+            self._psi_prev = (now, total) if total is not None else None
+
+            util = {}
+            for dev, (ticks, sectors) in self._read_diskstats(self._watched()).items():
+                prev = self._disk_prev.get(dev)
+                self._disk_prev[dev] = (now, ticks, sectors)
+                if not prev or now <= prev[0]:
+                    continue
+                busy  = min(100.0, (ticks - prev[1]) / ((now - prev[0]) * 1000) * 100)
+                moved = (sectors - prev[2]) * 512
+                own   = self._own.get(dev, 0)
+                foreign = max(0.0, 1 - own / moved) if moved > 0 else 0.0
+                util[dev] = {"util": round(busy, 1), "foreign": round(foreign * 100, 1)}
+            self.util = util
+            ours = sum(self._own.values())
+            self._own = {}
+
+            psi_t, psi_p   = cfg("GOVERNOR_PSI_THROTTLE", as_int=True), cfg("GOVERNOR_PSI_PAUSE", as_int=True)
+            util_t, util_p = cfg("GOVERNOR_UTIL_THROTTLE", as_int=True), cfg("GOVERNOR_UTIL_PAUSE", as_int=True)
+            contended = {d: u["util"] for d, u in util.items()
+                         if u["foreign"] >= GOVERNOR_FOREIGN_MIN * 100}
+            psi = self.psi or 0.0
+            busiest = max(contended.items(), key=lambda kv: kv[1]) if contended else None
+            # Stalls while only we are moving data are our own doing
+            own_stalls = ours > 0 and not contended
+
+            reason = f"io pressure {psi:.0f}%" + (" (own copies)" if own_stalls else "")
+            if own_stalls:
+                psi = 0.0
+
+            if psi >= psi_p or (busiest and busiest[1] >= util_p):
+                factor = 0.0
+            elif psi >= psi_t or (busiest and busiest[1] >= util_t):
+                factor = max(0.1, self.factor_ * 0.5)
+            else:
+                factor = min(1.0, max(self.factor_, 0.0) + 0.25)
+
+            if busiest:
+                reason += f", {busiest[0]} {busiest[1]:.0f}% busy"
+            state = "paused" if factor == 0 else ("full" if factor >= 1 else "throttled")
+            if state != self.state:
+                log(f"[Governor] {state}"
+                    + (f" at {factor:.0%}" if state == "throttled" else "") + f" ({reason})")
+            self.factor_, self.state, self.reason = factor, state, reason
+
+    def factor(self, urgent=False):
+        """Speed factor to apply now: 1 full speed, 0 paused."""
+        if not cfg("ENABLE_IO_GOVERNOR", as_bool=True):
+            return 1.0
+        self.sample()
+        return max(self.factor_, GOVERNOR_URGENT_MIN) if urgent else self.factor_
+
+    def hold(self, urgent=False, job=None):
+        """Wait while background work is paused. Returns the seconds waited."""
+        started = time.monotonic()
+        while self.factor(urgent) <= 0:
+            if _shutting_down.is_set() or (job is not None and job.preempt.is_set()):
+                break
+            # Short slices: a resume is picked up as soon as it is sampled
+            _shutting_down.wait(0.25)
+        return self.count_wait(time.monotonic() - started)
+
+    def count_wait(self, seconds):
+        """Add seconds the calling thread was held back for the governor to
+        waited(). Returns seconds."""
+        self._waits.seconds = self.waited() + seconds
+        return seconds
+
+    def waited(self):
+        """Seconds the calling thread has been paused or slowed down by the
+        governor so far. A transfer compares this before and after, so that
+        its timing leaves the waits out and the throughput model does not
+        learn the governor's speed as the disks'."""
+        return getattr(self._waits, "seconds", 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": cfg("ENABLE_IO_GOVERNOR", as_bool=True),
+                "state":   self.state,
+                "factor":  round(self.factor_, 2),
+                "reason":  self.reason,
+                "psi":     self.psi,
+                "devices": dict(self.util),
+            }
+
+io_governor = IOGovernor()
+
+class TransferPacer:
+    """Holds one native transfer to transfer_cap() and to what io_governor
+    allows.
+
+    The cap is looked up again after every chunk, so a stream starting halfway
+    through a flush slows it down at once. The governor's factor stretches each
+    chunk: at 0.5 a chunk that took one second is followed by one second of
+    waiting. Waiting happens in short slices that still notice preemption and
+    shutdown. slept is the time spent waiting, which the transfer's timeout does
+    not count against it."""
+
+    def __init__(self, direction, urgent, job=None, paths=()):
+        self.direction = direction
+        self._urgent   = urgent
+        self.job       = job
+        self.paths     = paths
+        self.slept     = 0.0
+        self._cap      = None
+        self._t0       = time.time()
+        self._bytes    = 0
+        self._last     = time.time()
+
+    @property
+    def urgent(self):
+        # Looked up per chunk: a stream can start on a file of a batch
+        # that is already being copied (CopyQueue.raise_priority)
+        return self._urgent or (self.job is not None and self.job.priority <= PRIO_NEXT)
+
+    def chunk_size(self):
+        """Smaller chunks under a cap, so the pacing stays smooth."""
+        cap = transfer_cap(self.direction, self.urgent)
+        return COPY_CHUNK if cap is None else max(1048576, min(COPY_CHUNK, cap // 4))
+
+    def _wait(self, seconds):
+        waited = 0.0
+        while seconds > 0:
+            if _shutting_down.is_set() or (self.job is not None and self.job.preempt.is_set()):
+                break
+            step = min(seconds, 0.25)
+            time.sleep(step)
+            self.slept += step
+            waited  += step
+            seconds -= step
+        return waited
+
+    def after(self, nbytes):
+        work = time.time() - self._last
+        transfer_meter.add(nbytes)
+        io_governor.account(self.paths, nbytes)
+
+        cap = transfer_cap(self.direction, self.urgent)
+        if cap != self._cap:
+            # A new cap counts from here, not from the start of the file
+            self._cap, self._t0, self._bytes = cap, time.time(), 0
+        self._bytes += nbytes
+        if cap is not None:
+            self._wait(self._bytes / cap - (time.time() - self._t0))
+
+        factor = io_governor.factor(self.urgent)
+        if factor <= 0:
+            self.slept += io_governor.hold(self.urgent, self.job)
+        elif factor < 1:
+            io_governor.count_wait(self._wait(work * (1 / factor - 1)))
+        self._last = time.time()
+
+# =============================================================================
+# THROUGHPUT MODEL — learned transfer speeds per device pair
+# =============================================================================
+
+class ThroughputModel:
+    """How fast transfers between two devices actually go, learned from the
+    ones that completed.
+
+    Every transfer of at least THROUGHPUT_MIN_BYTES that ran without a speed
+    cap, and that io_governor never held back, updates an exponentially
+    decayed average for its source and destination device, so a disk that
+    got slower - an SMR drive busy rewriting its zones, a stream reading
+    from the same spindle - pulls its estimate down within a few files.
+    Transfers through the user share, which has no block device, are keyed
+    as "share".
+
+    The estimates feed transfer timeouts, the ETAs in the status snapshot and
+    the forecast for the whole queue. They survive a restart in
+    THROUGHPUT_FILE; as that lives on the flash drive, it is written at most
+    every THROUGHPUT_SAVE_EVERY seconds and once more on shutdown.
+    """
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._pairs  = {}         # "src>dst" -> {"rate": bytes/s, "samples", "updated"}
+        self._dirty  = False
+        self._saved  = 0.0
+
+    @staticmethod
+    def _key(src, dst):
+        def dev(path):
+            return io_governor.device_for(path) or "share"
+        return f"{dev(src)}>{dev(dst)}"
+
+    def record(self, src, dst, nbytes, seconds):
+        """Learn from a transfer of nbytes from src to dst that took seconds."""
+        if nbytes < THROUGHPUT_MIN_BYTES or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        key  = self._key(src, dst)
+        with self._lock:
+            entry = self._pairs.get(key)
+            if entry is None:
+                entry = self._pairs[key] = {"rate": rate, "samples": 0}
+            else:
+                entry["rate"] += THROUGHPUT_ALPHA * (rate - entry["rate"])
+            entry["samples"] += 1
+            entry["updated"]  = int(time.time())
+            self._dirty = True
+        self.save()
+
+    def estimate(self, src, dst):
+        """Expected bytes/s from src to dst, or None if that pair is unknown."""
+        with self._lock:
+            entry = self._pairs.get(self._key(src, dst))
+            return entry["rate"] if entry else None
+
+    def average(self):
+        """Mean of all known pairs - a fallback for a pair never seen yet."""
+        with self._lock:
+            rates = [e["rate"] for e in self._pairs.values()]
+        return sum(rates) / len(rates) if rates else None
+
+    def eta(self, src, dst, nbytes):
+        """Seconds nbytes from src to dst should take, or None if unknown."""
+        rate = self.estimate(src, dst)
+        return int(nbytes / rate) if rate else None
+
+    def load(self):
+        try:
+            data = json.loads(Path(THROUGHPUT_FILE).read_text())
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for key, entry in (data.get("pairs") or {}).items():
+                try:
+                    self._pairs[key] = {"rate": float(entry["rate"]),
+                                        "samples": int(entry.get("samples", 1)),
+                                        "updated": int(entry.get("updated", 0))}
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+    def save(self, force=False):
+        """Write the estimates if they changed and the last write is old
+        enough; force skips the wait, for shutdown."""
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._saved < THROUGHPUT_SAVE_EVERY):
+                return
+            data = {"pairs": {k: dict(v) for k, v in self._pairs.items()}}
+            self._dirty, self._saved = False, time.time()
+        try:
+            tmp = THROUGHPUT_FILE + ".tmp"
+            Path(tmp).write_text(json.dumps(data, indent=1, sort_keys=True))
+            os.replace(tmp, THROUGHPUT_FILE)
+        except OSError as e:
+            log(f"[Throughput] Could not save estimates: {e}", warn=True)
+
+throughput = ThroughputModel()
+
+# =============================================================================
+# EVICTION POLICY — which cached files leave first
+# =============================================================================
+
+class AccessHistory:
+    """When and how often each file was played, for the eviction policies.
+
+    Fed by every stream that starts, whether its file is on the cache yet or
+    not, and keyed by cache path. Besides the last play, each entry keeps a
+    play count and a frequency that halves every ACCESS_HALF_LIFE - a film
+    played every weekend stays ahead of one played ten times last year. An
+    entry outlives its file's eviction as an ARC "ghost", recording which
+    list it was evicted from, and "base" keeps the GDSF inflation value as
+    it stood when the file was last played or cached.
+
+    Lives in ACCESS_FILE on the flash drive, written at most every
+    ACCESS_SAVE_EVERY seconds and on shutdown, like the throughput model.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._entries = {}        # cache path -> {"last", "freq", "hits", "ghost", "base"}
+        self.arc_p    = 0.5       # ARC: target share of the cache for played-once files
+        self.gdsf_l   = 0.0       # GDSF: inflation, the value of the last file evicted
+        self._dirty   = False
+        self._saved   = 0.0
+
+    @staticmethod
+    def decayed(freq, since, now):
+        return freq * 0.5 ** (max(0.0, now - since) / ACCESS_HALF_LIFE)
+
+    def record(self, path, now=None):
+        """path started playing."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = {"last": now, "freq": 0.0, "hits": 0}
+            ghost = entry.pop("ghost", None)
+            if ghost:
+                self._adapt(ghost)
+            entry["freq"]  = self.decayed(entry["freq"], entry["last"], now) + 1
+            entry["last"]  = now
+            entry["hits"] += 1
+            entry["base"]  = self.gdsf_l
+            self._dirty = True
+        self.save()
+
+    def cached(self, path, now=None):
+        """path was copied to the cache. Only GDSF needs to know: a file
+        cached but never played is valued from the inflation of this moment."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.setdefault(path, {"last": now, "freq": 0.0, "hits": 0})
+            entry["base"] = self.gdsf_l
+            self._dirty = True
+        self.save()
+
+    def _adapt(self, ghost):
+        """ARC: a file played again soon after being evicted says its list was
+        given too little room."""
+        b1 = sum(1 for e in self._entries.values() if e.get("ghost") == "t1")
+        b2 = sum(1 for e in self._entries.values() if e.get("ghost") == "t2")
+        if ghost == "t1":
+            self.arc_p = min(1.0, self.arc_p + ARC_STEP * max(1.0, b2 / max(b1, 1)))
+        else:
+            self.arc_p = max(0.0, self.arc_p - ARC_STEP * max(1.0, b1 / max(b2, 1)))
+
+    def get(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            return dict(entry) if entry else None
+
+    def evicted(self, path, ghost=None, value=None):
+        """path left the cache: remember which ARC list it was in, and the
+        GDSF value it went with."""
+        with self._lock:
+            if ghost and path in self._entries:
+                self._entries[path]["ghost"] = ghost
+            if value is not None:
+                self.gdsf_l = max(self.gdsf_l, value)
+            self._dirty = True
+
+    def load(self):
+        try:
+            data = json.loads(Path(ACCESS_FILE).read_text())
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for path, entry in (data.get("files") or {}).items():
+                try:
+                    self._entries[path] = {"last": float(entry["last"]),
+                                           "freq": float(entry.get("freq", 1)),
+                                           "hits": int(entry.get("hits", 1))}
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if entry.get("ghost") in ("t1", "t2"):
+                    self._entries[path]["ghost"] = entry["ghost"]
+                try:
+                    self._entries[path]["base"] = float(entry["base"])
+                except (KeyError, TypeError, ValueError):
+                    pass
+            try:
+                self.arc_p  = min(1.0, max(0.0, float(data.get("arc_p", 0.5))))
+                self.gdsf_l = float(data.get("gdsf_l", 0.0))
+            except (TypeError, ValueError):
+                pass
+
+    def save(self, force=False):
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._saved < ACCESS_SAVE_EVERY):
+                return
+            if len(self._entries) > ACCESS_MAX_ENTRIES:
+                keep = heapq.nlargest(ACCESS_MAX_ENTRIES, self._entries.items(),
+                                      key=lambda kv: kv[1]["last"])
+                self._entries = dict(keep)
+            data = {"files": {p: dict(e) for p, e in self._entries.items()},
+                    "arc_p": self.arc_p, "gdsf_l": self.gdsf_l}
+            self._dirty, self._saved = False, time.time()
+        try:
+            tmp = ACCESS_FILE + ".tmp"
+            Path(tmp).write_text(json.dumps(data, sort_keys=True))
+            os.replace(tmp, ACCESS_FILE)
+        except OSError as e:
+            log(f"[Evict] Could not save the play history: {e}", warn=True)
+
+access_history = AccessHistory()
+
+class EvictionPolicy:
+    """Oldest copy first ("fifo") - what eviction always did - and the base
+    the other policies build on.
+
+    order() yields the tracked files as (path, size), the first to go first.
+    A file whose array original is gone has to be copied back in full rather
+    than just deleted, so all files that are cheap to drop come before any
+    that are not; only gdsf weighs that cost into its value instead.
+    last_used() is what days-based cleanup measures the age by.
+    """
+
+    name   = "fifo"
+    costed = False            # True: key() already accounts for the copy-back cost
+
+    def __init__(self, history):
+        self.history = history
+        self.now     = time.time()
+        self._keys   = {}
+
+    def key(self, path, cached_at, size, access):
+        return cached_at
+
+    def last_used(self, path, cached_at):
+        return cached_at
+
+    def _last(self, cached_at, access):
+        return max(cached_at, access["last"]) if access else cached_at
+
+    def _frequency(self, cached_at, access):
+        # A file prefetched but never played counts as used once when it was
+        # cached, so it is not automatically the very first to go
+        if not access or not access["hits"]:
+            return AccessHistory.decayed(1.0, cached_at, self.now)
+        return AccessHistory.decayed(access["freq"], access["last"], self.now)
+
+    def _ranked(self, entries):
+        heap = []
+        for path, cached_at, size in entries:
+            key = self.key(path, cached_at, size, self.history.get(path))
+            heap.append((key, path, size))
+        heapq.heapify(heap)
+        while heap:
+            key, path, size = heapq.heappop(heap)
+            self._keys[path] = key
+            yield path, size
+
+    def _cheap_first(self, ranked):
+        if self.costed:
+            yield from ranked
+            return
+        costly = []
+        for path, size in ranked:
+            if os.path.exists(cache_to_array(path)):
+                yield path, size
+            else:
+                costly.append((path, size))
+        yield from costly
+
+    def order(self, entries):
+        """entries: [(path, cached_at, size)]."""
+        return self._cheap_first(self._ranked(entries))
+
+    def evicted(self, path):
+        self.history.evicted(path)
+
+class LRUPolicy(EvictionPolicy):
+    """Played longest ago first; a file never played counts from when it
+    was cached."""
+    name = "lru"
+
+    def key(self, path, cached_at, size, access):
+        return self._last(cached_at, access)
+
+    def last_used(self, path, cached_at):
+        return self._last(cached_at, self.history.get(path))
+
+class LFUPolicy(LRUPolicy):
+    """Played least often first, recent plays weighing more; ties go by
+    last play."""
+    name = "lfu"
+
+    def key(self, path, cached_at, size, access):
+        return (self._frequency(cached_at, access), self._last(cached_at, access))
+
+class GDSFPolicy(LRUPolicy):
+    """GreedyDual-Size-Frequency: value = L + frequency * cost / size, lowest
+    value first. Size in GiB, so one big rarely-played film goes before
+    several small episodes; cost COPY_BACK_COST for a file that would need
+    copying back, 1 otherwise. L rises to the value of each file evicted and
+    is taken into a file's value only when it is played or cached, so files
+    that were valuable long ago age out against newly played ones.
+
+    Whether the original still exists is a lookup on the array for each
+    file. The value at cost 1 is a lower bound, so files are ranked by that
+    and looked up only on reaching the front: a plan stats about as many
+    files as it evicts, not the whole list."""
+    name   = "gdsf"
+    costed = True
+
+    def _value(self, cached_at, size, access, cost):
+        gib  = max(size or 0, 1 << 20) / (1 << 30)
+        base = access.get("base", 0.0) if access else 0.0
+        return base + self._frequency(cached_at, access) * cost / gib
+
+    def key(self, path, cached_at, size, access):
+        cost = 1 if os.path.exists(cache_to_array(path)) else COPY_BACK_COST
+        return self._value(cached_at, size, access, cost)
+
+    def _ranked(self, entries):
+        heap = []
+        for path, cached_at, size in entries:
+            access = self.history.get(path)
+            heap.append((self._value(cached_at, size, access, 1), False, path, size,
+                         cached_at, access))
+        heapq.heapify(heap)
+        while heap:
+            key, costed, path, size, cached_at, access = heapq.heappop(heap)
+            if not costed and not os.path.exists(cache_to_array(path)):
+                heapq.heappush(heap, (self._value(cached_at, size, access, COPY_BACK_COST),
+                                      True, path, size, cached_at, access))
+                continue
+            self._keys[path] = key
+            yield path, size
+
+    def evicted(self, path):
+        self.history.evicted(path, value=self._keys.get(path))
+
+class ARCPolicy(LRUPolicy):
+    """Adaptive Replacement Cache, over whole files: played at most once
+    since caching is the "recent" list T1, more often the "frequent" list
+    T2, each ordered by last play. Eviction takes from T1 while it holds
+    more than its target share of the cache, from T2 otherwise. An evicted
+    file is remembered as a ghost of its list; when it is played again the
+    target shifts toward that list (AccessHistory._adapt)."""
+    name = "arc"
+
+    def _list(self, access):
+        return "t2" if access and access["hits"] >= 2 else "t1"
+
+    def order(self, entries):
+        lists = {"t1": [], "t2": []}
+        for path, cached_at, size in entries:
+            access = self.history.get(path)
+            lists[self._list(access)].append((self._last(cached_at, access), path, size))
+        for heap in lists.values():
+            heapq.heapify(heap)
+        return self._cheap_first(self._replace(lists))
+
+    def _replace(self, lists):
+        target = self.history.arc_p * (len(lists["t1"]) + len(lists["t2"]))
+        while lists["t1"] or lists["t2"]:
+            take = "t1" if lists["t1"] and (len(lists["t1"]) > target or not lists["t2"]) else "t2"
+            _last, path, size = heapq.heappop(lists[take])
+            self._keys[path] = take
+            yield path, size
+
+    def evicted(self, path):
+        self.history.evicted(path, ghost=self._keys.get(path))
+
+EVICTION_POLICIES = {cls.name: cls for cls in
+                     (EvictionPolicy, LRUPolicy, LFUPolicy, GDSFPolicy, ARCPolicy)}
+
+def eviction_policy():
+    name = cfg("EVICTION_POLICY").strip().lower()
+    if name not in EVICTION_POLICIES:
+        log(f"[Evict] Unknown EVICTION_POLICY '{name}' - using fifo", warn=True)
+        config["EVICTION_POLICY"] = name = "fifo"
+    return EVICTION_POLICIES[name](access_history)
+
 # =============================================================================
 # FILE OPERATIONS
 # =============================================================================
 
-def _rsync_timeout_for(src):
-    """Generous size-based timeout so a hung rsync can't block the worker
-    forever: 10 minutes base + 1 second per 10 MB (i.e. assumes a floor
-    of ~10 MB/s throughput on top of the base)."""
+def _rsync_timeout_for(src, cap=None, dst=None):
+    """Size-based timeout so a hung transfer can't block the worker forever.
+
+    With a learned speed for the devices behind src and dst, the transfer gets
+    TIMEOUT_FACTOR times its expected duration plus TIMEOUT_BASE. Without one
+    it falls back to 10 minutes base + 1 second per 10 MB (i.e. a floor of
+    ~10 MB/s). A speed cap below either rate stretches it accordingly."""
     try:
         size = os.path.getsize(src)
     except OSError:
         size = 0
-    return 600 + size // (10 * 1024 * 1024)
-
-def _run_rsync(cmd, timeout):
-    """Run rsync, tracking the process so shutdown can terminate it.
-    Returns (returncode, stderr_text)."""
-    global _current_rsync
-    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
-                            stderr=subprocess.PIPE, text=True)
+    rate = throughput.estimate(src, dst) if dst else None
+    if rate:
+        if cap:
+            rate = min(rate, cap)
+        return TIMEOUT_BASE + int(size / rate * TIMEOUT_FACTOR)
+    floor = 10 * 1024 * 1024
+    if cap:
+        floor = min(floor, cap)
+    return 600 + size // floor
+
+class TransferPreempted(Exception):
+    """A copy was stopped to make way for a more urgent one. Its partial data
+    is kept, and the job goes back into the queue to be resumed later."""
+
+PARTIAL_DIR = ".plex_to_cache-partial"
+
+def _partial_path(dst):
+    """Where an interrupted transfer to dst leaves the data it already wrote."""
+    return os.path.join(os.path.dirname(dst), PARTIAL_DIR, os.path.basename(dst))
+
+def _run_rsync(cmd, timeout, job=None, stdin_text=None):
+    """Run rsync, tracking the process so shutdown (and, for a copy job,
+    preemption) can terminate it. stdin_text is fed to it - the file list of
+    --files-from=-. Returns (returncode, stderr_text)."""
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            stdin=subprocess.PIPE if stdin_text is not None else None,
+                            text=True)
     with _rsync_lock:
-        _current_rsync = proc
+        _running_rsync.add(proc)
+        if job is not None:
+            job.proc = proc
+            # Preempted between the check in rsync_transfer and now
+            if job.preempt.is_set():
+                proc.terminate()
     try:
-        _, stderr = proc.communicate(timeout=timeout)
+        _, stderr = proc.communicate(stdin_text, timeout=timeout)
         return proc.returncode, (stderr or "")
     except subprocess.TimeoutExpired:
         proc.kill()
@@ -438,7 +2120,9 @@ def _run_rsync(cmd, timeout):
         return -1, f"rsync timed out after {timeout}s"
     finally:
         with _rsync_lock:
-            _current_rsync = None
+            _running_rsync.discard(proc)
+            if job is not None:
+                job.proc = None
 
 def _sizes_match(src, dst):
     """True if dst exists and has the same size as src (or src is gone
@@ -452,7 +2136,7 @@ def _sizes_match(src, dst):
     except OSError:
         return False
 
-def rsync_transfer(src, dst, remove_source=True):
+def rsync_transfer(src, dst, remove_source=True, job=None):
     """Move (or copy) a file using rsync. Robust against transient errors:
 
     - Retries up to RSYNC_RETRIES times; --partial-dir lets a retry resume
@@ -465,26 +2149,45 @@ def rsync_transfer(src, dst, remove_source=True):
       chown/chmod/utime problems on FUSE shares even though the file
       content transferred fine — the caller re-applies permissions via
       clone_permissions anyway.
+    - With a copy job, the transfer can be preempted: rsync is terminated,
+      keeps what it wrote in the partial dir, and TransferPreempted is raised.
+      When the job comes back, --append continues after the bytes already
+      there instead of reading the source from the start again.
 
     Raises subprocess.CalledProcessError if the transfer really failed.
     """
     os.makedirs(os.path.dirname(dst), exist_ok=True)
-    # --partial-dir instead of --inplace: a retry still resumes, but the
-    # partial data sits in a side directory. With --inplace the destination
-    # carries its final name while still incomplete, and Unraid serves new
-    # opens from cache - a stream starting mid-copy could read a truncated file.
-    cmd = ["rsync", "-a", "--partial", "--partial-dir=.plex_to_cache-partial"]
-    if remove_source:
-        cmd.append("--remove-source-files")
-    cmd.extend([src, dst])
-
-    timeout  = _rsync_timeout_for(src)
     last_err = ""
 
     for attempt in range(1, RSYNC_RETRIES + 1):
-        rc, stderr = _run_rsync(cmd, timeout)
+        if job is not None and job.preempt.is_set():
+            raise TransferPreempted(src)
+
+        # --partial-dir instead of --inplace: a retry still resumes, but the
+        # partial data sits in a side directory. With --inplace the destination
+        # carries its final name while still incomplete, and Unraid serves new
+        # opens from cache - a stream starting mid-copy could read a truncated file.
+        cmd = ["rsync", "-a", "--partial", f"--partial-dir={PARTIAL_DIR}"]
+        if os.path.exists(_partial_path(dst)):
+            # Local rsync copies whole files and would ignore what is there
+            cmd.append("--append")
+        if remove_source:
+            cmd.append("--remove-source-files")
+        # rsync cannot change its limit mid-file; it gets the cap in effect
+        # when it starts, and a timeout that allows for it.
+        urgent = job is not None and job.priority <= PRIO_NEXT
+        cap = transfer_cap("move" if remove_source else "copy", urgent)
+        # Nor can the governor slow it down once started, only hold the start
+        io_governor.hold(urgent, job)
+        if cap:
+            cmd.append(f"--bwlimit={max(1, cap // 1024)}")
+        cmd.extend([src, dst])
+
+        rc, stderr = _run_rsync(cmd, _rsync_timeout_for(src, cap, dst), job)
         if rc == 0:
             return
+        if job is not None and job.preempt.is_set():
+            raise TransferPreempted(src)
 
         # Keep the last few stderr lines for the log
         err_lines = [l for l in stderr.strip().splitlines() if l.strip()]
@@ -516,6 +2219,308 @@ def rsync_transfer(src, dst, remove_source=True):
 # Backwards-compatible alias (old name used elsewhere / in docs)
 rsync_move = rsync_transfer
 
+def rsync_copy_many(src_dir, dst_dir, names, settle, job=None):
+    """Copy several files from one folder with a single rsync run.
+
+    The names go to --files-from on stdin, so a season is one process and one
+    directory scan instead of one of each per episode. rsync's exit code covers
+    the whole run, so each file is judged on its own afterwards: one that
+    arrived complete is settled as done even if a sibling failed, and only the
+    missing ones go into the next attempt. settle(name, error) is called once
+    per file, error None on success.
+
+    Preemption works as in rsync_transfer; the files finished by then are
+    settled before TransferPreempted is raised.
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    remaining = list(names)
+    last_err  = ""
+    rc        = 0
+
+    def sort_out():
+        for name in list(remaining):
+            if _sizes_match(os.path.join(src_dir, name), os.path.join(dst_dir, name)):
+                remaining.remove(name)
+                settle(name, None)
+
+    for attempt in range(1, RSYNC_RETRIES + 1):
+        if job is not None and job.preempt.is_set():
+            raise TransferPreempted(src_dir)
+
+        cmd = ["rsync", "-a", "--partial", f"--partial-dir={PARTIAL_DIR}", "--files-from=-"]
+        if any(os.path.exists(_partial_path(os.path.join(dst_dir, n))) for n in remaining):
+            # --append-verify rather than --append: it applies to every file in
+            # the run, and a stale copy of another one would be appended to
+            # blindly. The checksum catches that and sends the file again.
+            cmd.append("--append-verify")
+        urgent = job is not None and job.priority <= PRIO_NEXT
+        cap = transfer_cap("copy", urgent)
+        io_governor.hold(urgent, job)
+        if cap:
+            cmd.append(f"--bwlimit={max(1, cap // 1024)}")
+        cmd.extend([src_dir.rstrip(os.sep) + os.sep, dst_dir.rstrip(os.sep) + os.sep])
+
+        if job is not None:
+            job.current = os.path.join(src_dir, remaining[0])
+        timeout = sum(_rsync_timeout_for(os.path.join(src_dir, n), cap, os.path.join(dst_dir, n))
+                      for n in remaining)
+        rc, stderr = _run_rsync(cmd, timeout, job, stdin_text="\n".join(remaining) + "\n")
+        sort_out()
+        if not remaining:
+            if rc != 0:
+                log(f"rsync finished with warnings (exit {rc}) but every file is complete "
+                    f"in {os.path.basename(dst_dir)}", warn=True)
+            return
+        if job is not None and job.preempt.is_set():
+            raise TransferPreempted(src_dir)
+
+        err_lines = [l for l in stderr.strip().splitlines() if l.strip()]
+        last_err  = "; ".join(err_lines[-3:]) if err_lines else f"exit status {rc}"
+
+        if _shutting_down.is_set():
+            break
+
+        if attempt < RSYNC_RETRIES:
+            log(f"rsync attempt {attempt}/{RSYNC_RETRIES} left {len(remaining)} file(s) "
+                f"of {os.path.basename(src_dir)} incomplete (exit {rc}): {last_err} "
+                f"— retrying in {RSYNC_RETRY_DELAY}s", warn=True)
+            time.sleep(RSYNC_RETRY_DELAY)
+
+    for name in remaining:
+        settle(name, subprocess.CalledProcessError(rc if rc != 0 else 1, "rsync",
+                                                   stderr=last_err))
+
+def _copy_chunk(fd_in, fd_out, offset, count, method):
+    """Copy up to count bytes at offset from fd_in to the same offset in fd_out
+    using method[0], falling back along copy_file_range -> sendfile -> read/write
+    when the kernel or filesystem refuses. Returns the bytes copied; method[0]
+    is updated so the rest of the file skips the attempts that failed."""
+    unsupported = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                   errno.ENOTSUP, errno.EBADF)
+    if method[0] == "copy_file_range":
+        try:
+            n = os.copy_file_range(fd_in, fd_out, count, offset, offset)
+            if n > 0:
+                return n
+            # Some filesystems answer 0 instead of an error; let the next
+            # method decide whether the source really ended here.
+        except OSError as e:
+            if e.errno not in unsupported:
+                raise
+        method[0] = "sendfile"
+    if method[0] == "sendfile":
+        try:
+            os.lseek(fd_out, offset, os.SEEK_SET)
+            return os.sendfile(fd_out, fd_in, offset, count)
+        except OSError as e:
+            if e.errno not in unsupported:
+                raise
+            method[0] = "read/write"
+    data = os.pread(fd_in, min(count, COPY_BUFFER), offset)
+    written = 0
+    while written < len(data):
+        written += os.pwrite(fd_out, data[written:], offset + written)
+    return len(data)
+
+def _native_copy(src, partial, job, deadline, pacer=None):
+    """Copy src into partial, continuing after whatever partial already holds.
+
+    The partial file is trusted only if it is not longer than the source and was
+    written after the source last changed - otherwise it belongs to an older
+    version and the copy starts over. Stops between chunks for preemption,
+    shutdown and the timeout; the pacer holds it to the speed cap."""
+    os.makedirs(os.path.dirname(partial), exist_ok=True)
+    fd_in = os.open(src, os.O_RDONLY)
+    try:
+        st_src = os.fstat(fd_in)
+        size   = st_src.st_size
+        fd_out = os.open(partial, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            st_part = os.fstat(fd_out)
+            offset  = st_part.st_size
+            if offset > size or st_part.st_mtime < st_src.st_mtime:
+                offset = 0
+            os.ftruncate(fd_out, offset)
+            if job is not None:
+                job.size, job.done = size, offset
+
+            method = ["copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"]
+            while offset < size:
+                if job is not None and job.preempt.is_set():
+                    raise TransferPreempted(src)
+                if _shutting_down.is_set():
+                    raise InterruptedError("service is shutting down")
+                if time.time() - (pacer.slept if pacer else 0) > deadline:
+                    raise TimeoutError(f"copy timed out at {offset} of {size} bytes")
+                chunk = pacer.chunk_size() if pacer else COPY_CHUNK
+                n = _copy_chunk(fd_in, fd_out, offset, min(chunk, size - offset), method)
+                if n <= 0:
+                    raise OSError(errno.EIO, f"source ended at {offset} of {size} bytes")
+                offset += n
+                if job is not None:
+                    job.done = offset
+                if pacer is not None:
+                    pacer.after(n)
+        finally:
+            os.close(fd_out)
+    finally:
+        os.close(fd_in)
+
+def _copy_metadata(src, dst):
+    """What rsync -a carries over: permission bits, owner and group (as root),
+    and the timestamps."""
+    st = os.stat(src)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    try:
+        os.chown(dst, st.st_uid, st.st_gid)
+    except OSError:
+        pass   # not root; clone_permissions has the final word for copies anyway
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def native_transfer(src, dst, remove_source=True, job=None):
+    """Move (or copy) a file in-process, with the guarantees rsync_transfer has:
+
+    - The data goes to the partial dir and only gets its final name once it is
+      complete, so Unraid never serves a truncated file under the real name.
+    - An interrupted or preempted transfer continues from the bytes already in
+      the partial file instead of reading the source from the start.
+    - Permissions, owner and timestamps are carried over.
+    - Up to RSYNC_RETRIES attempts, RSYNC_RETRY_DELAY apart, each resuming.
+
+    No process per file, and the job's done/size fields give live progress.
+    Raises OSError if the transfer really failed, TransferPreempted if a more
+    urgent copy took its slot.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    partial  = _partial_path(dst)
+    pacer    = TransferPacer("move" if remove_source else "copy",
+                             job is not None and job.priority <= PRIO_NEXT, job, (src, dst))
+    last_err = None
+
+    for attempt in range(1, RSYNC_RETRIES + 1):
+        if job is not None and job.preempt.is_set():
+            raise TransferPreempted(src)
+        # Each attempt gets the whole allowance: a slow first attempt and the
+        # pause after it must not leave a retry only seconds. _native_copy
+        # checks it less pacer.slept, so the waits so far are added back.
+        deadline = time.time() + _rsync_timeout_for(src, dst=dst) + pacer.slept
+        try:
+            _native_copy(src, partial, job, deadline, pacer)
+            _copy_metadata(src, partial)
+            os.replace(partial, dst)
+            try:
+                os.rmdir(os.path.dirname(partial))
+            except OSError:
+                pass   # another file in the same folder is mid-transfer
+            if remove_source:
+                try:
+                    os.remove(src)
+                except OSError as e:
+                    log(f"Could not remove source after transfer: {e}", warn=True)
+            return
+        except OSError as e:
+            last_err = e
+            if job is not None and job.preempt.is_set():
+                raise TransferPreempted(src)
+            if _shutting_down.is_set() or isinstance(e, TimeoutError):
+                break
+            if attempt < RSYNC_RETRIES:
+                log(f"Copy attempt {attempt}/{RSYNC_RETRIES} failed for "
+                    f"{os.path.basename(src)}: {e} — retrying in {RSYNC_RETRY_DELAY}s",
+                    warn=True)
+                time.sleep(RSYNC_RETRY_DELAY)
+
+    raise last_err
+
+def transfer_file(src, dst, remove_source=True, job=None):
+    """Move (or copy) src to dst with the engine COPY_ENGINE selects.
+
+    Both engines behave the same towards callers; rsync stays selectable so the
+    two can be compared on real hardware - every transfer logs its throughput
+    and the engine that moved it."""
+    engine = "rsync" if cfg("COPY_ENGINE").strip().lower() == "rsync" else "native"
+    try:
+        size = os.path.getsize(src)
+    except OSError:
+        size = 0
+    try:
+        resumed = os.path.getsize(_partial_path(dst))
+    except OSError:
+        resumed = 0
+    urgent  = job is not None and job.priority <= PRIO_NEXT
+    capped  = transfer_cap("move" if remove_source else "copy", urgent) is not None
+    waited  = io_governor.waited()
+    started = time.time()
+    if engine == "rsync":
+        rsync_transfer(src, dst, remove_source=remove_source, job=job)
+    else:
+        native_transfer(src, dst, remove_source=remove_source, job=job)
+    held    = io_governor.waited() - waited
+    elapsed = max(time.time() - started - held, 0.001)
+    log(f"[Transfer] {os.path.basename(dst)}: {size / 1048576:.0f} MB in {elapsed:.1f}s "
+        f"({size / 1048576 / elapsed:.0f} MB/s, {engine})")
+    # A capped or governed transfer measures the cap, not the disks
+    if not capped and not held:
+        throughput.record(src, dst, max(0, size - resumed), elapsed)
+
+def copy_files(src_dir, dst_dir, names, settle, job=None):
+    """Copy the named files from src_dir into dst_dir as one batch, with the
+    engine COPY_ENGINE selects: rsync gets them in a single run, the native
+    engine takes them one after the other in-process. settle(name, error) is
+    called for each file as soon as it is finished with - error None on
+    success - so a batch cut short still records what it got through."""
+    if len(names) == 1:
+        # A batch of one is an ordinary transfer
+        if job is not None:
+            job.current = os.path.join(src_dir, names[0])
+        try:
+            transfer_file(os.path.join(src_dir, names[0]), os.path.join(dst_dir, names[0]),
+                          remove_source=False, job=job)
+        except (OSError, subprocess.CalledProcessError) as e:
+            settle(names[0], e)
+            return
+        settle(names[0], None)
+        return
+
+    engine = "rsync" if cfg("COPY_ENGINE").strip().lower() == "rsync" else "native"
+    size, resumed = 0, 0
+    for name in names:
+        try:
+            size += os.path.getsize(os.path.join(src_dir, name))
+            resumed += os.path.getsize(_partial_path(os.path.join(dst_dir, name)))
+        except OSError:
+            pass
+    copied = []
+
+    def settle_and_count(name, error):
+        if error is None:
+            copied.append(name)
+        settle(name, error)
+
+    urgent  = job is not None and job.priority <= PRIO_NEXT
+    capped  = transfer_cap("copy", urgent) is not None
+    waited  = io_governor.waited()
+    started = time.time()
+    if engine == "rsync":
+        rsync_copy_many(src_dir, dst_dir, names, settle_and_count, job=job)
+    else:
+        for name in names:
+            src = os.path.join(src_dir, name)
+            if job is not None:
+                job.current = src
+            try:
+                native_transfer(src, os.path.join(dst_dir, name), remove_source=False, job=job)
+            except OSError as e:
+                settle_and_count(name, e)
+                continue
+            settle_and_count(name, None)
+    held    = io_governor.waited() - waited
+    elapsed = max(time.time() - started - held, 0.001)
+    log(f"[Transfer] {os.path.basename(dst_dir)}: {len(names)} files, "
+        f"{size / 1048576:.0f} MB in {elapsed:.1f}s ({size / 1048576 / elapsed:.0f} MB/s, {engine})")
+    if not capped and not held and len(copied) == len(names):
+        throughput.record(src_dir, dst_dir, max(0, size - resumed), elapsed)
+
 def _protected_cache_dirs():
     """Dirs inside CACHE_ROOT that must never be rmdir'd by cleanup_empty_dirs.
     Derived from the docker mappings: every mapped host path, translated to
@@ -572,7 +2577,10 @@ def move_file_to_array(cache_path, track=True):
         # No clone_permissions here: it copies the array original's ownership
         # onto a cache copy, and this direction has no original to read from -
         # the call returned immediately. rsync -a carries them across as root.
-        rsync_transfer(cache_path, array_path, remove_source=True)
+        # Written straight to the disk holding the folder where there is one,
+        # bypassing the user-share FUSE layer.
+        transfer_file(cache_path, disk_resolver.for_write(array_path, size),
+                      remove_source=True)
         cleanup_empty_dirs(cache_path)
         if track:
             TrackedFiles.remove(cache_path)
@@ -583,51 +2591,276 @@ def move_file_to_array(cache_path, track=True):
         log(f"Move failed for {os.path.basename(cache_path)}: {e} {detail}".strip(), error=True)
         return False, False, 0
 
-def cache_has_room_for(file_size):
-    """Check both the configured max-usage percentage and the actual free
-    bytes needed for this specific file (plus a small safety margin)."""
+class SpaceLedger:
+    """Cache space promised to copies that are admitted but not finished.
+
+    Checking each file against the free space on its own lets two workers,
+    or the files of one batch, each see room that only exists once: together
+    they fill the cache past CACHE_MAX_USAGE. So a copy is admitted only
+    against free space minus what earlier admissions reserved, and reserves
+    its own size in the same step. The reservation is released once the
+    file is on the cache (its bytes now count as used) or its copy failed or
+    was preempted. A copy half done is counted twice - its partial file and
+    its full reservation - which errs on the side of room.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._held = {}           # cache path -> bytes reserved
+
+    def outstanding(self):
+        with self._lock:
+            return sum(self._held.values())
+
+    def admit(self, cache_path, nbytes):
+        """Reserve nbytes for cache_path if they fit beside every other
+        reservation. Already holding one counts as admitted."""
+        with self._lock:
+            if cache_path in self._held:
+                return True
+            if not cache_has_room_for(nbytes):
+                return False
+            self._held[cache_path] = nbytes
+            return True
+
+    def release(self, cache_path):
+        with self._lock:
+            self._held.pop(cache_path, None)
+
+space_ledger = SpaceLedger()
+
+def cache_deficit(file_size):
+    """Bytes that would have to leave the cache before file_size fits, by the
+    same two rules as cache_has_room_for(): usage with the file below
+    CACHE_MAX_USAGE, and file_size plus CACHE_HEADROOM free - both after the
+    space_ledger reservations of copies still under way. 0 if it fits now,
+    None if the cache cannot be measured."""
     try:
         usage = shutil.disk_usage(cfg("CACHE_ROOT"))
     except OSError as e:
         log(f"Cannot stat cache filesystem: {e}", error=True)
-        return False
-    if (usage.used / usage.total) * 100 >= cfg("CACHE_MAX_USAGE", as_int=True):
-        return False
-    margin = 512 * 1024 * 1024  # keep at least 512 MB headroom
-    return usage.free > file_size + margin
+        return None
+    reserved = space_ledger.outstanding()
+    # Room means (used + file) * 100 < total * max and free > file + headroom;
+    # the deficit is what brings both just past their limits
+    committed = usage.used + reserved + file_size
+    over_pct  = committed * 100 - usage.total * cfg("CACHE_MAX_USAGE", as_int=True)
+    over_free = file_size + reserved + CACHE_HEADROOM - usage.free
+    return max(0, over_pct // 100 + 1 if over_pct >= 0 else 0,
+               over_free + 1 if over_free >= 0 else 0)
+
+def cache_has_room_for(file_size):
+    """Check both the configured max-usage percentage - with this file on the
+    cache too - and the actual free bytes needed for this specific file (plus
+    a small safety margin)."""
+    return cache_deficit(file_size) == 0
+
+def plan_eviction(deficit, protected, policy):
+    """The files to move back to the array to free deficit bytes: the first
+    in the policy's order, as few as cover it, at most EVICT_MAX_FILES.
+    Returns (victims, freed, satisfied) - the plan is worked out from recorded
+    sizes alone, so an unsatisfiable one is known before anything moves."""
+    victims, freed = [], 0
+    for cache_path, size in policy.order(TrackedFiles.entries()):
+        if freed >= deficit or len(victims) >= EVICT_MAX_FILES:
+            break
+        if cache_path in protected or not tracking_confirmed(cache_path):
+            continue
+        if size is None:
+            size = _size_or_none(cache_path)
+            if size is None:
+                TrackedFiles.remove(cache_path)
+                continue
+        victims.append(cache_path)
+        freed += size
+    return victims, freed, freed >= deficit
+
+_evict_shortfall = {"key": None, "logged": 0.0}   # the last "Cannot make room" logged
 
 def evict_oldest_cached(needed_size):
-    """LRU eviction: when the cache is full, move the oldest plugin-cached
-    files back to the array until needed_size fits (bounded by
-    EVICT_MAX_FILES per pass). Files that belong to an active stream or
-    are queued for copying are never evicted.
+    """When the cache is full, move plugin-cached files back to the array
+    until needed_size fits (bounded by EVICT_MAX_FILES per pass), in the
+    order EVICTION_POLICY gives - by default the oldest copies first. Files
+    that belong to an active stream or are queued for copying are never
+    evicted.
+
+    The shortfall is measured once and the victims chosen up front by
+    plan_eviction(). If even EVICT_MAX_FILES of them cannot free enough,
+    nothing is moved: evicting a pile of files and then still not copying is
+    the worst of both. Every copy that does not fit ends up here, every poll,
+    so the same shortfall is logged once per EVICT_WARN_EVERY.
 
     Returns True if there is room for needed_size afterwards."""
     if not cfg("ENABLE_CACHE_EVICTION", as_bool=True):
         return False
 
+    # Several copy workers can run out of room at the same moment. Two passes
+    # side by side would pick the same oldest files and race to move them.
+    with _evict_lock:
+        deficit = cache_deficit(needed_size)
+        if deficit is None:
+            return False
+        if deficit == 0:
+            return True
+
+        policy = eviction_policy()
+        victims, freed, satisfied = plan_eviction(deficit, _eviction_protected(), policy)
+        if not satisfied:
+            key = (len(victims), freed)
+            if (key != _evict_shortfall["key"]
+                    or time.time() - _evict_shortfall["logged"] >= EVICT_WARN_EVERY):
+                log(f"[Evict] Cannot make room for {needed_size / 1048576:.0f} MB: "
+                    f"{len(victims)} evictable file(s) free only {freed / 1048576:.0f} "
+                    f"of {deficit / 1048576:.0f} MB - nothing moved", warn=True)
+                _evict_shortfall.update(key=key, logged=time.time())
+            return False
+
+        _evict_shortfall["key"] = None
+        evict_files(victims, policy, "making room on cache")
+        return cache_has_room_for(needed_size)
+
+def _eviction_protected():
+    """Cache paths eviction must leave alone: streams and queued copies."""
     with _pending_lock:
         pending = {array_to_cache(p) for p in _pending_copies}
-    protected = set(active_cache_paths) | pending
-
-    tracked = TrackedFiles.load()
-    evicted = 0
-    for cache_path, _ts in sorted(tracked.items(), key=lambda kv: kv[1]):
-        if cache_has_room_for(needed_size):
-            return True
-        if evicted >= EVICT_MAX_FILES:
-            break
-        if cache_path in protected:
-            continue
-        if not os.path.exists(cache_path):
-            TrackedFiles.remove(cache_path)
-            continue
-        log(f"[Evict] {os.path.basename(cache_path)} (making room on cache)")
-        ok, _, _ = move_file_to_array(cache_path)
+    return set(active_cache_paths) | pending
+
+def evict_files(victims, policy, why):
+    """Move planned victims back to the array. Returns (files, bytes) moved."""
+    files = nbytes = 0
+    for cache_path in victims:
+        log(f"[Evict] {os.path.basename(cache_path)} ({why}, {policy.name})")
+        ok, _, size = move_file_to_array(cache_path)
         if ok:
-            evicted += 1
+            policy.evicted(cache_path)
+            files  += 1
+            nbytes += size
+    return files, nbytes
+
+class SpaceReclaimer:
+    """Evicts in the background, so a new stream's copy finds room instead of
+    first waiting for other files to go back to the array.
+
+    Usage is counted as what is on the cache plus what the copy queue is
+    about to put there. Once that reaches RECLAIM_HIGH_PCT, files leave in
+    EVICTION_POLICY order - at most EVICT_MAX_FILES per pass, passes back to
+    back - until it is down to RECLAIM_LOW_PCT; then nothing happens until it
+    reaches the high mark again. The gap between the two keeps it from
+    moving one file every time a copy lands. Checks run every
+    RECLAIM_INTERVAL seconds and whenever a copy is queued.
+
+    Usage is that of the whole pool - appdata, VMs and downloads included.
+    When the plugin's own evictable files cannot bring it down to the low
+    mark, none are moved: that would empty the cache of them only for the
+    next copies to come straight back. It then waits until usage has moved
+    by a percent of the pool, or RECLAIM_STUCK_RETRY has passed, before
+    trying (and logging) again.
+
+    evict_oldest_cached() stays as the fallback for a copy that still does
+    not fit, and it and this take turns through _evict_lock. Each pass also
+    has TrackedFiles.verify() re-check the next few tracked files.
+    """
+
+    def __init__(self):
+        self._wake  = threading.Event()
+        self.active = False       # between crossing the high mark and reaching the low one
+        self.files  = 0           # evicted since startup
+        self.bytes  = 0
+        self.last   = None        # when it last evicted something
+        self._stuck = None        # (usage, time) when the low mark proved out of reach
 
-    return cache_has_room_for(needed_size)
+    @staticmethod
+    def watermarks():
+        """(high, low) in %, or None when background eviction is off. Neither
+        is allowed above CACHE_MAX_USAGE, nor low above high."""
+        if not cfg("ENABLE_CACHE_EVICTION", as_bool=True):
+            return None
+        high = min(cfg("RECLAIM_HIGH_PCT", as_int=True), cfg("CACHE_MAX_USAGE", as_int=True))
+        if high <= 0:
+            return None
+        return high, max(0, min(cfg("RECLAIM_LOW_PCT", as_int=True), high))
+
+    def poke(self):
+        self._wake.set()
+
+    def reclaim_once(self):
+        """One pass. Returns True if another pass should follow right away."""
+        marks = self.watermarks()
+        if marks is None:
+            self.active = False
+            return False
+        high, low = marks
+        try:
+            usage = shutil.disk_usage(cfg("CACHE_ROOT"))
+        except OSError:
+            return False
+        with _pending_lock:
+            pending = list(_pending_sizes.items())
+        # A queued file already on the cache is in usage.used once already
+        queued = sum(nbytes for path, (_disk, nbytes) in pending
+                     if not os.path.exists(array_to_cache(path)))
+        used = usage.used + queued
+        if self._stuck is not None:
+            stuck_used, since = self._stuck
+            if (abs(used - stuck_used) < usage.total // 100
+                    and time.time() - since < RECLAIM_STUCK_RETRY):
+                return False
+            self._stuck = None
+        if not self.active and used * 100 < usage.total * high:
+            return False
+        excess = used - usage.total * low // 100
+        if excess <= 0:
+            self.active = False
+            return False
+
+        with _evict_lock:
+            policy = eviction_policy()
+            protected = _eviction_protected()
+            if not self.active:
+                evictable = sum(size or 0 for path, _ts, size in TrackedFiles.entries()
+                                if path not in protected and tracking_confirmed(path))
+                if evictable < excess:
+                    log(f"[Reclaim] Cache at {used * 100 // usage.total}% - the plugin's own "
+                        f"files cannot bring it down to {low}%, leaving them", warn=True)
+                    self._stuck = (used, time.time())
+                    return False
+                log(f"[Reclaim] Cache at {used * 100 // usage.total}% with queued copies - "
+                    f"evicting down to {low}%")
+                self.active = True
+            victims, _freed, _satisfied = plan_eviction(excess, protected, policy)
+            if not victims:
+                log("[Reclaim] Nothing left that may be evicted", warn=True)
+                self.active = False
+                self._stuck = (used, time.time())
+                return False
+            files, nbytes = evict_files(victims, policy, "cache above high mark")
+        self.files += files
+        self.bytes += nbytes
+        if files:
+            self.last = int(time.time())
+        return files > 0
+
+    def snapshot(self):
+        marks = self.watermarks()
+        return {"high": marks[0] if marks else None, "low": marks[1] if marks else None,
+                "active": self.active, "files": self.files, "bytes": self.bytes,
+                "last": self.last}
+
+    def run(self):
+        while not _shutting_down.is_set():
+            self._wake.wait(RECLAIM_INTERVAL)
+            self._wake.clear()
+            try:
+                while self.reclaim_once() and not _shutting_down.is_set():
+                    pass
+                # A few tracked files per pass, so files deleted by hand leave
+                # the totals - here rather than in the main loop, whose passes
+                # should not wait on the cache's disks
+                TrackedFiles.verify()
+            except Exception as e:
+                log(f"Reclaim error: {e}", error=True)
+
+space_reclaimer = SpaceReclaimer()
 
 def _cache_media_files(min_age_seconds, roots=None):
     """Media files sitting in the mapped cache folders, whether this plugin put
@@ -733,6 +2966,9 @@ def flush_cache_to_array(only=None, label="Flush"):
                 log(f"[{label}] Aborted: service is shutting down", warn=True)
                 break
 
+            # Background work: wait here while the disks are busy elsewhere
+            io_governor.hold()
+
             # Read this per file rather than snapshotting it once: the main
             # loop replaces active_cache_paths every pass, and a move can run
             # for minutes. A stream started halfway through has to be protected
@@ -835,121 +3071,759 @@ def start_flush(only=None, label="Flush"):
                      kwargs={"only": only, "label": label}).start()
     return True
 
-def copy_file_to_cache(array_path):
-    """Copy file from array to cache. Runs inside the copy worker thread."""
+def _copy_candidate(array_path):
+    """Size of array_path if it still has to be copied to cache, else None.
+
+    A file already on cache at the same size is adopted into the tracked list
+    on the way; one that failed within COPY_FAIL_COOLDOWN is left alone so a
+    broken file does not hammer the disks and the log every poll."""
     if is_excluded(array_path) or not is_media_file(os.path.basename(array_path)):
-        return
+        return None
 
     cache_path = array_to_cache(array_path)
 
     # Already cached and same size?
     if os.path.exists(cache_path):
         try:
-            if os.path.getsize(array_path) == os.path.getsize(cache_path):
+            size = os.path.getsize(cache_path)
+            if os.path.getsize(array_path) == size:
                 deletion_queue.pop(cache_path, None)
-                TrackedFiles.add(cache_path)
-                return
+                TrackedFiles.add(cache_path, size=size)
+                return None
         except OSError:
             pass
 
-    # Recently failed? Don't hammer the disks / spam the log every poll.
     last_fail = failed_copies.get(cache_path, 0)
     if time.time() - last_fail < COPY_FAIL_COOLDOWN:
-        return
-
-    if not os.path.exists(array_path):
-        return
+        return None
 
     try:
-        file_size = os.path.getsize(array_path)
+        return os.path.getsize(array_path)
     except OSError:
-        return
-
-    if not cache_has_room_for(file_size) and not evict_oldest_cached(file_size):
-        return
+        return None
 
-    log(f"[Copy] -> {os.path.basename(array_path)}")
-    try:
-        # Create directory structure with proper permissions
-        cache_dir  = os.path.dirname(cache_path)
-        cache_root = cfg("CACHE_ROOT")
-        cur = cache_root
-        for part in os.path.relpath(cache_dir, cache_root).split(os.sep):
-            if not part or part == '.':
-                continue
-            cur = os.path.join(cur, part)
-            if not os.path.exists(cur):
+def _make_cache_dirs(cache_dir):
+    """Create cache_dir and any missing parents below CACHE_ROOT, each with the
+    permissions of its array counterpart."""
+    cache_root = cfg("CACHE_ROOT")
+    cur = cache_root
+    for part in os.path.relpath(cache_dir, cache_root).split(os.sep):
+        if not part or part == '.':
+            continue
+        cur = os.path.join(cur, part)
+        if not os.path.exists(cur):
+            # Another worker copying a sibling file may create it first
+            try:
                 os.mkdir(cur)
-                clone_permissions(cur)
+            except FileExistsError:
+                continue
+            clone_permissions(cur)
+
+def copy_files_to_cache(array_paths, job=None):
+    """Copy files from array to cache. Runs inside a copy worker thread; job is
+    the CopyJob they belong to, through which a more urgent copy can preempt
+    it (TransferPreempted is raised to the worker).
+
+    Files from the same folder - an episode and its subtitles, a batch of a
+    season - go over in one transfer, with the directory chain created once.
+    Each file still succeeds or fails on its own: the tracked list and
+    failed_copies are updated per file, and every file the job is finished
+    with, copied or not, leaves job.batch, so what remains there after a
+    preemption is exactly what still has to be done.
+    """
+    def finished(array_path):
+        if job is not None and array_path in job.batch:
+            job.batch.remove(array_path)
+
+    # Read from the disk holding each file rather than through the user-share
+    # FUSE layer. Two files of one share folder can sit on different disks, so
+    # a batch is a folder on one disk.
+    folders = {}
+    for array_path in array_paths:
+        size = _copy_candidate(array_path)
+        if size is None:
+            finished(array_path)
+            continue
+        src = disk_resolver.physical(array_path)
+        key = (os.path.dirname(array_path), os.path.dirname(src))
+        folders.setdefault(key, []).append((array_path, size))
+
+    for (share_dir, src_dir), files in folders.items():
+        # Admit files while the cache has room for them beside everything
+        # already admitted, here and in the other workers
+        names = []
+        for array_path, size in files:
+            cache_path = array_to_cache(array_path)
+            if space_ledger.admit(cache_path, size) or (
+                    evict_oldest_cached(size) and space_ledger.admit(cache_path, size)):
+                names.append(os.path.basename(array_path))
+            else:
+                finished(array_path)
+        if not names:
+            continue
 
-        rsync_transfer(array_path, cache_path, remove_source=False)
-        clone_permissions(cache_path)
-        TrackedFiles.add(cache_path)
-        failed_copies.pop(cache_path, None)
-    except (OSError, subprocess.CalledProcessError) as e:
-        detail = getattr(e, 'stderr', '') or ''
-        log(f"Copy failed for {os.path.basename(array_path)}: {e} {detail}".strip(), error=True)
-        failed_copies[cache_path] = time.time()
+        sizes = {os.path.basename(a): size for a, size in files}
+        dst_dir = os.path.dirname(array_to_cache(os.path.join(share_dir, names[0])))
+        if len(names) == 1:
+            log(f"[Copy] -> {names[0]}")
+        else:
+            log(f"[Copy] -> {names[0]} and {len(names) - 1} more from {os.path.basename(share_dir)}")
+
+        def settle(name, error, share_dir=share_dir, sizes=sizes):
+            array_path = os.path.join(share_dir, name)
+            cache_path = array_to_cache(array_path)
+            if error is None:
+                try:
+                    clone_permissions(cache_path)
+                    TrackedFiles.add(cache_path, disk_resolver.disk_of(array_path), sizes[name])
+                    access_history.cached(cache_path)
+                    failed_copies.pop(cache_path, None)
+                except OSError as e:
+                    error = e
+            if error is not None:
+                detail = getattr(error, 'stderr', '') or ''
+                log(f"Copy failed for {name}: {error} {detail}".strip(), error=True)
+                failed_copies[cache_path] = time.time()
+            space_ledger.release(cache_path)
+            finished(array_path)
+
+        try:
+            _make_cache_dirs(dst_dir)
+        except OSError as e:
+            for name in names:
+                settle(name, e)
+            continue
+        try:
+            copy_files(src_dir, dst_dir, names, settle, job=job)
+        finally:
+            # Preempted or crashed: whatever was not settled is not coming now
+            for name in names:
+                space_ledger.release(array_to_cache(os.path.join(share_dir, name)))
 
 # =============================================================================
 # COPY WORKER — transfers happen off the main loop
 # =============================================================================
 
-def enqueue_copy(array_path):
-    """Queue a file for copying to cache. De-duplicates: a path that is
-    already queued (or being copied right now) is not queued again."""
+# Copy priorities, most urgent first. A movie started a moment ago must not
+# wait behind a 30-episode batch or next season's prefetch.
+PRIO_PLAYING  = 0   # the file being streamed, and its sidecars
+PRIO_NEXT     = 1   # the episode after it
+PRIO_BATCH    = 2   # the rest of the season or batch
+PRIO_PREFETCH = 3   # the start of the next season
+
+class CopyJob:
+    """One file on its way through CopyQueue - or, once get() has folded its
+    neighbours in, every file of a folder that goes over together. path is the
+    one it was queued for; batch lists all of them still to do."""
+
+    __slots__ = ("path", "batch", "current", "disk", "priority", "queued_at", "seq",
+                 "suspended", "preempt", "proc", "done", "size")
+
+    def __init__(self, path, disk, priority, seq):
+        self.path      = path
+        self.batch     = [path]
+        self.current   = None         # the file being transferred right now
+        self.disk      = disk
+        self.priority  = priority
+        self.queued_at = time.time()
+        self.seq       = seq
+        self.suspended = False        # preempted before, partial data on cache
+        self.preempt   = threading.Event()
+        self.proc      = None         # rsync running for it, if any
+        self.done      = None         # bytes written so far (native engine only)
+        self.size      = None
+
+    def cancel(self):
+        """Ask the running transfer to stop and keep its partial data."""
+        with _rsync_lock:
+            self.preempt.set()
+            proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+class CopyQueue:
+    """Queued copies, handed to the workers most urgent first, so that no more
+    than COPY_WORKERS run at once and no more than COPY_PER_DISK read from the
+    same disk.
+
+    A plain queue.Queue hands out whatever comes next, so a second worker would
+    start another read on the disk the first one is busy with: two streams of
+    seeks on one spindle, each slower than one alone. Here a worker skips past
+    jobs whose disk is saturated and takes the most urgent one that can start
+    now. Jobs on an unknown disk are limited by the global count only.
+
+    Urgency is the PRIO_* level, lowered by one for every COPY_AGING_SECONDS a
+    job has waited, so a prefetch behind a steady trickle of new streams still
+    runs eventually. Equal urgency goes in arrival order.
+
+    A job that cannot start because the slot it needs is taken by less urgent
+    work preempts that work: the running copy is stopped, keeps its partial
+    data, and returns to the queue as suspended to be resumed afterwards.
+
+    A job taken by get() brings along the queued jobs for the same folder, disk
+    and priority level - up to COPY_BATCH_MAX files - so a season goes over in
+    one transfer rather than one per episode and sidecar.
+
+    Speculative work - the rest of a batch, a prefetch - is not worth waking a
+    disk for: nobody is waiting on it yet. It stays queued while its disk is
+    in standby and goes ahead once the disk spins for some other reason;
+    disks that are awake anyway are read from side by side as before. Copies
+    somebody is watching are exempt. standby is the probe that says whether
+    a disk sleeps; disk_in_standby by default.
+    """
+
+    def __init__(self, standby=None):
+        self._cond     = threading.Condition()
+        self._items    = []       # CopyJob waiting
+        self._active   = []       # CopyJob running
+        self._busy     = {}       # disk -> transfers running from it
+        self._seq      = 0
+        self._standby  = standby or disk_in_standby
+
+    def put(self, array_path, disk=None, priority=PRIO_BATCH):
+        with self._cond:
+            self._seq += 1
+            job = CopyJob(array_path, disk, priority, self._seq)
+            self._items.append(job)
+            self._preempt_for(job)
+            self._cond.notify()
+
+    def raise_priority(self, array_path, priority):
+        """Make a queued or running file at least as urgent as priority.
+        Returns True if it was here. A file that waits inside a queued batch
+        is taken out of it, rather than rushing the whole folder. One inside a
+        batch a worker already has cannot leave the transfer under way, so
+        that job is raised instead: the rest of it is paced as urgent and less
+        urgent work no longer preempts it."""
+        with self._cond:
+            for job in self._items:
+                if array_path not in job.batch:
+                    continue
+                if priority < job.priority:
+                    if len(job.batch) > 1:
+                        job.batch.remove(array_path)
+                        if job.path == array_path:
+                            job.path = job.batch[0]
+                        self._seq += 1
+                        split = CopyJob(array_path, job.disk, priority, self._seq)
+                        split.suspended = job.suspended
+                        self._items.append(split)
+                        job = split
+                    job.priority = priority
+                    self._preempt_for(job)
+                    self._cond.notify()
+                return True
+            for job in self._active:
+                if array_path in job.batch:
+                    job.priority = min(job.priority, priority)
+                    return True
+        return False
+
+    def limits(self):
+        """(copies at once, copies per disk), as configured right now."""
+        return (max(1, cfg("COPY_WORKERS", as_int=True)),
+                max(1, cfg("COPY_PER_DISK", as_int=True)))
+
+    def _preempt_for(self, job):
+        """Stop the least urgent running copy standing in job's way, if any.
+        Only the fixed PRIO_* level counts here, not aging: a prefetch that has
+        waited long may be taken first, but it does not get to interrupt."""
+        workers, per_disk = self.limits()
+        if job.disk is not None and self._busy.get(job.disk, 0) >= per_disk:
+            blocking = [j for j in self._active if j.disk == job.disk]
+        elif len(self._active) >= workers:
+            blocking = list(self._active)
+        else:
+            return
+        if any(j.preempt.is_set() for j in blocking):
+            return                 # a slot is already being freed
+        victims = [j for j in blocking if j.priority > job.priority]
+        if not victims:
+            return
+        victim = max(victims, key=lambda j: (j.priority, j.seq))
+        log(f"[Copy] Suspending {os.path.basename(victim.path)} for "
+            f"{os.path.basename(job.path)}")
+        victim.cancel()
+
+    @staticmethod
+    def _urgency(job, now):
+        return (job.priority - (now - job.queued_at) / COPY_AGING_SECONDS, job.seq)
+
+    @staticmethod
+    def _speculative(job):
+        return job.priority >= PRIO_BATCH and job.disk is not None
+
+    def _sleeping(self, disk):
+        try:
+            return bool(self._standby(disk))
+        except Exception:
+            return False
+
+    def _startable(self):
+        workers, per_disk = self.limits()
+        if len(self._active) >= workers:
+            return None
+        now  = time.time()
+        best = None
+        for i, job in enumerate(self._items):
+            if job.disk is not None and self._busy.get(job.disk, 0) >= per_disk:
+                continue
+            if self._speculative(job) and self._sleeping(job.disk):
+                continue
+            if best is None or self._urgency(job, now) < self._urgency(self._items[best], now):
+                best = i
+        return best
+
+    def get(self, timeout=None):
+        """Take the most urgent job that may start now, or None if nothing
+        became startable within timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                idx = self._startable()
+                if idx is not None:
+                    job = self._items.pop(idx)
+                    self._coalesce(job)
+                    job.preempt.clear()
+                    self._active.append(job)
+                    if job.disk is not None:
+                        self._busy[job.disk] = self._busy.get(job.disk, 0) + 1
+                    return job
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _coalesce(self, job):
+        """Fold the queued jobs that share job's folder, disk and priority
+        level into it, in queue order."""
+        folder = os.path.dirname(job.path)
+        for other in list(self._items):
+            if len(job.batch) >= COPY_BATCH_MAX:
+                break
+            if (other.disk == job.disk and other.priority == job.priority
+                    and os.path.dirname(other.path) == folder
+                    and len(job.batch) + len(other.batch) <= COPY_BATCH_MAX):
+                self._items.remove(other)
+                job.batch.extend(other.batch)
+                job.suspended = job.suspended or other.suspended
+
+    def done(self, job, requeue=False):
+        """A job handed out by get() has finished, or - with requeue - was
+        preempted and waits again as suspended, holding the files of its batch
+        not yet done. Its slots are free either way."""
+        with self._cond:
+            self._active.remove(job)
+            if job.disk is not None:
+                self._busy[job.disk] -= 1
+                if not self._busy[job.disk]:
+                    del self._busy[job.disk]
+            if requeue and job.batch:
+                job.suspended = True
+                if job.path not in job.batch:
+                    job.path = job.batch[0]
+                job.current = None
+                self._items.append(job)
+            self._cond.notify_all()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def suspended(self):
+        """Paths of preempted jobs waiting to be resumed."""
+        with self._cond:
+            return [p for j in self._items if j.suspended for p in j.batch]
+
+    def running(self):
+        """(path, bytes done, size) of every running job; the byte counts are
+        None when the engine does not report progress."""
+        with self._cond:
+            return [(j.current or j.path, j.done, j.size) for j in self._active]
+
+    def deferred(self):
+        """Paths of queued speculative copies whose disk is in standby."""
+        with self._cond:
+            return [p for j in self._items
+                    if self._speculative(j) and self._sleeping(j.disk) for p in j.batch]
+
+    def active_disks(self):
+        with self._cond:
+            return {j.disk for j in self._active}
+
+copy_queue = CopyQueue()
+
+def enqueue_copy(array_path, priority=PRIO_BATCH):
+    """Queue a file for copying to cache at the given PRIO_* level.
+    De-duplicates: a path that is already queued (or being copied right now)
+    is not queued again, but a queued one is moved up if it has become more
+    urgent - the next episode of a batch turns into the playing one."""
     with _pending_lock:
         if array_path in _pending_copies:
+            copy_queue.raise_priority(array_path, priority)
             return
         _pending_copies.add(array_path)
-    copy_queue.put(array_path)
+    # Every wanted episode comes through here on every poll; one already on
+    # cache is settled by a stat or two, before any disk is looked for
+    nbytes = _copy_candidate(array_path)
+    if nbytes is None:
+        with _pending_lock:
+            _pending_copies.discard(array_path)
+        return
+    disk = source_disk(array_path)
+    with _pending_lock:
+        _pending_sizes[array_path] = (disk, nbytes)
+    copy_queue.put(array_path, disk, priority)
+    space_reclaimer.poke()
 
 def copy_worker():
-    """Single worker thread: copies queued files one at a time, in order.
+    """One of COPY_WORKERS worker threads. Each takes whatever copy_queue says
+    may start now, so the pool together never puts two readers on one disk.
     Keeping this off the main thread means a long-running transfer never
     blocks stream polling or cleanup."""
-    global _current_copy
+    name = threading.current_thread().name
     while not _shutting_down.is_set():
-        try:
-            array_path = copy_queue.get(timeout=1)
-        except queue.Empty:
+        job = copy_queue.get(timeout=1)
+        if job is None:
             continue
-        _current_copy = os.path.basename(array_path)
+        taken = list(job.batch)
+        with _pending_lock:
+            _current_copies[name] = job
+        if job.suspended:
+            log(f"[Copy] Resuming {os.path.basename(job.path)}")
+        preempted = False
         try:
-            copy_file_to_cache(array_path)
+            copy_files_to_cache(taken, job)
+        except TransferPreempted:
+            # What is left of the batch stays in _pending_copies: it is still
+            # queued, just not running
+            preempted = not _shutting_down.is_set()
         except Exception as e:
-            log(f"Copy worker error for {array_path}: {e}", error=True)
+            log(f"Copy worker error for {job.path}: {e}", error=True)
         finally:
-            _current_copy = None
             with _pending_lock:
-                _pending_copies.discard(array_path)
-            copy_queue.task_done()
+                _current_copies.pop(name, None)
+                left = set(job.batch) if preempted else set()
+                for path in taken:
+                    if path not in left:
+                        _pending_copies.discard(path)
+                        _pending_sizes.pop(path, None)
+            copy_queue.done(job, requeue=preempted)
+
+def queue_forecast():
+    """Seconds until everything queued is on cache, going by the learned
+    speeds, or None while nothing has been learned yet.
+
+    Each disk's share is read at the speed learned for it, COPY_PER_DISK at a
+    time, and the pool as a whole runs COPY_WORKERS at once - the forecast is
+    whichever of the two takes longer. Copies waiting for a sleeping disk are
+    left out: they will run whenever the disk wakes, which no speed predicts.
+    """
+    with _pending_lock:
+        pending = dict(_pending_sizes)
+    if not pending:
+        return 0
+    progress = {path: done for path, done, _size in copy_queue.running() if done}
+    deferred = set(copy_queue.deferred())
+    cache    = cfg("CACHE_ROOT")
+    fallback = throughput.average()
+    per_disk = {}
+    for path, (disk, nbytes) in pending.items():
+        if path in deferred:
+            continue
+        rate = throughput.estimate(disk or path, cache) or fallback
+        if not rate:
+            return None
+        remaining = max(0, nbytes - progress.get(path, 0))
+        per_disk[disk] = per_disk.get(disk, 0.0) + remaining / rate
+    if not per_disk:
+        return 0
+    workers, per = copy_queue.limits()
+    slowest = max(t / (per if disk else workers) for disk, t in per_disk.items())
+    return int(max(slowest, sum(per_disk.values()) / workers))
+
+_copy_workers = []                # worker threads started so far
+
+def start_copy_workers():
+    """Grow the worker pool to COPY_WORKERS threads. Run again on every config
+    reload: a raised COPY_WORKERS gets its threads here, a lowered one leaves
+    the extra threads idle, as copy_queue starts no more than COPY_WORKERS
+    jobs at once. Returns the threads."""
+    while len(_copy_workers) < max(1, cfg("COPY_WORKERS", as_int=True)):
+        t = threading.Thread(target=copy_worker, daemon=True,
+                             name=f"copy-worker-{len(_copy_workers) + 1}")
+        t.start()
+        _copy_workers.append(t)
+    return list(_copy_workers)
+
+# =============================================================================
+# PAGE CACHE WARMING — smooth playback until the cached copy takes over
+# =============================================================================
+
+class PageCacheWarmer:
+    """Asks the kernel to read ahead of the playback position of streams that
+    are still served from the array.
+
+    Between stream detection and the end of its copy - COPY_DELAY plus however
+    long the queue takes - the viewer reads straight off a spinning disk, and a
+    seek elsewhere on that disk stalls playback. posix_fadvise(WILLNEED) on the
+    region just ahead of the position makes the kernel fetch it in the
+    background, so the player finds it in RAM.
+
+    Bounded: each stream gets at most WARM_AHEAD_MB, all of them together at
+    most WARM_BUDGET_MB, and with more than WARM_MAX_STREAMS uncached streams
+    it stops altogether - at that point the disks are busy enough without it.
+    A region already advised is not advised again until playback passes it.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._targets = {}        # array path -> playback progress (0-1 or None)
+        self._state   = {}        # array path -> {"path", "size", "end"}
+        self._wake    = threading.Event()
+
+    def update(self, targets):
+        """Replace the set of streams to warm: {array_path: progress}."""
+        with self._lock:
+            self._targets = dict(targets)
+            for path in list(self._state):
+                if path not in self._targets:
+                    del self._state[path]
+        self._wake.set()
+
+    @staticmethod
+    def window(streams):
+        """Bytes of read-ahead per stream with this many streams to warm."""
+        if streams <= 0 or streams > WARM_MAX_STREAMS:
+            return 0
+        ahead  = max(0, cfg("WARM_AHEAD_MB", as_int=True)) * 1048576
+        budget = max(0, cfg("WARM_BUDGET_MB", as_int=True)) * 1048576
+        return min(ahead, budget // streams)
+
+    def warm_once(self):
+        if not hasattr(os, "posix_fadvise"):
+            return
+        with self._lock:
+            targets = dict(self._targets)
+        window = self.window(len(targets))
+        if not window:
+            return
+        for array_path, progress in targets.items():
+            try:
+                self._warm(array_path, progress, window)
+            except OSError:
+                with self._lock:
+                    self._state.pop(array_path, None)
+
+    def _warm(self, array_path, progress, window):
+        with self._lock:
+            st = self._state.get(array_path)
+        if st is None:
+            # Advise the file on its disk: read-ahead through the FUSE user
+            # share is not guaranteed to reach the disk underneath.
+            path = disk_resolver.physical(array_path)
+            st = {"path": path, "size": os.path.getsize(path), "end": 0}
+            log(f"[Warm] Reading ahead in {os.path.basename(array_path)} "
+                f"until its copy is on cache")
+
+        pos  = int((progress or 0.0) * st["size"])
+        stop = min(st["size"], pos + window)
+        # Continue after what is already advised, unless playback jumped
+        # backwards or past it - then start over at the new position.
+        start = st["end"] if pos <= st["end"] <= stop else pos
+        if stop > start:
+            fd = os.open(st["path"], os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, start, stop - start, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+            st["end"] = stop
+        with self._lock:
+            if array_path in self._targets:
+                self._state[array_path] = st
+
+    def run(self):
+        while not _shutting_down.is_set():
+            self._wake.wait(WARM_INTERVAL)
+            self._wake.clear()
+            try:
+                self.warm_once()
+            except Exception as e:
+                log(f"Read-ahead error: {e}", error=True)
+
+page_cache_warmer = PageCacheWarmer()
 
 # =============================================================================
-# API CLIENTS — urllib-based, no external deps
+# API CLIENTS — http.client-based, no external deps
 # =============================================================================
 
+class HTTPPool:
+    """One kept-alive connection per media server.
+
+    The sessions endpoints are polled every CHECK_INTERVAL seconds for as long
+    as the service runs; opening a new connection - and with HTTPS a new TLS
+    handshake - for each of those requests was most of their cost. Here the
+    connection to each scheme://host:port stays open and is reused. A request
+    on a reused connection that fails the way a connection the server has
+    since closed fails is retried once on a fresh one; anything else is an
+    error for the caller.
+
+    Responses are asked for gzip-compressed - a Plex session list with full
+    metadata compresses several-fold. Every server gets counters (requests,
+    errors, reconnects, time spent) for the status snapshot.
+
+    Redirects are followed, up to HTTP_MAX_REDIRECTS, as urlopen did before
+    - a server URL behind an http->https redirect or a reverse proxy would
+    otherwise just go quiet. Each one costs an extra request on every poll,
+    so it is logged once with the URL to put in the settings instead.
+
+    Requests to one server take turns on its connection; requests to
+    different servers run side by side.
+    """
+
+    REDIRECTS = (301, 302, 303, 307, 308)
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._conns = {}          # (scheme, host, port) -> [lock, connection or None]
+        self._stats = {}          # "host:port" -> counters
+        self._redirects_logged = set()
+
+    @staticmethod
+    def _target(url):
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        return (scheme, parts.hostname, port), path
+
+    def _slot(self, key):
+        with self._lock:
+            slot = self._conns.get(key)
+            if slot is None:
+                slot = self._conns[key] = [threading.Lock(), None]
+                self._stats[f"{key[1]}:{key[2]}"] = {"requests": 0, "errors": 0,
+                                                     "reconnects": 0, "seconds": 0.0,
+                                                     "last_ms": None}
+            return slot
+
+    @staticmethod
+    def _connect(key, timeout):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=_SSL_CTX)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, url, headers=None, timeout=5):
+        """GET url, following redirects. Returns (status, body) with the body
+        decompressed, or raises OSError / http.client.HTTPException /
+        zlib.error."""
+        for _hop in range(HTTP_MAX_REDIRECTS + 1):
+            status, body, location = self._get(url, headers, timeout)
+            if status not in self.REDIRECTS or not location:
+                break
+            target = urllib.parse.urljoin(url, location)
+            src, dst = urllib.parse.urlsplit(url), urllib.parse.urlsplit(target)
+            moved = (src.scheme, src.netloc, dst.scheme, dst.netloc)
+            if moved not in self._redirects_logged:
+                self._redirects_logged.add(moved)
+                log(f"[API] {src.scheme}://{src.netloc} redirects to {dst.scheme}://{dst.netloc}"
+                    f" - consider using that as the server URL", warn=True)
+            url = target
+        return status, body
+
+    def _get(self, url, headers, timeout):
+        """One GET: (status, body, Location header)."""
+        key, path = self._target(url)
+        headers = dict(headers or {})
+        headers.setdefault("Accept-Encoding", "gzip")
+        slot  = self._slot(key)
+        stats = self._stats[f"{key[1]}:{key[2]}"]
+        started = time.monotonic()
+        with slot[0]:
+            try:
+                for attempt in (0, 1):
+                    conn, reused = slot[1], slot[1] is not None
+                    if conn is None:
+                        conn = slot[1] = self._connect(key, timeout)
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    try:
+                        conn.request("GET", path, headers=headers)
+                        resp = conn.getresponse()
+                        body = resp.read()
+                    except (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                            ConnectionResetError, BrokenPipeError) as e:
+                        conn.close()
+                        slot[1] = None
+                        # Kept-alive connections get closed by the server
+                        # when idle; that is worth one fresh try
+                        if reused and attempt == 0:
+                            stats["reconnects"] += 1
+                            continue
+                        raise e
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                        slot[1] = None
+                        raise
+                    if resp.will_close:
+                        conn.close()
+                        slot[1] = None
+                    if resp.getheader("Content-Encoding", "").lower() == "gzip":
+                        body = gzip.decompress(body)
+                    return resp.status, body, resp.getheader("Location")
+            except (OSError, http.client.HTTPException, EOFError, zlib.error):
+                stats["errors"] += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                stats["requests"] += 1
+                stats["seconds"]  += elapsed
+                stats["last_ms"]   = int(elapsed * 1000)
+
+    def close(self):
+        with self._lock:
+            slots = list(self._conns.values())
+        for slot in slots:
+            with slot[0]:
+                if slot[1] is not None:
+                    slot[1].close()
+                    slot[1] = None
+
+    def snapshot(self):
+        """Per-server counters, with the mean request time in ms."""
+        with self._lock:
+            out = {}
+            for server, st in self._stats.items():
+                out[server] = dict(st, seconds=round(st["seconds"], 3),
+                                   avg_ms=int(st["seconds"] * 1000 / st["requests"])
+                                   if st["requests"] else None)
+            return out
+
+http_pool = HTTPPool()
+
 def api_get(url, headers, timeout=5):
     """Make an API GET request and return parsed JSON, or None on failure.
 
-    Uses urllib from the stdlib so this plugin doesn't depend on the
-    `requests` package (which needs to be pip-installed on every boot
-    because Unraid's root FS is tmpfs). SSL verification is disabled
-    to support the self-signed certs that Plex/Emby/Jellyfin typically
-    use on LAN."""
+    Goes through http_pool, built on http.client from the stdlib so this
+    plugin doesn't depend on the `requests` package (which needs to be
+    pip-installed on every boot because Unraid's root FS is tmpfs). SSL
+    verification is disabled to support the self-signed certs that
+    Plex/Emby/Jellyfin typically use on LAN."""
     try:
-        req = urllib.request.Request(url, headers=headers, method='GET')
-        with urllib.request.urlopen(req, timeout=timeout, context=_SSL_CTX) as resp:
-            if resp.status != 200:
-                return None
-            body = resp.read()
-            if not body:
-                return None
-            try:
-                return json.loads(body.decode('utf-8', errors='replace'))
-            except ValueError:
-                return None
-    except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, OSError):
+        status, body = http_pool.request(url, headers, timeout)
+    except (OSError, http.client.HTTPException, EOFError, ValueError, zlib.error):
+        return None
+    if status != 200 or not body:
+        return None
+    try:
+        return json.loads(body.decode('utf-8', errors='replace'))
+    except ValueError:
         return None
 
 def _progress(position, duration):
@@ -962,75 +3836,221 @@ def _progress(position, duration):
         pass
     return None
 
+class MetadataCache:
+    """What Plex's /library/metadata said about an item, by ratingKey: its
+    file path and viewCount.
+
+    A plain dict wiped whole at METADATA_CACHE_LIMIT used to hold just the
+    paths, and every restart lost it - after either, each Plex session cost
+    another lookup. This keeps the most recently used METADATA_CACHE_LIMIT
+    entries, each valid for METADATA_TTL seconds (files get replaced by
+    upgrades). A lookup that found no file is remembered too, for
+    METADATA_NEGATIVE_TTL, so a session Plex cannot place is not looked up
+    again every poll; a failed request is not remembered at all.
+
+    Expiry is wall-clock time, so save() on shutdown and load() at start
+    carry the entries over a restart. /var/run is in RAM: a reboot starts
+    empty, which is right, as Plex may have rescanned by then. Shared by
+    the poll, is_watched() and the webhooks, across threads.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._entries = OrderedDict()  # ratingKey -> (entry or None, expires), least recent first
+        self.hits     = 0
+        self.misses   = 0
+
+    def lookup(self, key):
+        """(True, entry) for a valid cached entry, or (False, None)."""
+        key = str(key)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[1] <= time.time():
+                if cached is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, cached[0]
+
+    def put(self, key, entry):
+        """Remember entry for key; one without a path expires sooner."""
+        ttl = METADATA_TTL if entry and entry.get("path") else METADATA_NEGATIVE_TTL
+        with self._lock:
+            self._entries[str(key)] = (entry, time.time() + ttl)
+            self._entries.move_to_end(str(key))
+            while len(self._entries) > METADATA_CACHE_LIMIT:
+                self._entries.popitem(last=False)
+
+    def path(self, key):
+        found, entry = self.lookup(key)
+        return entry.get("path") if found and entry else None
+
+    def load(self):
+        try:
+            data = json.loads(Path(METADATA_CACHE_FILE).read_text())
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        now = time.time()
+        with self._lock:
+            for item in data.get("entries") or []:
+                try:
+                    key, entry, expires = item
+                    if float(expires) > now and (entry is None or isinstance(entry, dict)):
+                        self._entries[str(key)] = (entry, float(expires))
+                except (TypeError, ValueError):
+                    continue
+            while len(self._entries) > METADATA_CACHE_LIMIT:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        with self._lock:
+            data = {"entries": [[k, e, exp] for k, (e, exp) in self._entries.items()]}
+        try:
+            tmp = METADATA_CACHE_FILE + ".tmp"
+            Path(tmp).write_text(json.dumps(data))
+            os.replace(tmp, METADATA_CACHE_FILE)
+        except OSError as e:
+            log(f"[Metadata] Could not save the lookup cache: {e}", warn=True)
+
+    def snapshot(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+metadata_cache = MetadataCache()
+
+def _plex_file(item):
+    """The first file of a Plex metadata item, or None."""
+    for media in item.get('Media', []):
+        for part in media.get('Part', []):
+            if part.get('file'):
+                return part['file']
+    return None
+
+def plex_metadata(rk, headers):
+    """Ask Plex about item rk and cache what it says. Returns the entry
+    ({"path", "viewCount"}, path None if it has no file), or None if the
+    request failed."""
+    data = api_get(f"{cfg('PLEX_URL')}/library/metadata/{rk}", headers)
+    if not data or 'MediaContainer' not in data:
+        return None
+    items = data['MediaContainer'].get('Metadata') or [{}]
+    path = next(filter(None, map(_plex_file, items)), None)
+    entry = {"path": path, "viewCount": items[0].get('viewCount', 0)}
+    metadata_cache.put(rk, entry)
+    return entry
+
+def _poll_plex():
+    """Sessions playing on Plex, keyed by file path."""
+    streams = {}
+    headers = {'X-Plex-Token': cfg("PLEX_TOKEN"), 'Accept': 'application/json'}
+    data = api_get(f"{cfg('PLEX_URL')}/status/sessions", headers)
+    if data and 'MediaContainer' in data:
+        for item in data['MediaContainer'].get('Metadata', []):
+            rk = item.get('ratingKey')
+            known, entry = metadata_cache.lookup(rk) if rk else (False, None)
+            path = entry.get('path') if entry else None
+
+            if not path:
+                path = _plex_file(item)
+                if path and rk:
+                    metadata_cache.put(rk, dict(entry or {}, path=path))
+
+            # A key cached as having no file is not asked about again
+            if not path and rk and not known:
+                entry = plex_metadata(rk, headers)
+                path = entry.get('path') if entry else None
+
+            if path:
+                streams[path] = {
+                    'service':  'plex',
+                    'id':       rk,
+                    'duration': item.get('duration'),
+                    'progress': _progress(item.get('viewOffset'), item.get('duration')),
+                }
+    return streams
+
+def _poll_emby(name, api_key, url_key):
+    """Sessions playing on Emby or Jellyfin (same API), keyed by file path."""
+    headers = {'X-Emby-Token': cfg(api_key), 'Accept': 'application/json'}
+    return _emby_streams(name, api_get(f"{cfg(url_key)}/Sessions", headers))
+
+def _emby_streams(name, data):
+    """The playing sessions in an Emby/Jellyfin session list - the answer to
+    /Sessions, or the Data of a "Sessions" notification."""
+    streams = {}
+    if isinstance(data, list):
+        for s in data:
+            item = s.get('NowPlayingItem', {}) or {}
+            if item.get('Path'):
+                play_state = s.get('PlayState', {}) or {}
+                streams[item['Path']] = {
+                    'service':  name,
+                    'id':       item.get('Id'),
+                    'user':     s.get('UserId'),
+                    'progress': _progress(play_state.get('PositionTicks'),
+                                          item.get('RunTimeTicks')),
+                }
+    return streams
+
+_poll_pool   = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix="poll")
+_polls_late  = {}   # service -> (future, started) of a poll that missed its pass
+_last_polled = {}   # service -> streams from its last answer
+
 def get_active_streams():
     """Get currently playing files from all enabled services.
     Each session carries the current playback progress so that watched
-    detection works per-session (and therefore also on rewatches)."""
-    streams = {}
-
-    # --- Plex ---
+    detection works per-session (and therefore also on rewatches).
+
+    The services are asked side by side, and the pass waits at most
+    POLL_DEADLINE for them: one hung server used to hold up detection on the
+    others, and the whole main loop with it. A server that misses the
+    deadline keeps its sessions from its last answer until it answers again -
+    dropping them would look like every stream on it had just ended. Its
+    request is left to finish (api_get has its own timeout) instead of being
+    sent again every pass."""
+    jobs = {}
     if cfg("ENABLE_PLEX", as_bool=True):
-        headers = {'X-Plex-Token': cfg("PLEX_TOKEN"), 'Accept': 'application/json'}
-        data = api_get(f"{cfg('PLEX_URL')}/status/sessions", headers)
-        if data and 'MediaContainer' in data:
-            for item in data['MediaContainer'].get('Metadata', []):
-                rk = item.get('ratingKey')
-                path = metadata_cache.get(rk)
-
-                if not path:
-                    for media in item.get('Media', []):
-                        for part in media.get('Part', []):
-                            if part.get('file'):
-                                path = part['file']
-                                break
-                        if path:
-                            break
-
-                if not path and rk:
-                    meta = api_get(f"{cfg('PLEX_URL')}/library/metadata/{rk}", headers)
-                    if meta and 'MediaContainer' in meta:
-                        for m in meta['MediaContainer'].get('Metadata', []):
-                            for med in m.get('Media', []):
-                                for p in med.get('Part', []):
-                                    if p.get('file'):
-                                        path = p['file']
-                                        break
-                                if path:
-                                    break
-                            if path:
-                                break
-
-                if path:
-                    if len(metadata_cache) >= METADATA_CACHE_LIMIT:
-                        metadata_cache.clear()
-                    metadata_cache[rk] = path
-                    streams[path] = {
-                        'service':  'plex',
-                        'id':       rk,
-                        'progress': _progress(item.get('viewOffset'), item.get('duration')),
-                    }
-
-    # --- Emby / Jellyfin ---
+        jobs["plex"] = (_poll_plex,)
     for enabled_key, api_key, url_key, name in [
         ("ENABLE_EMBY",     "EMBY_API_KEY",     "EMBY_URL",     "emby"),
         ("ENABLE_JELLYFIN", "JELLYFIN_API_KEY", "JELLYFIN_URL", "jellyfin"),
     ]:
         if cfg(enabled_key, as_bool=True):
-            headers = {'X-Emby-Token': cfg(api_key), 'Accept': 'application/json'}
-            data = api_get(f"{cfg(url_key)}/Sessions", headers)
-            if isinstance(data, list):
-                for s in data:
-                    item = s.get('NowPlayingItem', {}) or {}
-                    if item.get('Path'):
-                        play_state = s.get('PlayState', {}) or {}
-                        streams[item['Path']] = {
-                            'service':  name,
-                            'id':       item.get('Id'),
-                            'user':     s.get('UserId'),
-                            'progress': _progress(play_state.get('PositionTicks'),
-                                                  item.get('RunTimeTicks')),
-                        }
+            jobs[name] = (_poll_emby, name, api_key, url_key)
+
+    now = time.monotonic()
+    polls = {}
+    for name, job in jobs.items():
+        polls[name] = _polls_late.pop(name, None) or (_poll_pool.submit(*job), now)
+    for name in set(_last_polled) - set(jobs):
+        del _last_polled[name]
+    # Only the polls sent this pass get waited for; a late one from before
+    # is used if it has finished by now
+    fresh = [future for future, started in polls.values() if started == now]
+    concurrent.futures.wait(fresh, timeout=POLL_DEADLINE)
 
+    streams = {}
+    for name, (future, started) in polls.items():
+        if not future.done():
+            if started == now:
+                log(f"[Poll] {name} has not answered after {POLL_DEADLINE}s - keeping its "
+                    f"{len(_last_polled.get(name, {}))} known session(s)", warn=True)
+            _polls_late[name] = (future, started)
+        else:
+            took = time.monotonic() - started
+            try:
+                _last_polled[name] = future.result()
+                if started != now:
+                    log(f"[Poll] {name} answered after {took:.1f}s")
+                elif took >= POLL_SLOW:
+                    log(f"[Poll] {name} took {took:.1f}s to answer", warn=True)
+            except Exception as e:
+                log(f"[Poll] {name} failed: {e}", error=True)
+        streams.update(_last_polled.get(name, {}))
     return streams
 
 def is_watched(session):
@@ -1052,11 +4072,11 @@ def is_watched(session):
     service = session.get('service')
 
     if service == 'plex':
+        # Always asked afresh, not taken from metadata_cache: the session
+        # may have just raised viewCount, and "Mark as Unwatched" resets it
         headers = {'X-Plex-Token': cfg("PLEX_TOKEN"), 'Accept': 'application/json'}
-        data = api_get(f"{cfg('PLEX_URL')}/library/metadata/{session.get('id')}", headers)
-        if data and 'MediaContainer' in data:
-            meta = (data['MediaContainer'].get('Metadata') or [{}])[0]
-            return meta.get('viewCount', 0) > 0
+        entry = plex_metadata(session.get('id'), headers)
+        return bool(entry) and entry.get('viewCount', 0) > 0
 
     elif service in ('emby', 'jellyfin'):
         url_key = "EMBY_URL"     if service == 'emby' else "JELLYFIN_URL"
@@ -1068,6 +4088,574 @@ def is_watched(session):
 
     return False
 
+# =============================================================================
+# STREAM NOTIFICATIONS — WebSocket push from the media servers
+# =============================================================================
+
+_stream_wake = threading.Event()   # set when a notification says streams changed
+
+def _known_sessions(service, path=None, item_id=None):
+    """Sessions of service from its last poll, by file path or else by item id."""
+    known = _last_polled.get(service, {})
+    if path is not None:
+        return [known[path]] if path in known else []
+    return [s for s in known.values() if str(s.get("id")) == str(item_id)]
+
+def _ws_mask(data, key):
+    n = len(data)
+    key = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+class WebSocket:
+    """Just enough of RFC 6455 for the notification feeds: a client that
+    sends text, reads text, and answers pings. Frames are parsed out of a
+    buffer and only taken from it once complete, so a read that times out
+    halfway through a frame loses nothing."""
+
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, url, headers=None, timeout=10):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme in ("wss", "https")
+        if parts.scheme not in ("ws", "wss", "http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        self._buf = bytearray()
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        try:
+            if secure:
+                self.sock = _SSL_CTX.wrap_socket(self.sock, server_hostname=host)
+            key = base64.b64encode(os.urandom(16)).decode()
+            # An IPv6 literal keeps its brackets, or the port would read as
+            # part of the address
+            authority = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+            lines = [f"GET {path} HTTP/1.1", f"Host: {authority}", "Upgrade: websocket",
+                     "Connection: Upgrade", f"Sec-WebSocket-Key: {key}",
+                     "Sec-WebSocket-Version: 13"]
+            lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+            self.sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+            while b"\r\n\r\n" not in self._buf:
+                if len(self._buf) > 65536:
+                    raise ConnectionError("handshake answer too long")
+                self._fill(len(self._buf) + 1)
+            end = self._buf.index(b"\r\n\r\n")
+            head = self._buf[:end].decode("latin-1").split("\r\n")
+            del self._buf[:end + 4]
+            status = head[0].split(" ", 2)
+            if len(status) < 2 or status[1] != "101":
+                raise ConnectionError(f"handshake refused: {head[0]}")
+            answer = {k.strip().lower(): v.strip()
+                      for k, _, v in (h.partition(":") for h in head[1:])}
+            expected = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+            if answer.get("sec-websocket-accept") != expected:
+                raise ConnectionError("handshake answer has the wrong key")
+        except Exception:
+            self.sock.close()
+            raise
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def _fill(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("connection closed")
+            self._buf += chunk
+
+    def _frame(self):
+        """(fin, opcode, payload) of the next frame."""
+        self._fill(2)
+        b1, b2 = self._buf[0], self._buf[1]
+        n, at = b2 & 0x7F, 2
+        if n == 126:
+            self._fill(4)
+            n, at = struct.unpack_from("!H", self._buf, 2)[0], 4
+        elif n == 127:
+            self._fill(10)
+            n, at = struct.unpack_from("!Q", self._buf, 2)[0], 10
+        if n > NOTIFY_MAX_MESSAGE:
+            raise ConnectionError(f"{n} byte frame")
+        masked = b2 & 0x80
+        self._fill(at + (4 if masked else 0) + n)
+        if masked:
+            key, at = bytes(self._buf[at:at + 4]), at + 4
+            payload = _ws_mask(bytes(self._buf[at:at + n]), key)
+        else:
+            payload = bytes(self._buf[at:at + n])
+        del self._buf[:at + n]
+        return b1 & 0x80, b1 & 0x0F, payload
+
+    def _send(self, opcode, payload):
+        head = bytes([0x80 | opcode])
+        n = len(payload)
+        if n < 126:
+            head += bytes([0x80 | n])
+        elif n < 65536:
+            head += bytes([0x80 | 126]) + struct.pack("!H", n)
+        else:
+            head += bytes([0x80 | 127]) + struct.pack("!Q", n)
+        key = os.urandom(4)
+        self.sock.sendall(head + key + _ws_mask(payload, key))
+
+    def send(self, text):
+        self._send(0x1, text.encode())
+
+    def ping(self):
+        self._send(0x9, b"")
+
+    def recv(self):
+        """The next message as text, or None once the server has closed the
+        connection. socket.timeout passes through."""
+        parts = []
+        while True:
+            fin, opcode, payload = self._frame()
+            if opcode == 0x8:
+                try:
+                    self._send(0x8, payload[:2])
+                except OSError:
+                    pass
+                return None
+            if opcode == 0x9:
+                self._send(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            parts.append(payload)
+            if sum(map(len, parts)) > NOTIFY_MAX_MESSAGE:
+                raise ConnectionError("message too large")
+            if fin:
+                return b"".join(parts).decode("utf-8", errors="replace")
+
+    def close(self):
+        try:
+            self._send(0x8, struct.pack("!H", 1000))
+        except OSError:
+            pass
+        self.sock.close()
+
+class NotificationListener(abc.ABC):
+    """Keeps a WebSocket open to one media server and turns what it says
+    about playback into work for the main loop.
+
+    Polling every CHECK_INTERVAL noticed a new stream up to that late, and
+    kept asking servers nobody was watching anything on. With the socket
+    open, a play or stop sets _stream_wake so the main loop checks at once,
+    and progress reports update the sessions from the last poll in place -
+    so the progress a finished session is judged by is the latest the
+    server sent. While every enabled server is listened to and nothing
+    plays, the main loop polls only every NOTIFY_POLL_INTERVAL, to catch
+    anything a notification missed.
+
+    A dropped connection is retried after NOTIFY_BACKOFF_MIN seconds,
+    doubling up to NOTIFY_BACKOFF_MAX while it keeps failing; polling is
+    back to CHECK_INTERVAL meanwhile. Changing the server's settings
+    reconnects with the new ones."""
+
+    service = None
+
+    def __init__(self):
+        self.connected = False
+        self.connects  = 0
+        self.events    = 0
+        self.failures  = 0        # failed attempts since it was last connected
+
+    @abc.abstractmethod
+    def target(self):
+        """(url, headers) to connect to, or None when this server is off."""
+
+    def opened(self, ws):
+        """Called once connected - to subscribe to what the server sends."""
+
+    def keepalive(self, ws):
+        ws.ping()
+
+    @abc.abstractmethod
+    def handle(self, message):
+        """Act on one message from the server."""
+
+    def listen(self, ws, target, stop):
+        """Read until the connection drops, the settings change or stop is set."""
+        ws.settimeout(NOTIFY_KEEPALIVE)
+        self.opened(ws)
+        last_keepalive = time.monotonic()
+        while not stop.is_set() and self.target() == target:
+            try:
+                message = ws.recv()
+            except socket.timeout:
+                message = ""
+            # On a schedule rather than only when quiet: Emby and Jellyfin
+            # drop a client that sends nothing, however much they send it
+            if time.monotonic() - last_keepalive >= NOTIFY_KEEPALIVE:
+                self.keepalive(ws)
+                last_keepalive = time.monotonic()
+            if message is None:
+                return
+            if not message:
+                continue
+            self.events += 1
+            try:
+                self.handle(json.loads(message))
+            except (ValueError, TypeError, AttributeError, KeyError):
+                pass        # not a notification we understand
+
+    def run(self, stop=None):
+        stop = stop or _shutting_down
+        backoff = NOTIFY_BACKOFF_MIN
+        while not stop.is_set():
+            target = self.target() if cfg("ENABLE_NOTIFICATIONS", as_bool=True) else None
+            if target is None:
+                stop.wait(NOTIFY_KEEPALIVE)
+                continue
+            try:
+                ws = WebSocket(*target)
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                if self.failures == 1:
+                    log(f"[Notify] {self.service}: cannot connect ({e}) - retrying, "
+                        f"polling meanwhile", warn=True)
+                stop.wait(backoff)
+                backoff = min(backoff * 2, NOTIFY_BACKOFF_MAX)
+                continue
+
+            self.connected, self.failures, backoff = True, 0, NOTIFY_BACKOFF_MIN
+            self.connects += 1
+            log(f"[Notify] {self.service}: listening for playback notifications")
+            # Whatever happened while the socket was down
+            _stream_wake.set()
+            try:
+                self.listen(ws, target, stop)
+            except (OSError, ValueError) as e:
+                log(f"[Notify] {self.service}: connection lost ({e})", warn=True)
+            finally:
+                self.connected = False
+                ws.close()
+            if not stop.is_set():
+                stop.wait(backoff)
+
+    def snapshot(self):
+        return {"connected": self.connected, "connects": self.connects, "events": self.events}
+
+def _ws_url(base, path):
+    return re.sub(r'^http', 'ws', base.rstrip('/'), flags=re.IGNORECASE) + path
+
+class PlexNotifications(NotificationListener):
+    """Plex's notification socket. Every playing session reports its
+    position every few seconds in a PlaySessionStateNotification, with a
+    ratingKey but no file path - so an unknown ratingKey or a "stopped"
+    wakes the main loop to poll, and the rest only updates progress."""
+
+    service = "plex"
+
+    def target(self):
+        if not cfg("ENABLE_PLEX", as_bool=True):
+            return None
+        query = urllib.parse.urlencode({"X-Plex-Token": cfg("PLEX_TOKEN")})
+        return _ws_url(cfg("PLEX_URL"), f"/:/websockets/notifications?{query}"), {}
+
+    def handle(self, message):
+        container = message.get("NotificationContainer") or {}
+        if container.get("type") != "playing":
+            return
+        for note in container.get("PlaySessionStateNotification") or []:
+            sessions = _known_sessions("plex", item_id=note.get("ratingKey"))
+            for session in sessions:
+                progress = _progress(note.get("viewOffset"), session.get("duration"))
+                if progress is not None:
+                    session["progress"] = progress
+            if not sessions or note.get("state") == "stopped":
+                _stream_wake.set()
+
+class EmbyNotifications(NotificationListener):
+    """The Emby/Jellyfin socket. After a SessionsStart it sends the full
+    session list whenever it changes (and every couple of seconds while
+    something plays), so a change in what is playing wakes the main loop
+    and the rest only updates progress. Both servers drop a client that
+    sends nothing for about a minute, so KeepAlive goes out every
+    NOTIFY_KEEPALIVE seconds."""
+
+    def __init__(self, service, enabled_key, api_key, url_key, path):
+        super().__init__()
+        self.service = service
+        self._keys   = (enabled_key, api_key, url_key)
+        self._path   = path
+
+    def target(self):
+        enabled_key, api_key, url_key = self._keys
+        if not cfg(enabled_key, as_bool=True):
+            return None
+        query = urllib.parse.urlencode({"api_key": cfg(api_key), "deviceId": "plex_to_cache"})
+        return _ws_url(cfg(url_key), f"{self._path}?{query}"), {}
+
+    def opened(self, ws):
+        ws.send(json.dumps({"MessageType": "SessionsStart", "Data": "0,2000"}))
+
+    def keepalive(self, ws):
+        ws.send(json.dumps({"MessageType": "KeepAlive"}))
+
+    def handle(self, message):
+        kind = message.get("MessageType")
+        if kind == "ForceKeepAlive":
+            return
+        if kind in ("PlaybackStart", "PlaybackStopped"):
+            _stream_wake.set()
+            return
+        if kind != "Sessions":
+            return
+        playing = _emby_streams(self.service, message.get("Data"))
+        known = _last_polled.get(self.service, {})
+        if set(playing) != set(known):
+            _stream_wake.set()
+            return
+        for path, session in playing.items():
+            known[path]["progress"] = session["progress"]
+
+notification_listeners = [
+    PlexNotifications(),
+    EmbyNotifications("emby",     "ENABLE_EMBY",     "EMBY_API_KEY",     "EMBY_URL",
+                      "/embywebsocket"),
+    EmbyNotifications("jellyfin", "ENABLE_JELLYFIN", "JELLYFIN_API_KEY", "JELLYFIN_URL",
+                      "/socket"),
+]
+
+def notifications_cover_all():
+    """True when every enabled media server has its notification socket
+    open - then polling can slow down."""
+    if not cfg("ENABLE_NOTIFICATIONS", as_bool=True):
+        return False
+    enabled = [l for l in notification_listeners if l.target() is not None]
+    return bool(enabled) and all(l.connected for l in enabled)
+
+# =============================================================================
+# WEBHOOKS — play/stop events POSTed by the media servers
+# =============================================================================
+
+_PLEX_EVENTS  = {"media.play": "play", "media.resume": "play", "media.stop": "stop",
+                 "media.pause": "progress", "media.scrobble": "progress"}
+_EMBY_EVENTS  = {"playback.start": "play", "playback.unpause": "play", "playback.stop": "stop",
+                 "playback.pause": "progress", "playback.progress": "progress"}
+_JELLY_EVENTS = {"PlaybackStart": "play", "PlaybackStop": "stop", "PlaybackProgress": "progress"}
+
+def parse_webhook(content_type, body):
+    """The playback event in a webhook, as a dict with service, kind ("play",
+    "stop" or "progress"), path, id, user and progress - or None for an event
+    this plugin has no use for. Raises ValueError for a body it cannot read.
+
+    Plex sends multipart/form-data with the JSON in the "payload" field and no
+    file path, only the ratingKey. Emby sends JSON with the item's Path.
+    Jellyfin's webhook plugin sends whatever its template says; ItemPath is
+    used when the template has it."""
+    if content_type.lower().startswith("multipart/"):
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+        if not message.is_multipart():
+            raise ValueError("unreadable multipart body")
+        for part in message.get_payload():
+            if part.get_param("name", header="content-disposition") == "payload":
+                payload = part.get_payload(decode=True)
+                break
+        else:
+            raise ValueError("no payload field")
+    else:
+        payload = body
+    data = json.loads(payload.decode("utf-8", errors="replace"))
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+
+    if data.get("event") in _PLEX_EVENTS:
+        meta = data.get("Metadata") or {}
+        rk = meta.get("ratingKey")
+        return {"service": "plex", "kind": _PLEX_EVENTS[data["event"]],
+                "path": metadata_cache.path(rk) if rk else None, "id": rk, "user": None,
+                "duration": meta.get("duration"),
+                "progress": _progress(meta.get("viewOffset"), meta.get("duration"))}
+    if data.get("Event") in _EMBY_EVENTS:
+        item = data.get("Item") or {}
+        playback = data.get("PlaybackInfo") or {}
+        return {"service": "emby", "kind": _EMBY_EVENTS[data["Event"]],
+                "path": item.get("Path"), "id": item.get("Id"),
+                "user": (data.get("User") or {}).get("Id"),
+                "progress": _progress(playback.get("PositionTicks"), item.get("RunTimeTicks"))}
+    if data.get("NotificationType") in _JELLY_EVENTS:
+        return {"service": "jellyfin", "kind": _JELLY_EVENTS[data["NotificationType"]],
+                "path": data.get("ItemPath") or data.get("Path"), "id": data.get("ItemId"),
+                "user": data.get("UserId"),
+                "progress": _progress(data.get("PlaybackPositionTicks"), data.get("RunTimeTicks"))}
+    return None
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    timeout = 5               # a client that stops sending mid-request is dropped
+
+    def _reply(self, code):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _authorized(self):
+        token = cfg("WEBHOOK_TOKEN")
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        given = self.headers.get("X-Webhook-Token") or (query.get("token") or [""])[0]
+        return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        if not self._authorized():
+            receiver.reject()
+            return self._reply(403)
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            receiver.reject()
+            return self._reply(411)
+        if not 0 <= length <= WEBHOOK_MAX_BODY:
+            receiver.reject()
+            return self._reply(413)
+        try:
+            event = parse_webhook(self.headers.get("Content-Type", ""), self.rfile.read(length))
+        except (ValueError, UnicodeError):
+            receiver.reject()
+            return self._reply(400)
+        self._reply(202 if event is None or receiver.offer(event) else 503)
+
+    def log_message(self, *args):
+        pass
+
+class WebhookReceiver:
+    """An optional HTTP listener for playback webhooks (Plex Pass, Emby, the
+    Jellyfin webhook plugin), so a play or stop is acted on within
+    milliseconds rather than at the next poll.
+
+    It serves one request at a time on its own thread and only parses and
+    queues there: bodies over WEBHOOK_MAX_BODY are refused, and once
+    WEBHOOK_QUEUE events are waiting further ones get a 503 - a flood of
+    events costs this thread some parsing, never the main loop more than a
+    bounded drain. Each queued event sets _stream_wake, and the main loop
+    takes it from there in apply_webhook_events(). Settings changes take
+    effect at the next pass through sync().
+
+    A webhook can start copies and, with a stop at full progress, cleanup
+    moves - so every request has to carry WEBHOOK_TOKEN, and without one
+    set the listener does not start at all. WEBHOOK_BIND keeps it off
+    interfaces it has no business on."""
+
+    def __init__(self):
+        self.events   = queue.Queue(maxsize=WEBHOOK_QUEUE)
+        self._lock    = threading.Lock()   # the counters, shared by the request threads
+        self.server   = None
+        self.bound    = None      # (address, port, token set) the listener was started for
+        self.received = 0
+        self.dropped  = 0         # refused because the queue was full
+        self.rejected = 0         # unauthorized, too large or unreadable
+
+    def offer(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.received += 1
+        _stream_wake.set()
+        return True
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def sync(self):
+        """Start, stop or move the listener to match the settings."""
+        wanted = None
+        if cfg("ENABLE_WEBHOOK", as_bool=True):
+            wanted = (cfg("WEBHOOK_BIND").strip(), cfg("WEBHOOK_PORT", as_int=True),
+                      bool(cfg("WEBHOOK_TOKEN")))
+        if wanted == self.bound:
+            return
+        self.stop()
+        self.bound = wanted
+        if wanted is None:
+            return
+        address, port, has_token = wanted
+        if not has_token:
+            log("[Webhook] Not listening: set a webhook token first", error=True)
+            return
+        try:
+            # A thread per request: a client that stalls mid-request holds
+            # up only itself, not the events of the other servers
+            server = http.server.ThreadingHTTPServer((address, port), _WebhookHandler)
+            server.daemon_threads = True
+        except (OSError, OverflowError) as e:
+            log(f"[Webhook] Cannot listen on {address or '*'}:{port}: {e}", error=True)
+            return
+        server.receiver = self
+        self.server = server
+        threading.Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+        log(f"[Webhook] Listening on {address or '*'}:{port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.bound = None
+
+    def snapshot(self):
+        if self.server is None:
+            return None
+        return {"port": self.server.server_address[1], "received": self.received,
+                "dropped": self.dropped, "rejected": self.rejected}
+
+webhook_receiver = WebhookReceiver()
+_webhook_sessions = {}   # path -> (session, monotonic time) started by a webhook, not yet polled
+
+def apply_webhook_events():
+    """Take the queued webhook events into account. Returns True if there
+    were any - the pass then polls the servers.
+
+    A play with a known file path starts the stream right away: its session
+    is added to what the poll returns for up to WEBHOOK_GRACE seconds, until
+    the server's own session list has it - servers list a session a moment
+    after the webhook. A stop drops that, and its final position goes into
+    the polled session, so smart cleanup judges it by where playback ended.
+    Anything else just makes the pass poll."""
+    events = 0
+    while events < WEBHOOK_QUEUE:
+        try:
+            event = webhook_receiver.events.get_nowait()
+        except queue.Empty:
+            break
+        events += 1
+        # Resolved here, so "/mnt/user/../" cannot pass the ARRAY_ROOT check
+        path = os.path.normpath(event["path"]) if event["path"] else None
+        for session in _known_sessions(event["service"], path, event["id"]):
+            if event["progress"] is not None:
+                session["progress"] = event["progress"]
+        if event["kind"] == "stop":
+            if path:
+                _webhook_sessions.pop(path, None)
+        elif path:
+            session = {k: event[k] for k in ("service", "id", "user", "progress")}
+            if "duration" in event:
+                session["duration"] = event["duration"]
+            _webhook_sessions[path] = (session, time.monotonic())
+    return events > 0
+
+def merge_webhook_sessions(streams):
+    """streams with the webhook-started sessions the poll does not have yet."""
+    now = time.monotonic()
+    merged = dict(streams)
+    for path, (session, seen) in list(_webhook_sessions.items()):
+        if path in streams or now - seen > WEBHOOK_GRACE:
+            del _webhook_sessions[path]
+        else:
+            merged[path] = session
+    return merged
+
 # =============================================================================
 # SEASON BATCHING
 # =============================================================================
@@ -1135,10 +4723,19 @@ def _season_episode_files(season_dir):
             ep_files.setdefault(ep, []).append(f)
     return ep_files
 
-def _enqueue_episodes(season_dir, ep_files, wanted):
+def _enqueue_episodes(season_dir, ep_files, wanted, current=None, priority=PRIO_BATCH):
+    """Queue the wanted episodes. The current one is queued as PRIO_PLAYING
+    and the one after it as PRIO_NEXT; everything else gets priority."""
+    following = [ep for ep in sorted(wanted) if current is not None and ep > current]
     for ep in sorted(wanted):
+        if ep == current:
+            prio = PRIO_PLAYING
+        elif following and ep == following[0]:
+            prio = PRIO_NEXT
+        else:
+            prio = priority
         for f in ep_files[ep]:
-            enqueue_copy(os.path.join(season_dir, f))
+            enqueue_copy(os.path.join(season_dir, f), prio)
 
 _SEASON_NUM_RE = re.compile(r"(\d+)")
 
@@ -1189,11 +4786,11 @@ def prefetch_next_season(season_dir):
         log(f"[Prefetch] Next season: {os.path.basename(os.path.dirname(next_dir))}"
             f"/{os.path.basename(next_dir)} ({len(wanted)} episodes)")
 
-    _enqueue_episodes(next_dir, ep_files, wanted)
+    _enqueue_episodes(next_dir, ep_files, wanted, priority=PRIO_PREFETCH)
 
 def handle_movie(array_path):
     """Handle movie caching - cache main file and related side-car files."""
-    enqueue_copy(array_path)
+    enqueue_copy(array_path, PRIO_PLAYING)
 
     folder = os.path.dirname(array_path)
     stem   = os.path.splitext(os.path.basename(array_path))[0]
@@ -1202,7 +4799,7 @@ def handle_movie(array_path):
         try:
             for f in sorted(os.listdir(folder)):
                 if f.startswith(stem):
-                    enqueue_copy(os.path.join(folder, f))
+                    enqueue_copy(os.path.join(folder, f), PRIO_PLAYING)
         except OSError:
             pass
 
@@ -1244,7 +4841,7 @@ def handle_series(array_path):
     else:
         wanted = {e for e in all_eps if e >= episode}
 
-    _enqueue_episodes(season_dir, ep_files, wanted)
+    _enqueue_episodes(season_dir, ep_files, wanted, current=episode)
 
     # Near the end of the season: pre-cache the start of the next one,
     # using the same threshold as the batch prefetch.
@@ -1260,14 +4857,7 @@ def handle_series(array_path):
 def write_status():
     """Write a small JSON snapshot to STATUS_FILE (atomic replace).
     The web UI polls this to show cache/queue state."""
-    cached_files = 0
-    cached_bytes = 0
-    for path in TrackedFiles.load():
-        try:
-            cached_bytes += os.path.getsize(path)
-            cached_files += 1
-        except OSError:
-            continue
+    cached_files, cached_bytes = TrackedFiles.total_bytes()
 
     try:
         usage = shutil.disk_usage(cfg("CACHE_ROOT"))
@@ -1277,17 +4867,64 @@ def write_status():
 
     with _pending_lock:
         queue_length = len(_pending_copies)
+        copying      = sorted(os.path.basename(j.current or j.path)
+                              for j in _current_copies.values())
 
     with _flush_lock:
         flush = dict(_flush_state)
 
+    # How far each preempted copy got - the partial data waiting to be resumed
+    suspended = []
+    for array_path in copy_queue.suspended():
+        entry = {"file": os.path.basename(array_path), "done_bytes": 0, "size": None}
+        try:
+            entry["done_bytes"] = os.path.getsize(_partial_path(array_to_cache(array_path)))
+        except OSError:
+            pass
+        try:
+            entry["size"] = os.path.getsize(array_path)
+        except OSError:
+            pass
+        suspended.append(entry)
+
+    # Time left per transfer, where the engine reports progress
+    transfers = []
+    for path, done, size in copy_queue.running():
+        eta = None
+        if done is not None and size:
+            eta = throughput.eta(disk_resolver.physical(path), array_to_cache(path), size - done)
+        transfers.append({"file": os.path.basename(path), "done_bytes": done,
+                          "size": size, "eta": eta})
+
+    # Speed caps in effect right now (null = unlimited) and the measured rate
+    qos = {
+        "rate":            transfer_meter.rate(),
+        "copy_cap":        transfer_cap("copy", urgent=True),
+        "background_cap":  transfer_cap("copy", urgent=False),
+        "move_cap":        transfer_cap("move", urgent=False),
+        "full_speed":      in_time_window(cfg("FULL_SPEED_WINDOW")),
+    }
+
     status = {
         "updated":         int(time.time()),
         "cached_files":    cached_files,
         "cached_bytes":    cached_bytes,
         "cache_usage_pct": usage_pct,
         "queue_length":    queue_length,
-        "copying":         _current_copy,
+        "queue_eta":       queue_forecast(),
+        "copying":         copying,
+        "transfers":       transfers,
+        "qos":             qos,
+        "governor":        io_governor.snapshot(),
+        "suspended":       suspended,
+        "deferred":        len(copy_queue.deferred()),
+        "reclaim":         space_reclaimer.snapshot(),
+        "reserved_bytes":  space_ledger.outstanding(),
+        "api":             http_pool.snapshot(),
+        "notify":          {l.service: l.snapshot() for l in notification_listeners
+                            if l.target() is not None},
+        "webhook":         webhook_receiver.snapshot(),
+        "metadata_cache":  metadata_cache.snapshot(),
         "active_streams":  sorted(os.path.basename(p) for p in stream_timers),
         "flush":           flush,
     }
@@ -1306,6 +4943,7 @@ def write_status():
 
 def run_daemon():
     """Main daemon loop."""
+    boot = time.monotonic()
     setup_logging()
     load_config()
 
@@ -1317,12 +4955,16 @@ def run_daemon():
         log("Another instance is already running", error=True)
         sys.exit(1)
 
-    signal.signal(signal.SIGHUP,  lambda s, f: load_config())
-    signal.signal(signal.SIGTERM, lambda s, f: (_shutdown_cleanup(), sys.exit(0)))
-    signal.signal(signal.SIGINT,  lambda s, f: (_shutdown_cleanup(), sys.exit(0)))
+    signal.signal(signal.SIGHUP,  lambda s, f: (load_config(), start_copy_workers()))
+    signal.signal(signal.SIGTERM, _request_shutdown)
+    signal.signal(signal.SIGINT,  _request_shutdown)
 
-    worker = threading.Thread(target=copy_worker, name="copy-worker", daemon=True)
-    worker.start()
+    throughput.load()
+    access_history.load()
+    metadata_cache.load()
+    start_copy_workers()
+    threading.Thread(target=page_cache_warmer.run, name="warmer", daemon=True).start()
+    threading.Thread(target=space_reclaimer.run, name="reclaimer", daemon=True).start()
 
     log("Service started. Waiting for streams...")
     if cfg("ENABLE_EPISODE_BATCHING", as_bool=True):
@@ -1330,20 +4972,47 @@ def run_daemon():
             f"tolerance={cfg('EPISODE_BATCH_TOLERANCE', as_int=True)}, "
             f"prefetch={cfg('EPISODE_BATCH_PREFETCH', as_int=True)}")
 
-    reconcile_tracked_files()
-    write_status()
+    # Straight to polling: the first stream after a reboot should not wait
+    # for a scan of the whole cache
+    threading.Thread(target=background_reconcile, name="reconcile", daemon=True).start()
+    for listener in notification_listeners:
+        threading.Thread(target=listener.run, name=f"notify-{listener.service}",
+                         daemon=True).start()
+    webhook_receiver.sync()
 
     global active_cache_paths
     last_streams      = {}
     last_days_check   = 0
-    last_status_write = time.time()
+    last_status_write = 0
+    last_compaction   = time.time()
+    last_poll         = 0
+    woken             = False
+    started           = set()      # streams first seen in the latest pass
+    first_poll        = True
 
-    while True:
+    while not _shutting_down.is_set():
         try:
             drain_move_requests()
-
-            streams = get_active_streams()
+            webhook_receiver.sync()
+            if apply_webhook_events():
+                woken = True
+
+            # With every server's notifications coming in, an idle server
+            # only gets asked now and then; a notification wakes us anyway
+            if (woken or last_streams or not notifications_cover_all()
+                    or time.monotonic() - last_poll >= NOTIFY_POLL_INTERVAL):
+                streams   = get_active_streams()
+                last_poll = time.monotonic()
+            else:
+                streams = last_streams
+            streams = merge_webhook_sessions(streams)
+            if first_poll:
+                first_poll = False
+                log(f"[Startup] Watching streams {time.monotonic() - boot:.1f}s after start"
+                    + ("" if _reconciled.is_set() else " - reconcile still running"))
             active_paths = set()
+            active_progress = {}
+            started = set()
 
             for docker_path, session in streams.items():
                 array_path = translate_docker_path(docker_path)
@@ -1356,11 +5025,15 @@ def run_daemon():
                     continue
 
                 active_paths.add(array_path)
+                active_progress[array_path] = session.get('progress')
 
                 # New stream?
                 if array_path not in stream_timers:
                     log(f"[Stream] Active: {os.path.basename(array_path)}")
                     stream_timers[array_path] = time.time()
+                    started.add(array_path)
+                    TrackedFiles.touch(array_to_cache(array_path))
+                    access_history.record(array_to_cache(array_path))
                     continue
 
                 # Copy delay passed?
@@ -1378,6 +5051,12 @@ def run_daemon():
             # Cache paths of active streams must never be evicted
             active_cache_paths = {array_to_cache(p) for p in active_paths}
 
+            # Read ahead on the array for streams whose copy is not done yet
+            page_cache_warmer.update({
+                p: progress for p, progress in active_progress.items()
+                if not os.path.exists(array_to_cache(p))
+            })
+
             cleanup_mode = cfg("CLEANUP_MODE").lower()
 
             # Smart cleanup (fires when a session has stopped)
@@ -1417,7 +5096,7 @@ def run_daemon():
                                     # download waiting for the mover, or a file
                                     # the user keeps on cache deliberately -
                                     # moving those to the array is not ours to do.
-                                    ours = TrackedFiles.load()
+                                    ours = TrackedFiles.under(cache_dir)
                                     try:
                                         for f in os.listdir(cache_dir):
                                             candidate = os.path.join(cache_dir, f)
@@ -1430,6 +5109,8 @@ def run_daemon():
                 delay = cfg("MOVIE_DELETE_DELAY", as_int=True)
                 for cache_path, queued_time in list(deletion_queue.items()):
                     if time.time() - queued_time > delay:
+                        if not tracking_confirmed(cache_path):
+                            continue        # again once reconcile is done
                         if os.path.exists(cache_path):
                             move_file_to_array(cache_path)
                             log(f"[Cleanup] {os.path.basename(cache_path)}")
@@ -1438,16 +5119,26 @@ def run_daemon():
             # Days-based cleanup (runs at most once per hour)
             elif cleanup_mode == "days":
                 if time.time() - last_days_check > 3600:
-                    max_age = cfg("CACHE_MAX_DAYS", as_int=True) * 86400
-                    tracked = TrackedFiles.load()
-                    now = time.time()
-
-                    for cache_path, cached_time in list(tracked.items()):
-                        if now - cached_time > max_age and os.path.exists(cache_path):
+                    cutoff = time.time() - cfg("CACHE_MAX_DAYS", as_int=True) * 86400
+                    policy = eviction_policy()
+                    held   = False
+
+                    # Cached before the cutoff, and - unless the policy is
+                    # fifo - not played since either
+                    for cache_path, cached_at in TrackedFiles.older_than(cutoff).items():
+                        if policy.last_used(cache_path, cached_at) >= cutoff:
+                            continue
+                        if not tracking_confirmed(cache_path):
+                            held = True
+                            continue
+                        if os.path.exists(cache_path):
                             log(f"[Days Cleanup] {os.path.basename(cache_path)}")
                             move_file_to_array(cache_path)
 
-                    last_days_check = time.time()
+                    # Files held back for the reconcile are looked at again
+                    # next pass, not in an hour
+                    if not held:
+                        last_days_check = time.time()
 
             last_streams = streams
 
@@ -1456,20 +5147,56 @@ def run_daemon():
                 write_status()
                 last_status_write = time.time()
 
+            if time.time() - last_compaction >= TRACKED_COMPACT_EVERY:
+                TrackedFiles.compact()
+                last_compaction = time.time()
+
         except Exception as e:
             log(f"Loop error: {e}", error=True)
 
-        time.sleep(max(1, cfg("CHECK_INTERVAL", as_int=True)))
+        # Wake exactly when a stream's copy delay runs out, not up to an
+        # interval later
+        wait  = max(1, cfg("CHECK_INTERVAL", as_int=True))
+        delay = cfg("COPY_DELAY", as_int=True)
+        now   = time.time()
+        for path, since in stream_timers.items():
+            if since + delay > now or path in started:
+                wait = min(wait, max(0.0, since + delay - now))
+        woken = _stream_wake.wait(wait)
+        _stream_wake.clear()
+
+    _shutdown_cleanup()
+
+def _request_shutdown(signum, frame):
+    """SIGTERM/SIGINT handler. It runs on the main thread between any two
+    bytecodes - possibly inside metadata_cache.put() or
+    access_history.record(), holding the very locks the saves on the way out
+    need - so it only flags the stop and wakes the main loop, which leaves
+    and runs _shutdown_cleanup() itself."""
+    _shutting_down.set()
+    _stream_wake.set()
 
 def _shutdown_cleanup():
-    """Called on SIGTERM/SIGINT so systemd/rc.d stop reports cleanly and
-    a running rsync doesn't linger as an orphan."""
+    """Run by the main loop once a stop was asked for, so systemd/rc.d stop
+    reports cleanly, running rsyncs don't linger as orphans and what was
+    learned is saved."""
     _shutting_down.set()
     try:
         with _rsync_lock:
-            proc = _current_rsync
-        if proc and proc.poll() is None:
-            proc.terminate()
+            procs = list(_running_rsync)
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+    except Exception:
+        pass
+    try:
+        throughput.save(force=True)
+        access_history.save(force=True)
+        metadata_cache.save()
+    except Exception:
+        pass
+    try:
+        TrackedFiles.compact()
     except Exception:
         pass
     try:
@@ -1506,5 +5233,6 @@ if __name__ == "__main__":
 
         paths = [a for a in sys.argv[1:] if a != "--flush"]
         flush_cache_to_array(only=paths or None, label="Move" if paths else "Flush")
+        TrackedFiles.compact()
     else:
         run_daemon()
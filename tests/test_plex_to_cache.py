@@ -6,10 +6,19 @@ pure functions can be exercised directly. Every case here corresponds to a
 bug that was actually found, so a regression fails loudly instead of quietly
 moving somebody's files to the wrong place.
 """
+import base64
+import gzip
+import hashlib
+import http.client
+import http.server
+import json
 import os
 import shutil
+import socket
+import struct
 import sys
 import tempfile
+import threading
 import time
 import unittest
 from pathlib import Path
@@ -164,7 +173,7 @@ class FlushCacheToArray(unittest.TestCase):
     """The manual flush must never pull a file out from under a playback."""
 
     def setUp(self):
-        configure(ARRAY_ROOT="/mnt/user", CACHE_ROOT="/mnt/cache")
+        configure(ARRAY_ROOT="/mnt/user", CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="False")
         ptc._flush_state.update(active=False, total=0, done=0, bytes=0,
                                 skipped=0, failed=0, finished=0)
         ptc.active_cache_paths = set()
@@ -431,34 +440,749 @@ class TrackedListWrites(unittest.TestCase):
         ptc.TRACKED_FILES = self._real
         shutil.rmtree(self.tmp, ignore_errors=True)
 
+    def count_writes(self):
+        """Every write to flash: snapshot saves and journal appends."""
+        writes = []
+        for name in ('save', '_append'):
+            real = getattr(ptc.TrackedFiles, name)
+            patcher = mock.patch.object(ptc.TrackedFiles, name,
+                                        side_effect=lambda *a, _r=real, _n=name: (writes.append(_n), _r(*a))[1])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return writes
+
     def test_removing_many_entries_writes_once(self):
         paths = {f"/mnt/cache/Media/e{i}.mkv": float(i) for i in range(51)}
         ptc.TrackedFiles.save(paths)
 
-        writes = []
-        real_save = ptc.TrackedFiles.save
-        try:
-            ptc.TrackedFiles.save = lambda t: (writes.append(1), real_save(t))[1]
-            ptc.TrackedFiles.remove_many(list(paths))
-        finally:
-            ptc.TrackedFiles.save = real_save
+        writes = self.count_writes()
+        ptc.TrackedFiles.remove_many(list(paths))
 
-        self.assertEqual(len(writes), 1, "one write for the whole batch")
+        self.assertEqual(writes, ["_append"], "one write for the whole batch")
         self.assertEqual(ptc.TrackedFiles.load(), {})
 
     def test_removing_nothing_writes_nothing(self):
         ptc.TrackedFiles.save({"/mnt/cache/Media/a.mkv": 1.0})
-        writes = []
-        real_save = ptc.TrackedFiles.save
-        try:
-            ptc.TrackedFiles.save = lambda t: (writes.append(1), real_save(t))[1]
-            ptc.TrackedFiles.remove_many([])
-            ptc.TrackedFiles.remove_many(["/mnt/cache/Media/not-tracked.mkv"])
-        finally:
-            ptc.TrackedFiles.save = real_save
+        writes = self.count_writes()
+        ptc.TrackedFiles.remove_many([])
+        ptc.TrackedFiles.remove_many(["/mnt/cache/Media/not-tracked.mkv"])
         self.assertEqual(writes, [])
 
 
+class TrackedJournal(unittest.TestCase):
+    """Changes go to an append-only journal; the sorted list is rewritten only
+    when the journal is compacted."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.list = os.path.join(self.tmp, "tracked.list")
+        self.journal = self.list + ".journal"
+        patcher = mock.patch.object(ptc, 'TRACKED_FILES', self.list)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ptc.TrackedFiles.save({"/mnt/cache/Media/a.mkv": 1.0})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def restart(self):
+        """Forget the in-memory list, as a new process would."""
+        ptc.TrackedFiles._entries = None
+
+    def test_a_change_is_one_journal_line(self):
+        ptc.TrackedFiles.add("/mnt/cache/Media/b.mkv")
+        ptc.TrackedFiles.remove("/mnt/cache/Media/a.mkv")
+        self.assertEqual(Path(self.list).read_text(), "/mnt/cache/Media/a.mkv|1.0\n",
+                         "the snapshot is left alone")
+        lines = Path(self.journal).read_text().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("+/mnt/cache/Media/b.mkv|"))
+        self.assertEqual(lines[1], "-/mnt/cache/Media/a.mkv")
+
+    def test_the_list_is_not_read_again_for_every_change(self):
+        with mock.patch.object(ptc.TrackedFiles, '_read', wraps=ptc.TrackedFiles._read) as read:
+            for n in range(20):
+                ptc.TrackedFiles.add(f"/mnt/cache/Media/e{n}.mkv")
+                ptc.TrackedFiles.load()
+        read.assert_not_called()
+
+    def test_a_crash_is_recovered_from_the_journal(self):
+        ptc.TrackedFiles.add("/mnt/cache/Media/b.mkv")
+        ptc.TrackedFiles.remove("/mnt/cache/Media/a.mkv")
+        with open(self.journal, "a") as f:
+            f.write("+/mnt/cache/Media/torn.mkv")    # cut off mid-write
+        self.restart()
+        self.assertEqual(list(ptc.TrackedFiles.load()), ["/mnt/cache/Media/b.mkv"])
+
+    def test_compaction_folds_the_journal_into_the_snapshot(self):
+        ptc.TrackedFiles.add("/mnt/cache/Media/c.mkv")
+        ptc.TrackedFiles.add("/mnt/cache/Media/b.mkv")
+        ptc.TrackedFiles.compact()
+        self.assertFalse(os.path.exists(self.journal))
+        paths = [line.rsplit("|", 1)[0] for line in Path(self.list).read_text().splitlines()]
+        self.assertEqual(paths, ["/mnt/cache/Media/a.mkv", "/mnt/cache/Media/b.mkv",
+                                 "/mnt/cache/Media/c.mkv"])
+        self.restart()
+        self.assertEqual(len(ptc.TrackedFiles.load()), 3)
+
+    def test_a_long_journal_compacts_itself(self):
+        with mock.patch.object(ptc, 'TRACKED_COMPACT_LINES', 5):
+            for n in range(5):
+                ptc.TrackedFiles.add(f"/mnt/cache/Media/e{n}.mkv")
+        self.assertFalse(os.path.exists(self.journal))
+        self.assertEqual(len(Path(self.list).read_text().splitlines()), 6)
+
+    def test_a_list_changed_by_another_process_is_read_again(self):
+        ptc.TrackedFiles.load()
+        Path(self.list).write_text("/mnt/cache/Media/x.mkv|2.0\n/mnt/cache/Media/y.mkv|3.0\n")
+        self.assertEqual(sorted(ptc.TrackedFiles.load()),
+                         ["/mnt/cache/Media/x.mkv", "/mnt/cache/Media/y.mkv"])
+
+
+class TrackingStore(unittest.TestCase):
+    """The queries eviction and cleanup run give the same answers on the text
+    list and on SQLite, and switching backends carries the list over."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.list = os.path.join(self.tmp, "tracked.list")
+        self.db = os.path.join(self.tmp, "tracked.db")
+        for name, value in (('TRACKED_FILES', self.list), ('TRACKED_DB', self.db)):
+            patcher = mock.patch.object(ptc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ptc.TrackedFiles._entries = None
+
+    def tearDown(self):
+        configure()
+        ptc.TrackedFiles._db()          # closes the database
+        ptc.TrackedFiles._entries = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def use(self, backend):
+        configure(TRACKING_BACKEND=backend)
+        ptc.TrackedFiles._entries = None
+
+    def fill(self):
+        season = os.path.join(self.tmp, "TV", "Show", "Season 1")
+        os.makedirs(season)
+        files = {os.path.join(season, "e1.mkv"): (100.0, 10),
+                 os.path.join(season, "e2.mkv"): (300.0, 20),
+                 os.path.join(self.tmp, "TV", "Show 2.mkv"): (200.0, 40)}
+        for path, (_ts, size) in files.items():
+            Path(path).write_bytes(b"x" * size)
+        ptc.TrackedFiles.save({p: ts for p, (ts, _size) in files.items()})
+        return files
+
+    def test_queries_agree_on_both_backends(self):
+        for backend in ("text", "sqlite"):
+            with self.subTest(backend=backend):
+                self.use(backend)
+                files = self.fill()
+                e1, e2, other = files
+                self.assertEqual([p for p, _ts in ptc.TrackedFiles.oldest()], [e1, other, e2])
+                self.assertEqual([p for p, _ts in ptc.TrackedFiles.oldest(1)], [e1])
+                self.assertEqual(sorted(ptc.TrackedFiles.older_than(250.0)), sorted([e1, other]))
+                self.assertEqual(sorted(ptc.TrackedFiles.under(os.path.join(self.tmp, "TV", "Show"))),
+                                 sorted([e1, e2]), "Show 2.mkv is not under Show/")
+                self.assertEqual(ptc.TrackedFiles.total_bytes(), (3, 70))
+                self.assertTrue(ptc.TrackedFiles.contains(e2))
+                ptc.TrackedFiles.remove(e2)
+                self.assertFalse(ptc.TrackedFiles.contains(e2))
+                self.assertEqual(ptc.TrackedFiles.total_bytes(), (2, 50))
+                shutil.rmtree(os.path.join(self.tmp, "TV"))
+
+    def test_sqlite_keeps_size_disk_and_last_access(self):
+        self.use("sqlite")
+        path = os.path.join(self.tmp, "a.mkv")
+        Path(path).write_bytes(b"x" * 5)
+        ptc.TrackedFiles.add(path, "/mnt/disk2")
+        ptc.TrackedFiles.touch(path)
+        row = ptc.TrackedFiles._sqlite.conn.execute(
+            "SELECT size, disk, last_access >= cached_at FROM tracked WHERE path = ?", (path,)).fetchone()
+        self.assertEqual(row, (5, "/mnt/disk2", 1))
+
+    def test_switching_to_sqlite_migrates_the_text_list_once(self):
+        self.use("text")
+        ptc.TrackedFiles.save({"/mnt/cache/Media/a.mkv": 1.0})
+        ptc.TrackedFiles.add("/mnt/cache/Media/b.mkv")     # still in the journal
+        self.use("sqlite")
+        self.assertEqual(sorted(ptc.TrackedFiles.load()),
+                         ["/mnt/cache/Media/a.mkv", "/mnt/cache/Media/b.mkv"])
+        self.assertFalse(os.path.exists(self.list))
+        self.assertTrue(os.path.exists(self.list + ".migrated"))
+
+    def test_switching_back_to_text_takes_the_database_entries(self):
+        self.use("sqlite")
+        ptc.TrackedFiles.save({"/mnt/cache/Media/a.mkv": 1.0})
+        self.use("text")
+        self.assertEqual(ptc.TrackedFiles.load(), {"/mnt/cache/Media/a.mkv": 1.0})
+        self.assertFalse(os.path.exists(self.db))
+
+
+class TrackedSizes(unittest.TestCase):
+    """The cached total is kept as files are tracked and untracked; a status
+    snapshot does not stat every file, and verify() catches what changed
+    behind the plugin's back."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.list = os.path.join(self.tmp, "tracked.list")
+        for name, value in (('TRACKED_FILES', self.list),
+                            ('TRACKED_DB', os.path.join(self.tmp, "tracked.db"))):
+            patcher = mock.patch.object(ptc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ptc.TrackedFiles._entries = None
+        ptc.TrackedFiles._cursor = ""
+
+    def tearDown(self):
+        configure()
+        ptc.TrackedFiles._db()
+        ptc.TrackedFiles._entries = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def media(self, name, size):
+        path = os.path.join(self.tmp, name)
+        Path(path).write_bytes(b"x" * size)
+        return path
+
+    def test_the_size_is_written_with_the_entry(self):
+        path = self.media("a.mkv", 7)
+        ptc.TrackedFiles.add(path)
+        ptc.TrackedFiles.compact()
+        self.assertRegex(Path(self.list).read_text(), r"a\.mkv\|[0-9.]+\|7\n$")
+
+    def test_a_list_without_sizes_is_sized_on_load(self):
+        a, b = self.media("a.mkv", 3), self.media("b|c.mkv", 4)
+        Path(self.list).write_text(f"{a}|1.0\n{b}|2.0\n")
+        self.assertEqual(ptc.TrackedFiles.load(), {a: 1.0, b: 2.0})
+        self.assertEqual(ptc.TrackedFiles.total_bytes(), (2, 7))
+
+    def test_totals_follow_adds_and_removes_without_stat(self):
+        a, b = self.media("a.mkv", 10), self.media("b.mkv", 20)
+        ptc.TrackedFiles.save({})
+        ptc.TrackedFiles.add(a, size=10)
+        ptc.TrackedFiles.add(b)
+        ptc.TrackedFiles.remove(a)
+        with mock.patch.object(ptc.os.path, 'getsize', side_effect=AssertionError("stat")):
+            self.assertEqual(ptc.TrackedFiles.total_bytes(), (1, 20))
+
+    def test_verify_drops_deleted_files_and_corrects_sizes(self):
+        for backend in ("text", "sqlite"):
+            with self.subTest(backend=backend):
+                configure(TRACKING_BACKEND=backend)
+                ptc.TrackedFiles._entries = None
+                files = [self.media(f"{backend}{n}.mkv", 10) for n in range(5)]
+                ptc.TrackedFiles.save({p: 1.0 for p in files})
+                os.remove(files[1])
+                Path(files[3]).write_bytes(b"x" * 25)
+
+                ptc.TrackedFiles.verify(limit=2)
+                self.assertEqual(ptc.TrackedFiles.total_bytes(), (4, 40), "first two checked")
+                ptc.TrackedFiles.verify(limit=2)
+                ptc.TrackedFiles.verify(limit=2)
+                self.assertEqual(ptc.TrackedFiles.total_bytes(), (4, 55))
+                self.assertNotIn(files[1], ptc.TrackedFiles.load())
+                self.assertEqual(ptc.TrackedFiles._cursor, "", "starts over at the end")
+                ptc.TrackedFiles.clear()
+
+    def test_verify_keeps_a_file_copied_back_meanwhile(self):
+        path = self.media("back.mkv", 10)
+        ptc.TrackedFiles.save({path: 1.0})
+        os.remove(path)
+        real = ptc._size_or_none
+
+        def copy_lands_after_the_stat(p):
+            size = real(p)
+            self.media("back.mkv", 10)
+            return size
+
+        with mock.patch.object(ptc, '_size_or_none', side_effect=copy_lands_after_the_stat):
+            ptc.TrackedFiles.verify()
+        self.assertIn(path, ptc.TrackedFiles.load())
+
+
+class EvictionPlanning(unittest.TestCase):
+    """Eviction measures the shortfall once, picks the victims from recorded
+    sizes, and moves nothing when they could not free enough anyway."""
+
+    GB = 1024 ** 3
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        patcher = mock.patch.object(ptc, 'TRACKED_FILES', os.path.join(self.tmp, "tracked.list"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ptc.TrackedFiles._entries = None
+        configure(ENABLE_CACHE_EVICTION="True", CACHE_MAX_USAGE="90")
+        ptc._reconciled.set()           # the startup reconcile is done
+        ptc._evict_shortfall.update(key=None, logged=0.0)
+        self.used = 95 * self.GB
+        self.moved = []
+        ptc.TrackedFiles.save({})
+        for n, size in enumerate((1, 4, 2, 8)):     # oldest first
+            with mock.patch.object(ptc.time, 'time', return_value=float(n)):
+                ptc.TrackedFiles.add(f"/mnt/cache/Media/e{n}.mkv", size=size * self.GB)
+
+    def tearDown(self):
+        ptc.TrackedFiles._entries = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def usage(self, _path):
+        return shutil._ntuple_diskusage(100 * self.GB, self.used, 100 * self.GB - self.used)
+
+    def move(self, path, track=True):
+        self.moved.append(os.path.basename(path))
+        self.used -= ptc.TrackedFiles._sizes[path]
+        ptc.TrackedFiles.remove(path)
+        return True, False, 0
+
+    def evict(self, needed, protected=()):
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage) as du, \
+             mock.patch.object(ptc, 'move_file_to_array', side_effect=self.move), \
+             mock.patch.object(ptc, 'active_cache_paths', set(protected)):
+            result = ptc.evict_oldest_cached(needed)
+        return result, du.call_count
+
+    def test_the_deficit_covers_both_limits(self):
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage):
+            self.assertEqual(ptc.cache_deficit(0), 5 * self.GB + 1, "usage over 90%")
+            self.used = 10 * self.GB
+            self.assertEqual(ptc.cache_deficit(self.GB), 0)
+            self.assertEqual(ptc.cache_deficit(85 * self.GB), 5 * self.GB + 1,
+                             "usage over 90% with the file")
+            ptc.config["CACHE_MAX_USAGE"] = "100"
+            self.assertEqual(ptc.cache_deficit(90 * self.GB), ptc.CACHE_HEADROOM + 1,
+                             "free space short by the headroom")
+
+    def test_the_oldest_files_that_cover_the_deficit_go(self):
+        result, stats = self.evict(self.GB, protected={"/mnt/cache/Media/e1.mkv"})
+        self.assertTrue(result)
+        self.assertEqual(self.moved, ["e0.mkv", "e2.mkv", "e3.mkv"], "e1 is being streamed")
+        self.assertEqual(stats, 2, "measured before and after, not per file")
+
+    def test_an_unsatisfiable_plan_moves_nothing(self):
+        with mock.patch.object(ptc, 'EVICT_MAX_FILES', 2), mock.patch.object(ptc, 'log') as log:
+            result, _ = self.evict(self.GB)
+        self.assertFalse(result)
+        self.assertEqual(self.moved, [])
+        self.assertIn("nothing moved", log.call_args[0][0])
+
+    def test_the_same_shortfall_is_logged_once(self):
+        with mock.patch.object(ptc, 'EVICT_MAX_FILES', 2), mock.patch.object(ptc, 'log') as log:
+            for needed in (self.GB, 2 * self.GB, self.GB):
+                self.evict(needed)
+            self.assertEqual(log.call_count, 1, "every copy that does not fit asks again")
+            with mock.patch.object(ptc.time, 'time', return_value=time.time() + 3600):
+                self.evict(self.GB)
+            self.assertEqual(log.call_count, 2, "and it is repeated now and then")
+
+
+class BackgroundReclaim(unittest.TestCase):
+    """Past the high watermark - counting queued copies - files are evicted in
+    the background down to the low one, and not again until the high one."""
+
+    GB = 1024 ** 3
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        patcher = mock.patch.object(ptc, 'TRACKED_FILES', os.path.join(self.tmp, "tracked.list"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ptc.TrackedFiles._entries = None
+        configure(ENABLE_CACHE_EVICTION="True", CACHE_MAX_USAGE="90",
+                  RECLAIM_HIGH_PCT="75", RECLAIM_LOW_PCT="65")
+        ptc._reconciled.set()
+        ptc.TrackedFiles.save({})
+        for n in range(10):
+            with mock.patch.object(ptc.time, 'time', return_value=float(n)):
+                ptc.TrackedFiles.add(f"/mnt/cache/Media/e{n}.mkv", size=2 * self.GB)
+        self.used = 70 * self.GB
+        self.moved = []
+        self.reclaimer = ptc.SpaceReclaimer()
+
+    def tearDown(self):
+        ptc._pending_sizes.clear()
+        ptc.TrackedFiles._entries = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def usage(self, _path):
+        return shutil._ntuple_diskusage(100 * self.GB, self.used, 100 * self.GB - self.used)
+
+    def move(self, path, track=True):
+        self.moved.append(os.path.basename(path))
+        self.used -= 2 * self.GB
+        ptc.TrackedFiles.remove(path)
+        return True, False, 2 * self.GB
+
+    def reclaim(self):
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage), \
+             mock.patch.object(ptc, 'move_file_to_array', side_effect=self.move), \
+             mock.patch.object(ptc, 'log'):
+            while self.reclaimer.reclaim_once():
+                pass
+
+    def test_below_the_high_mark_nothing_moves(self):
+        self.reclaim()
+        self.assertEqual(self.moved, [])
+        self.assertFalse(self.reclaimer.active)
+
+    def test_queued_copies_count_towards_the_high_mark(self):
+        ptc._pending_sizes["/mnt/user/Media/new.mkv"] = (None, 6 * self.GB)
+        self.reclaim()
+        # 76% with the queued file; down to 65% takes 11 GB, six files
+        self.assertEqual(self.moved, [f"e{n}.mkv" for n in range(6)])
+        self.assertEqual(self.reclaimer.snapshot()["files"], 6)
+        self.assertFalse(self.reclaimer.active, "done once at the low mark")
+
+    def test_queued_files_already_on_cache_are_not_counted_twice(self):
+        ptc._pending_sizes["/mnt/user/Media/done.mkv"] = (None, 6 * self.GB)
+        real_exists = os.path.exists
+        with mock.patch.object(ptc.os.path, 'exists',
+                               side_effect=lambda p: p == "/mnt/cache/Media/done.mkv"
+                               or real_exists(p)):
+            self.reclaim()
+        self.assertEqual(self.moved, [])
+
+    def test_other_data_above_the_low_mark_evicts_nothing(self):
+        self.used = 90 * self.GB
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage), \
+             mock.patch.object(ptc, 'move_file_to_array', side_effect=self.move), \
+             mock.patch.object(ptc, 'log') as logged:
+            for _ in range(3):
+                self.reclaimer.poke()
+                self.assertFalse(self.reclaimer.reclaim_once())
+        self.assertEqual(self.moved, [], "20 GB of ours cannot get 90% down to 65%")
+        self.assertEqual(logged.call_count, 1, "said once, not on every poke")
+
+    def test_hysteresis_between_the_marks(self):
+        self.used = 80 * self.GB
+        self.reclaim()
+        self.assertEqual(len(self.moved), 8, "from 80% down to 64%")
+        self.used = 72 * self.GB
+        self.reclaim()
+        self.assertEqual(len(self.moved), 8, "72% is under the high mark")
+
+    def test_off_with_a_zero_high_mark_or_without_eviction(self):
+        self.used = 95 * self.GB
+        for overrides in ({"RECLAIM_HIGH_PCT": "0"}, {"ENABLE_CACHE_EVICTION": "False"}):
+            with self.subTest(**overrides):
+                ptc.config.update(overrides)
+                self.reclaim()
+                self.assertEqual(self.moved, [])
+                self.assertIsNone(self.reclaimer.snapshot()["high"])
+                configure(ENABLE_CACHE_EVICTION="True", CACHE_MAX_USAGE="90")
+
+
+class SpaceReservations(unittest.TestCase):
+    """Copies are admitted against free space minus what earlier admissions
+    reserved, so together they cannot overcommit the cache."""
+
+    GB = 1024 ** 3
+
+    def setUp(self):
+        configure(CACHE_MAX_USAGE="80")
+        self.ledger = ptc.SpaceLedger()
+        patcher = mock.patch.object(ptc, 'space_ledger', self.ledger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.used = 60 * self.GB
+
+    def usage(self, _path):
+        return shutil._ntuple_diskusage(100 * self.GB, self.used, 100 * self.GB - self.used)
+
+    def admit(self, path, size):
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage):
+            return self.ledger.admit(path, size)
+
+    def test_copies_that_fit_alone_do_not_all_fit_together(self):
+        self.assertTrue(self.admit("/c/e1.mkv", 12 * self.GB))
+        self.assertTrue(self.admit("/c/e2.mkv", 7 * self.GB))
+        self.assertFalse(self.admit("/c/e3.mkv", 5 * self.GB), "60 + 19 reserved is 79%")
+        self.assertTrue(self.admit("/c/e1.mkv", 12 * self.GB), "already holding a reservation")
+        self.assertEqual(self.ledger.outstanding(), 19 * self.GB)
+
+    def test_released_space_can_be_admitted_again(self):
+        self.admit("/c/e1.mkv", 19 * self.GB)
+        self.ledger.release("/c/e1.mkv")
+        self.ledger.release("/c/e1.mkv")
+        self.assertEqual(self.ledger.outstanding(), 0)
+        self.assertTrue(self.admit("/c/e2.mkv", 5 * self.GB))
+
+    def test_eviction_counts_reservations_as_used(self):
+        self.admit("/c/e1.mkv", 15 * self.GB)
+        with mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage):
+            self.assertEqual(ptc.cache_deficit(0), 0)
+            self.admit("/c/e2.mkv", 4 * self.GB)
+            self.assertFalse(ptc.cache_has_room_for(self.GB))
+            self.assertEqual(ptc.cache_deficit(0), 0, "79% still under 80%")
+
+    def test_a_failed_copy_releases_its_reservation(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        configure(ARRAY_ROOT=os.path.join(tmp, "array"), CACHE_ROOT=os.path.join(tmp, "cache"))
+        path = os.path.join(tmp, "array", "film.mkv")
+        with mock.patch.object(ptc, '_copy_candidate', return_value=self.GB), \
+             mock.patch.object(ptc.shutil, 'disk_usage', side_effect=self.usage), \
+             mock.patch.object(ptc, 'copy_files',
+                               side_effect=lambda s, d, names, settle, job=None:
+                               settle(names[0], OSError("boom"))), \
+             mock.patch.object(ptc, 'log'), \
+             mock.patch.dict(ptc.failed_copies, clear=True):
+            ptc.copy_files_to_cache([path])
+        self.assertEqual(self.ledger.outstanding(), 0)
+
+
+class EvictionPolicies(unittest.TestCase):
+    """Each policy orders the same cached files by what it values; files that
+    would have to be copied back go last."""
+
+    DAY = 86400.0
+    GB = 1024 ** 3
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.array = os.path.join(self.tmp, "array")
+        self.cache = os.path.join(self.tmp, "cache")
+        configure(ARRAY_ROOT=self.array, CACHE_ROOT=self.cache)
+        self.history = ptc.AccessHistory()
+        self.now = 100 * self.DAY
+
+    def tearDown(self):
+        configure()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def cached(self, name, on_array=True):
+        """Cache path of name; its original exists on the array unless told
+        otherwise."""
+        if on_array:
+            os.makedirs(self.array, exist_ok=True)
+            Path(self.array, name).write_text("x")
+        return os.path.join(self.cache, name)
+
+    def order(self, policy, entries):
+        with mock.patch.object(ptc.time, 'time', return_value=self.now):
+            pol = ptc.EVICTION_POLICIES[policy](self.history)
+            return [os.path.basename(p) for p, _size in pol.order(entries)], pol
+
+    def play(self, path, *days):
+        for day in days:
+            self.history.record(path, now=day * self.DAY)
+
+    def test_lru_keeps_what_was_played_recently(self):
+        family, oneoff = self.cached("family.mkv"), self.cached("oneoff.mkv")
+        self.play(family, 90, 97)
+        entries = [(family, 10 * self.DAY, self.GB), (oneoff, 80 * self.DAY, self.GB)]
+        self.assertEqual(self.order("fifo", entries)[0], ["family.mkv", "oneoff.mkv"])
+        self.assertEqual(self.order("lru", entries)[0], ["oneoff.mkv", "family.mkv"])
+
+    def test_lfu_keeps_the_weekly_rewatch(self):
+        family, oneoff = self.cached("family.mkv"), self.cached("oneoff.mkv")
+        self.play(family, 70, 77, 84, 91)
+        self.play(oneoff, 98)
+        entries = [(family, 10 * self.DAY, self.GB), (oneoff, 98 * self.DAY, self.GB)]
+        self.assertEqual(self.order("lru", entries)[0], ["family.mkv", "oneoff.mkv"])
+        self.assertEqual(self.order("lfu", entries)[0], ["oneoff.mkv", "family.mkv"])
+
+    def test_gdsf_lets_a_large_file_go_before_small_ones(self):
+        film, ep1, ep2 = (self.cached(n) for n in ("film.mkv", "e1.mkv", "e2.mkv"))
+        entries = [(ep1, 50 * self.DAY, self.GB), (film, 60 * self.DAY, 40 * self.GB),
+                   (ep2, 50 * self.DAY, self.GB)]
+        order, pol = self.order("gdsf", entries)
+        self.assertEqual(order[0], "film.mkv")
+        pol.evicted(film)
+        self.assertGreater(self.history.gdsf_l, 0, "evicting raises the inflation value")
+
+    def test_gdsf_weighs_the_cost_of_copying_back(self):
+        cheap, costly = self.cached("cheap.mkv"), self.cached("costly.mkv", on_array=False)
+        entries = [(costly, 50 * self.DAY, 2 * self.GB), (cheap, 50 * self.DAY, self.GB)]
+        self.assertEqual(self.order("gdsf", entries)[0], ["cheap.mkv", "costly.mkv"],
+                         "twice the size, but four times the cost")
+
+    def test_gdsf_looks_up_only_the_files_it_gets_to(self):
+        paths = [self.cached(f"e{n}.mkv") for n in range(50)]
+        costly = self.cached("costly.mkv", on_array=False)
+        entries = [(p, 50 * self.DAY, self.GB) for p in paths] + [(costly, 50 * self.DAY, self.GB)]
+        with mock.patch.object(ptc.time, 'time', return_value=self.now), \
+             mock.patch.object(ptc.os.path, 'exists', wraps=os.path.exists) as exists:
+            ranked = ptc.GDSFPolicy(self.history).order(entries)
+            first = [os.path.basename(next(ranked)[0]) for _ in range(3)]
+        self.assertLessEqual(exists.call_count, 4)
+        self.assertNotIn("costly.mkv", first, "its copy-back cost is still counted")
+
+    def test_gdsf_ages_out_files_valued_before_the_last_evictions(self):
+        old, new = self.cached("old.mkv"), self.cached("new.mkv")
+        self.play(old, 99)
+        self.history.gdsf_l = 5.0                 # evictions since old was played
+        self.play(new, 99)
+        entries = [(old, 50 * self.DAY, self.GB), (new, 50 * self.DAY, 4 * self.GB)]
+        self.assertEqual(self.order("gdsf", entries)[0], ["old.mkv", "new.mkv"],
+                         "a quarter of the value per GiB, but valued after L rose")
+
+    def test_gdsf_values_a_cached_file_from_when_it_was_cached(self):
+        self.history.gdsf_l = 3.0
+        path = self.cached("prefetched.mkv")
+        self.history.cached(path, now=self.now)
+        access = self.history.get(path)
+        self.assertEqual(access["base"], 3.0)
+        self.assertEqual(access["hits"], 0)
+        with mock.patch.object(ptc.time, 'time', return_value=self.now):
+            key = ptc.GDSFPolicy(self.history).key(path, self.now, self.GB, access)
+        self.assertAlmostEqual(key, 4.0, msg="never played counts as used once, on top of L")
+
+    def test_files_without_an_original_go_last(self):
+        gone, kept = self.cached("gone.mkv", on_array=False), self.cached("kept.mkv")
+        entries = [(gone, 1.0, self.GB), (kept, 2.0, self.GB)]
+        for policy in ("fifo", "lru", "lfu", "arc"):
+            with self.subTest(policy=policy):
+                self.assertEqual(self.order(policy, entries)[0], ["kept.mkv", "gone.mkv"])
+
+    def test_arc_balances_played_once_against_played_again(self):
+        paths = [self.cached(f"e{n}.mkv") for n in range(3)]
+        self.play(paths[0], 10, 20)               # T2
+        self.play(paths[1], 30)                   # T1, both played more recently
+        self.play(paths[2], 35)
+        entries = [(p, 5 * self.DAY, self.GB) for p in paths]
+        order, pol = self.order("arc", entries)
+        self.assertEqual(order, ["e1.mkv", "e0.mkv", "e2.mkv"],
+                         "T1 goes first while over its half, then T2")
+
+        pol.evicted(paths[1])
+        self.assertEqual(self.history.get(paths[1])["ghost"], "t1")
+        self.play(paths[1], 40)
+        self.assertGreater(self.history.arc_p, 0.5, "a T1 ghost hit makes room for T1")
+        self.assertNotIn("ghost", self.history.get(paths[1]))
+
+    def test_days_cleanup_age_follows_the_policy(self):
+        path = self.cached("film.mkv")
+        self.play(path, 95)
+        with mock.patch.object(ptc.time, 'time', return_value=self.now):
+            self.assertEqual(ptc.EvictionPolicy(self.history).last_used(path, self.DAY), self.DAY)
+            self.assertEqual(ptc.LRUPolicy(self.history).last_used(path, self.DAY), 95 * self.DAY)
+
+    def test_history_survives_a_restart_and_stays_bounded(self):
+        store = os.path.join(self.tmp, "access.json")
+        with mock.patch.object(ptc, 'ACCESS_FILE', store), \
+             mock.patch.object(ptc, 'ACCESS_MAX_ENTRIES', 2):
+            for n in range(3):
+                self.history.record(f"/c/e{n}.mkv", now=float(n))
+            self.history.evicted("/c/e2.mkv", ghost="t1")
+            self.history.save(force=True)
+            again = ptc.AccessHistory()
+            again.load()
+        self.assertIsNone(again.get("/c/e0.mkv"), "least recently played dropped")
+        self.assertEqual(again.get("/c/e2.mkv")["ghost"], "t1")
+        self.assertEqual(again.get("/c/e1.mkv")["hits"], 1)
+
+
+class IncrementalReconcile(unittest.TestCase):
+    """Startup reconcile drops stale entries and adopts lost copies without
+    listing folders that did not change, or asking the array file by file."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.array = os.path.join(self.tmp, "array")
+        self.cache = os.path.join(self.tmp, "cache")
+        for side in (self.array, self.cache):
+            for folder in ("Movies/Film", "TV/Show/Season 1"):
+                os.makedirs(os.path.join(side, folder))
+        configure(ARRAY_ROOT=self.array, CACHE_ROOT=self.cache,
+                  DOCKER_MAPPINGS=f"/movies:{self.array}/Movies;/tv:{self.array}/TV")
+        for name, value in (('TRACKED_FILES', os.path.join(self.tmp, "tracked.list")),
+                            ('RECONCILE_INDEX', os.path.join(self.tmp, "index.json"))):
+            patcher = mock.patch.object(ptc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ptc.TrackedFiles._entries = None
+        self.film = self.both("Movies/Film/film.mkv")
+        self.episode = self.both("TV/Show/Season 1/e1.mkv")
+        ptc.TrackedFiles.save({self.film: 1.0})
+
+    def tearDown(self):
+        configure()
+        ptc.TrackedFiles._entries = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def both(self, rel):
+        for side in (self.array, self.cache):
+            Path(side, rel).write_text("x")
+        return os.path.join(self.cache, rel)
+
+    def reconcile(self):
+        with mock.patch.object(ptc, 'log') as log, \
+             mock.patch.object(ptc.os, 'scandir', wraps=os.scandir) as scandir, \
+             mock.patch.object(ptc.os, 'listdir', wraps=os.listdir) as listdir:
+            ptc.reconcile_tracked_files()
+        return ([c[0][0] for c in scandir.call_args_list], [c[0][0] for c in listdir.call_args_list],
+                log.call_args_list[-1][0][0])
+
+    def test_adopts_copies_and_drops_stale_entries(self):
+        Path(self.cache, "TV/Show/Season 1/download.mkv").write_text("x")   # cache-only
+        ptc.TrackedFiles.add(os.path.join(self.cache, "Movies/Film/gone.mkv"))
+        _scanned, arrays, timing = self.reconcile()
+        self.assertEqual(sorted(ptc.TrackedFiles.load()), sorted([self.film, self.episode]))
+        self.assertEqual(arrays, [os.path.join(self.array, "TV/Show/Season 1")],
+                         "one array listing, only where something is untracked")
+        self.assertRegex(timing, r"folders \(0 unchanged\).*scan .*array checks")
+
+    def test_unchanged_folders_are_not_listed_again(self):
+        self.reconcile()
+        os.utime(os.path.join(self.cache, "Movies/Film"), ns=(1, 1))   # as if changed
+        scanned, _arrays, timing = self.reconcile()
+        self.assertEqual(scanned, [os.path.join(self.cache, "Movies/Film")])
+        self.assertIn("5 folders (4 unchanged)", timing)
+        self.assertEqual(sorted(ptc.TrackedFiles.load()), sorted([self.film, self.episode]))
+
+    def test_a_file_deleted_since_the_last_run_is_dropped(self):
+        self.reconcile()
+        os.remove(self.episode)
+        self.reconcile()
+        self.assertEqual(list(ptc.TrackedFiles.load()), [self.film])
+
+    def test_a_copy_finishing_during_reconcile_is_kept(self):
+        late = self.both("Movies/Film/late.mkv")
+        real = ptc._reconcile_root
+
+        def copy_lands_meanwhile(root, index, tracked):
+            ptc.TrackedFiles.add(late)
+            return real(root, index, tracked)
+
+        with mock.patch.object(ptc, '_reconcile_root', side_effect=copy_lands_meanwhile):
+            self.reconcile()
+        self.assertEqual(sorted(ptc.TrackedFiles.load()), sorted([self.film, self.episode, late]))
+
+    def test_a_stale_file_copied_back_during_reconcile_is_kept(self):
+        back = os.path.join(self.cache, "Movies/Film/back.mkv")
+        ptc.TrackedFiles.add(back)
+        real = ptc._reconcile_root
+
+        def copied_back_after_the_listing(root, index, tracked):
+            result = real(root, index, tracked)
+            Path(back).write_text("x")
+            return result
+
+        with mock.patch.object(ptc, '_reconcile_root', side_effect=copied_back_after_the_listing):
+            self.reconcile()
+        self.assertIn(back, ptc.TrackedFiles.load())
+
+    def test_before_reconcile_only_duplicates_are_evicted(self):
+        self.addCleanup(ptc._reconciled.set)
+        ptc._reconciled.clear()
+        cache_only = os.path.join(self.cache, "Movies/Film/extra.mkv")
+        Path(cache_only).write_text("x")
+        ptc.TrackedFiles.add(cache_only)
+        policy = ptc.EvictionPolicy(ptc.AccessHistory())
+        victims, _freed, _ok = ptc.plan_eviction(10, set(), policy)
+        self.assertEqual(victims, [self.film], "no array copy, so not known to be ours yet")
+
+        with mock.patch.object(ptc, 'log'):
+            ptc.background_reconcile()
+        self.assertTrue(ptc._reconciled.is_set())
+        victims, _freed, _ok = ptc.plan_eviction(10, set(), policy)
+        self.assertEqual(sorted(victims), sorted([self.film, cache_only, self.episode]))
+
+
 class MoveRequestQueue(unittest.TestCase):
     """Requests from the web UI must not be lost - not when several arrive at
     once, and not when one arrives while a move is already running."""
@@ -510,5 +1234,1600 @@ class MoveRequestQueue(unittest.TestCase):
         self.assertEqual(self.started, [["/mnt/cache/Media/A"]])
 
 
+
+class CopyWorkerPool(unittest.TestCase):
+    """Copies from different disks run side by side; two from the same disk
+    never do."""
+
+    def setUp(self):
+        configure(COPY_WORKERS="3", COPY_PER_DISK="1")
+        self.q = ptc.CopyQueue()
+
+    def test_a_busy_disk_is_skipped_for_an_idle_one(self):
+        self.q.put("/mnt/user/Media/A/a1.mkv", "/mnt/disk1")
+        self.q.put("/mnt/user/Media/A2/a2.mkv", "/mnt/disk1")
+        self.q.put("/mnt/user/Media/B/b1.mkv", "/mnt/disk2")
+
+        first = self.q.get(timeout=0)
+        self.assertEqual((first.path, first.disk), ("/mnt/user/Media/A/a1.mkv", "/mnt/disk1"))
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Media/B/b1.mkv",
+                         "disk1 already has its reader")
+        self.assertIsNone(self.q.get(timeout=0))
+
+        self.q.done(first)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Media/A2/a2.mkv")
+
+    def test_the_global_limit_holds_across_disks(self):
+        configure(COPY_WORKERS="2", COPY_PER_DISK="1")
+        for n in range(1, 4):
+            self.q.put(f"/mnt/user/Media/{n}.mkv", f"/mnt/disk{n}")
+        self.assertIsNotNone(self.q.get(timeout=0))
+        self.assertIsNotNone(self.q.get(timeout=0))
+        self.assertIsNone(self.q.get(timeout=0))
+        self.assertEqual(self.q.qsize(), 1)
+
+    def test_an_unknown_disk_is_only_bound_by_the_global_limit(self):
+        self.q.put("/elsewhere/a/a.mkv", None)
+        self.q.put("/elsewhere/b/b.mkv", None)
+        self.assertIsNotNone(self.q.get(timeout=0))
+        self.assertIsNotNone(self.q.get(timeout=0))
+
+
+class SourceDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._real = ptc.DISK_MOUNTS
+        ptc.DISK_MOUNTS = os.path.join(self.tmp, "disk[0-9]*")
+        for n in (1, 2):
+            os.makedirs(os.path.join(self.tmp, f"disk{n}", "Media"))
+        Path(self.tmp, "disk2", "Media", "film.mkv").write_text("x")
+
+    def tearDown(self):
+        ptc.DISK_MOUNTS = self._real
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_the_disk_holding_the_file_is_found(self):
+        self.assertEqual(ptc.source_disk("/mnt/user/Media/film.mkv"),
+                         os.path.join(self.tmp, "disk2"))
+
+    def test_a_file_on_no_disk_has_none(self):
+        self.assertIsNone(ptc.source_disk("/mnt/user/Media/missing.mkv"))
+        self.assertIsNone(ptc.source_disk("/somewhere/else.mkv"))
+
+
+
+class ArrayDiskPaths(unittest.TestCase):
+    """Reads and writes go to the disk holding the folder, not through shfs."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.disks = [os.path.join(self.tmp, f"disk{n}") for n in (1, 2)]
+        for disk in self.disks:
+            os.makedirs(os.path.join(disk, "Media", "Show"))
+        Path(self.disks[1], "Media", "Show", "e1.mkv").write_text("x")
+        Path(self.disks[1], "Media", "Show", "e2.mkv").write_text("x")
+        configure(ARRAY_DISKS=" ".join(self.disks))
+        self.resolver = ptc.DiskResolver()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_a_share_path_maps_to_the_disk_holding_it(self):
+        self.assertEqual(self.resolver.physical("/mnt/user/Media/Show/e1.mkv"),
+                         os.path.join(self.disks[1], "Media", "Show", "e1.mkv"))
+        self.assertEqual(self.resolver.physical("/mnt/user0/Media/Show/e2.mkv"),
+                         os.path.join(self.disks[1], "Media", "Show", "e2.mkv"))
+
+    def test_the_share_path_is_kept_when_no_disk_has_the_file(self):
+        for path in ("/mnt/user/Media/Show/e9.mkv", "/somewhere/else.mkv"):
+            self.assertEqual(self.resolver.physical(path), path)
+
+    def test_the_disk_is_remembered_per_folder(self):
+        self.resolver.physical("/mnt/user/Media/Show/e1.mkv")
+        with mock.patch.object(ptc.os.path, 'exists', wraps=os.path.exists) as exists:
+            self.resolver.physical("/mnt/user/Media/Show/e2.mkv")
+        self.assertEqual(exists.call_count, 1, "the remembered disk is tried first")
+
+    def test_a_file_that_moved_is_found_again(self):
+        self.resolver.physical("/mnt/user/Media/Show/e1.mkv")
+        os.rename(os.path.join(self.disks[1], "Media", "Show", "e1.mkv"),
+                  os.path.join(self.disks[0], "Media", "Show", "e1.mkv"))
+        self.assertEqual(self.resolver.disk_of("/mnt/user/Media/Show/e1.mkv"), self.disks[0])
+
+    def test_a_file_on_no_disk_is_not_looked_for_every_time(self):
+        self.resolver.disk_of("/mnt/user/Media/Show/e9.mkv")
+        with mock.patch.object(ptc.os.path, 'exists', wraps=os.path.exists) as exists:
+            self.assertIsNone(self.resolver.disk_of("/mnt/user/Media/Show/e9.mkv"))
+        self.assertEqual(exists.call_count, 0)
+        with mock.patch.object(ptc.time, 'monotonic', return_value=time.monotonic() + 61):
+            Path(self.disks[0], "Media", "Show", "e9.mkv").write_text("x")
+            self.assertEqual(self.resolver.disk_of("/mnt/user/Media/Show/e9.mkv"), self.disks[0])
+
+    def test_the_disk_list_is_configurable(self):
+        configure(ARRAY_DISKS=self.disks[0])
+        self.assertIsNone(self.resolver.disk_of("/mnt/user/Media/Show/e1.mkv"))
+
+    def test_a_move_writes_to_the_disk_holding_the_folder(self):
+        self.resolver.physical("/mnt/user/Media/Show/e1.mkv")
+        self.assertEqual(self.resolver.for_write("/mnt/user0/Media/Show/e3.mkv", 1),
+                         os.path.join(self.disks[1], "Media", "Show", "e3.mkv"))
+
+    def test_a_move_goes_through_the_share_without_a_fitting_disk(self):
+        path = "/mnt/user0/Media/Other/film.mkv"
+        self.assertEqual(self.resolver.for_write(path, 1), path, "no disk has the folder")
+        path = "/mnt/user0/Media/Show/e3.mkv"
+        with mock.patch.object(ptc.shutil, 'disk_usage',
+                               return_value=shutil._ntuple_diskusage(100, 100, 0)):
+            self.assertEqual(self.resolver.for_write(path, 1), path, "no disk has room")
+
+    def test_move_file_to_array_uses_the_disk_path(self):
+        cache = os.path.join(self.tmp, "cache")
+        os.makedirs(os.path.join(cache, "Show"))
+        Path(cache, "Show", "e3.mkv").write_text("x")
+        configure(ARRAY_DISKS=" ".join(self.disks), ARRAY_ROOT="/mnt/user/Media",
+                  CACHE_ROOT=cache)
+        os.rmdir(os.path.join(self.disks[0], "Media", "Show"))
+        with mock.patch.object(ptc, 'disk_resolver', self.resolver), \
+             mock.patch.object(ptc, 'transfer_file') as transfer, \
+             mock.patch.object(ptc.TrackedFiles, 'remove'):
+            ptc.move_file_to_array(os.path.join(cache, "Show", "e3.mkv"))
+        self.assertEqual(transfer.call_args[0][1],
+                         os.path.join(self.disks[1], "Media", "Show", "e3.mkv"))
+
+    def test_copies_read_from_the_disk(self):
+        cache = os.path.join(self.tmp, "cache")
+        os.makedirs(cache)
+        configure(ARRAY_DISKS=" ".join(self.disks), ARRAY_ROOT="/mnt/user/Media",
+                  CACHE_ROOT=cache)
+        share = "/mnt/user/Media/Show/e1.mkv"
+        with mock.patch.object(ptc, 'disk_resolver', self.resolver), \
+             mock.patch.object(ptc, '_copy_candidate', return_value=1), \
+             mock.patch.object(ptc, 'cache_has_room_for', return_value=True), \
+             mock.patch.object(ptc, 'clone_permissions'), \
+             mock.patch.object(ptc, 'copy_files') as copy:
+            ptc.copy_files_to_cache([share])
+        src_dir, dst_dir, names = copy.call_args[0][:3]
+        self.assertEqual(src_dir, os.path.join(self.disks[1], "Media", "Show"))
+        self.assertEqual(dst_dir, os.path.join(cache, "Show"))
+        self.assertEqual(names, ["e1.mkv"])
+
+    def test_a_file_already_on_cache_is_not_queued(self):
+        array, cache = os.path.join(self.tmp, "array"), os.path.join(self.tmp, "cache")
+        for root in (array, cache):
+            os.makedirs(root)
+            Path(root, "film.mkv").write_text("x")
+        configure(ARRAY_DISKS=" ".join(self.disks), ARRAY_ROOT=array, CACHE_ROOT=cache)
+        path = os.path.join(array, "film.mkv")
+        with mock.patch.object(ptc, 'source_disk') as lookup, \
+             mock.patch.object(ptc, 'copy_queue') as queue, \
+             mock.patch.object(ptc.TrackedFiles, 'add'), \
+             mock.patch.object(ptc, '_pending_copies', set()):
+            ptc.enqueue_copy(path)
+            self.assertEqual(ptc._pending_copies, set())
+        lookup.assert_not_called()
+        queue.put.assert_not_called()
+
+
+class SleepingDisks(unittest.TestCase):
+    """Work nobody is waiting on does not wake a disk, but runs side by side
+    on disks that are awake anyway."""
+
+    def setUp(self):
+        configure(COPY_WORKERS="3", COPY_PER_DISK="1")
+        self.asleep = set()
+        self.q = ptc.CopyQueue(standby=lambda disk: disk in self.asleep)
+
+    def test_prefetch_waits_for_a_sleeping_disk(self):
+        self.asleep.add("/mnt/disk2")
+        self.q.put("/mnt/user/Next/e1.mkv", "/mnt/disk2", ptc.PRIO_PREFETCH)
+        self.assertIsNone(self.q.get(timeout=0))
+        self.assertEqual(self.q.deferred(), ["/mnt/user/Next/e1.mkv"])
+
+        self.asleep.clear()
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Next/e1.mkv")
+
+    def test_a_playing_file_wakes_its_disk(self):
+        self.asleep.add("/mnt/disk2")
+        self.q.put("/mnt/user/Film/film.mkv", "/mnt/disk2", ptc.PRIO_PLAYING)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Film/film.mkv")
+
+    def test_speculative_work_runs_side_by_side_on_awake_disks(self):
+        configure(COPY_WORKERS="2", COPY_PER_DISK="1")
+        self.q.put("/mnt/user/A/e1.mkv", "/mnt/disk1", ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/B/e1.mkv", "/mnt/disk2", ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/C/e1.mkv", "/mnt/disk3", ptc.PRIO_BATCH)
+        self.asleep.add("/mnt/disk3")
+        self.assertEqual({self.q.get(timeout=0).disk, self.q.get(timeout=0).disk},
+                         {"/mnt/disk1", "/mnt/disk2"})
+        configure(COPY_WORKERS="3", COPY_PER_DISK="1")
+        self.assertIsNone(self.q.get(timeout=0), "disk3 is not woken for it")
+
+    def test_urgent_work_is_not_held_back_by_the_drain(self):
+        self.q.put("/mnt/user/A/e1.mkv", "/mnt/disk1", ptc.PRIO_BATCH)
+        self.q.get(timeout=0)
+        self.q.put("/mnt/user/Film/film.mkv", "/mnt/disk2", ptc.PRIO_PLAYING)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Film/film.mkv")
+
+    def test_spin_state_comes_from_unraid(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            ini = os.path.join(tmp, "disks.ini")
+            Path(ini).write_text('["disk1"]\nname="disk1"\nspundown="0"\n'
+                                 '["disk2"]\nname="disk2"\nspundown="1"\n')
+            with mock.patch.object(ptc, 'EMHTTP_DISKS_INI', ini), \
+                 mock.patch.dict(ptc._standby_state, read=0.0):
+                self.assertFalse(ptc.disk_in_standby("/mnt/disk1"))
+                self.assertTrue(ptc.disk_in_standby("/mnt/disk2"))
+                self.assertFalse(ptc.disk_in_standby("/mnt/disk3"))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+class CopyPriority(unittest.TestCase):
+    """A stream started now must not wait behind a season batch."""
+
+    def setUp(self):
+        configure(COPY_WORKERS="1", COPY_PER_DISK="1")
+        self.q = ptc.CopyQueue()
+
+    def test_the_playing_file_overtakes_a_batch(self):
+        for n in range(5):
+            self.q.put(f"/mnt/user/Show/e{n}.mkv", None, ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/Film.mkv", None, ptc.PRIO_PLAYING)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Film.mkv")
+
+    def test_equal_priority_keeps_arrival_order(self):
+        self.q.put("/mnt/user/a.mkv", None, ptc.PRIO_NEXT)
+        self.q.put("/mnt/user/b.mkv", None, ptc.PRIO_NEXT)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/a.mkv")
+
+    def test_a_queued_file_can_become_more_urgent(self):
+        self.q.put("/mnt/user/Show/e1.mkv", None, ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/Show/e2.mkv", None, ptc.PRIO_BATCH)
+        self.assertTrue(self.q.raise_priority("/mnt/user/Show/e2.mkv", ptc.PRIO_PLAYING))
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/Show/e2.mkv")
+
+    def test_a_file_in_a_running_batch_raises_the_batch(self):
+        configure(COPY_WORKERS="2", COPY_PER_DISK="1")
+        for n in range(5, 10):
+            self.q.put(f"/mnt/user/Show/e{n}.mkv", "/mnt/disk1", ptc.PRIO_BATCH)
+        job = self.q.get(timeout=0)
+        self.assertEqual(len(job.batch), 5)
+        self.assertTrue(self.q.raise_priority("/mnt/user/Show/e8.mkv", ptc.PRIO_PLAYING))
+        self.assertEqual(job.priority, ptc.PRIO_PLAYING)
+        self.q.put("/mnt/user/Other/next.mkv", "/mnt/disk1", ptc.PRIO_NEXT)
+        self.assertFalse(job.preempt.is_set(), "less urgent work does not stop it")
+
+    def test_raising_never_lowers(self):
+        self.q.put("/mnt/user/a.mkv", None, ptc.PRIO_PLAYING)
+        self.q.put("/mnt/user/b.mkv", None, ptc.PRIO_NEXT)
+        self.q.raise_priority("/mnt/user/a.mkv", ptc.PRIO_PREFETCH)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/a.mkv")
+
+    def test_long_waiting_prefetch_eventually_goes_first(self):
+        self.q.put("/mnt/user/old-prefetch.mkv", None, ptc.PRIO_PREFETCH)
+        self.q._items[0].queued_at -= 4 * ptc.COPY_AGING_SECONDS
+        self.q.put("/mnt/user/new-batch.mkv", None, ptc.PRIO_BATCH)
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/old-prefetch.mkv")
+
+    def test_series_handler_ranks_current_then_next_then_rest(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            season = os.path.join(tmp, "Show", "Season 1")
+            os.makedirs(season)
+            for n in range(1, 6):
+                Path(season, f"Show.S01E0{n}.mkv").write_text("x")
+            configure(ARRAY_ROOT=tmp, CACHE_ROOT=os.path.join(tmp, "cache"))
+            queued = {}
+            with mock.patch.object(ptc, 'enqueue_copy',
+                                   side_effect=lambda p, prio=ptc.PRIO_BATCH: queued.__setitem__(
+                                       os.path.basename(p), prio)):
+                ptc.handle_series(os.path.join(season, "Show.S01E02.mkv"))
+            self.assertEqual(queued, {
+                "Show.S01E02.mkv": ptc.PRIO_PLAYING,
+                "Show.S01E03.mkv": ptc.PRIO_NEXT,
+                "Show.S01E04.mkv": ptc.PRIO_BATCH,
+                "Show.S01E05.mkv": ptc.PRIO_BATCH,
+            })
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+
+class CopyPreemption(unittest.TestCase):
+    """A long, unimportant copy gives way to the file somebody just started."""
+
+    def setUp(self):
+        configure(COPY_WORKERS="1", COPY_PER_DISK="1")
+        self.q = ptc.CopyQueue()
+
+    def test_an_urgent_arrival_stops_less_urgent_work(self):
+        self.q.put("/mnt/user/prefetch.mkv", "/mnt/disk1", ptc.PRIO_PREFETCH)
+        running = self.q.get(timeout=0)
+        self.q.put("/mnt/user/playing.mkv", "/mnt/disk2", ptc.PRIO_PLAYING)
+        self.assertTrue(running.preempt.is_set())
+
+        self.q.done(running, requeue=True)
+        self.assertEqual(self.q.suspended(), ["/mnt/user/prefetch.mkv"])
+        self.assertEqual(self.q.get(timeout=0).path, "/mnt/user/playing.mkv")
+
+    def test_equal_urgency_does_not_interrupt(self):
+        self.q.put("/mnt/user/a.mkv", "/mnt/disk1", ptc.PRIO_PLAYING)
+        running = self.q.get(timeout=0)
+        self.q.put("/mnt/user/b.mkv", "/mnt/disk2", ptc.PRIO_PLAYING)
+        self.assertFalse(running.preempt.is_set())
+
+    def test_only_the_copy_on_the_contested_disk_is_stopped(self):
+        configure(COPY_WORKERS="2", COPY_PER_DISK="1")
+        self.q.put("/mnt/user/d1.mkv", "/mnt/disk1", ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/d2.mkv", "/mnt/disk2", ptc.PRIO_PREFETCH)
+        on_disk1 = self.q.get(timeout=0)
+        on_disk2 = self.q.get(timeout=0)
+        self.q.put("/mnt/user/playing.mkv", "/mnt/disk1", ptc.PRIO_PLAYING)
+        self.assertTrue(on_disk1.preempt.is_set())
+        self.assertFalse(on_disk2.preempt.is_set(),
+                         "stopping disk2 would not free the slot the new copy needs")
+
+    def test_a_preempted_rsync_raises_instead_of_retrying(self):
+        job = ptc.CopyJob("/mnt/user/a.mkv", None, ptc.PRIO_BATCH, 1)
+        job.preempt.set()
+        calls = []
+        with mock.patch.object(ptc, '_run_rsync', side_effect=lambda *a: calls.append(a) or (20, "")), \
+             mock.patch.object(ptc.os, 'makedirs'):
+            with self.assertRaises(ptc.TransferPreempted):
+                ptc.rsync_transfer("/mnt/user/a.mkv", "/mnt/cache/a.mkv", False, job=job)
+        self.assertEqual(calls, [], "no point starting rsync for a preempted job")
+
+    def test_a_resumed_copy_appends_to_its_partial_data(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            dst = os.path.join(tmp, "a.mkv")
+            os.makedirs(os.path.join(tmp, ptc.PARTIAL_DIR))
+            Path(ptc._partial_path(dst)).write_text("half")
+            cmds = []
+            with mock.patch.object(ptc, '_run_rsync',
+                                   side_effect=lambda cmd, *a: cmds.append(cmd) or (0, "")):
+                ptc.rsync_transfer("/mnt/user/a.mkv", dst, remove_source=False)
+            self.assertIn("--append", cmds[0])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+
+class CopyBatching(unittest.TestCase):
+    """Files from one folder go over together, but each one is still
+    accounted for on its own."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.array = os.path.join(self.tmp, "array")
+        self.cache = os.path.join(self.tmp, "cache")
+        self.season = os.path.join(self.array, "Show", "Season 1")
+        os.makedirs(self.season)
+        os.makedirs(self.cache)
+        self.names = ["Show.S01E01.mkv", "Show.S01E01.srt", "Show.S01E02.mkv"]
+        for name in self.names:
+            Path(self.season, name).write_bytes(os.urandom(4096))
+        configure(ARRAY_ROOT=self.array, CACHE_ROOT=self.cache, MEDIA_FILETYPES=".mkv .srt",
+                  COPY_WORKERS="1", COPY_PER_DISK="1", ENABLE_IO_GOVERNOR="False")
+        self.q = ptc.CopyQueue()
+        self.tracked = []
+        patches = [
+            mock.patch.object(ptc.TrackedFiles, 'add', side_effect=lambda p, disk=None, size=None: self.tracked.append(p)),
+            mock.patch.object(ptc, 'cache_has_room_for', return_value=True),
+            mock.patch.object(ptc, 'clone_permissions'),
+            mock.patch.dict(ptc.failed_copies, clear=True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def paths(self):
+        return [os.path.join(self.season, n) for n in self.names]
+
+    def test_queued_files_of_one_folder_become_one_job(self):
+        for path in self.paths():
+            self.q.put(path, "/mnt/disk1", ptc.PRIO_BATCH)
+        self.q.put("/mnt/user/Other/film.mkv", "/mnt/disk1", ptc.PRIO_BATCH)
+        self.q.put(os.path.join(self.season, "later.mkv"), "/mnt/disk1", ptc.PRIO_PREFETCH)
+
+        job = self.q.get(timeout=0)
+        self.assertEqual(job.batch, self.paths())
+        self.assertEqual(self.q.qsize(), 2, "other folders and priorities wait their turn")
+
+    def test_a_batch_is_bounded(self):
+        with mock.patch.object(ptc, 'COPY_BATCH_MAX', 2):
+            for path in self.paths():
+                self.q.put(path, None, ptc.PRIO_BATCH)
+            self.assertEqual(len(self.q.get(timeout=0).batch), 2)
+
+    def test_a_file_inside_a_queued_batch_can_become_urgent(self):
+        for path in self.paths():
+            self.q.put(path, None, ptc.PRIO_BATCH)
+        job = self.q.get(timeout=0)
+        job.batch.remove(self.paths()[0])
+        self.q.done(job, requeue=True)
+
+        urgent = self.paths()[2]
+        self.assertTrue(self.q.raise_priority(urgent, ptc.PRIO_PLAYING))
+        first = self.q.get(timeout=0)
+        self.assertEqual(first.batch, [urgent])
+        self.q.done(first)
+        self.assertEqual(self.q.get(timeout=0).batch, [self.paths()[1]])
+
+    def test_native_batch_tracks_every_file(self):
+        ptc.copy_files_to_cache(self.paths())
+        for name in self.names:
+            self.assertEqual(Path(self.cache, "Show", "Season 1", name).read_bytes(),
+                             Path(self.season, name).read_bytes())
+        self.assertEqual(sorted(self.tracked),
+                         sorted(ptc.array_to_cache(p) for p in self.paths()))
+
+    def test_one_failure_does_not_spoil_the_batch(self):
+        real = ptc.native_transfer
+
+        def flaky(src, dst, remove_source=True, job=None):
+            if src.endswith(".srt"):
+                raise OSError(ptc.errno.EIO, "bad sector")
+            return real(src, dst, remove_source, job)
+
+        with mock.patch.object(ptc, 'native_transfer', side_effect=flaky):
+            ptc.copy_files_to_cache(self.paths())
+        srt = ptc.array_to_cache(self.paths()[1])
+        self.assertIn(srt, ptc.failed_copies)
+        self.assertNotIn(srt, self.tracked)
+        self.assertEqual(len(self.tracked), 2)
+
+    def test_rsync_copies_the_folder_in_one_run(self):
+        configure(ARRAY_ROOT=self.array, CACHE_ROOT=self.cache, MEDIA_FILETYPES=".mkv .srt",
+                  COPY_ENGINE="rsync", ENABLE_IO_GOVERNOR="False")
+        runs = []
+
+        def fake_rsync(cmd, timeout, job=None, stdin_text=None):
+            runs.append((cmd, stdin_text))
+            src_dir, dst_dir = cmd[-2], cmd[-1]
+            for name in stdin_text.split():
+                if not name.endswith(".srt"):
+                    shutil.copy(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+            return 23, "rsync: some files could not be transferred"
+
+        with mock.patch.object(ptc, '_run_rsync', side_effect=fake_rsync), \
+             mock.patch.object(ptc.time, 'sleep'):
+            ptc.copy_files_to_cache(self.paths())
+
+        self.assertIn("--files-from=-", runs[0][0])
+        self.assertEqual(runs[0][1].split(), self.names)
+        self.assertEqual([r[1].split() for r in runs[1:]],
+                         [["Show.S01E01.srt"]] * (ptc.RSYNC_RETRIES - 1),
+                         "a retry only asks for what is still missing")
+        self.assertEqual(len(self.tracked), 2)
+        self.assertIn(ptc.array_to_cache(self.paths()[1]), ptc.failed_copies)
+
+    def test_preemption_requeues_only_what_is_left(self):
+        q = ptc.CopyQueue()
+        for path in self.paths():
+            ptc._pending_copies.add(path)
+            q.put(path, None, ptc.PRIO_BATCH)
+        self.addCleanup(ptc._pending_copies.clear)
+        self.addCleanup(ptc._shutting_down.clear)
+        jobs = [q.get(timeout=0)]
+
+        def get(timeout=None):
+            if not jobs:                  # one job, then stop the worker
+                ptc._shutting_down.set()
+                return None
+            return jobs.pop()
+
+        real = ptc.native_transfer
+
+        def preempt_subtitles(src, dst, remove_source=True, job=None):
+            if src.endswith(".srt"):
+                raise ptc.TransferPreempted(src)
+            return real(src, dst, remove_source, job)
+
+        with mock.patch.object(ptc, 'copy_queue', q), \
+             mock.patch.object(q, 'get', side_effect=get), \
+             mock.patch.object(ptc, 'native_transfer', side_effect=preempt_subtitles):
+            ptc.copy_worker()
+
+        self.assertEqual(q.suspended(), self.paths()[1:])
+        self.assertEqual(ptc._pending_copies, set(self.paths()[1:]))
+        self.assertEqual(self.tracked, [ptc.array_to_cache(self.paths()[0])])
+        self.assertEqual(ptc.space_ledger.outstanding(), 0, "reservations released")
+
+
+class NativeTransfer(unittest.TestCase):
+    """The in-process engine keeps rsync's guarantees."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "array", "film.mkv")
+        self.dst = os.path.join(self.tmp, "cache", "Media", "film.mkv")
+        os.makedirs(os.path.dirname(self.src))
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+        Path(self.src).write_bytes(self.data)
+        os.chmod(self.src, 0o640)
+        os.utime(self.src, (1_600_000_000, 1_600_000_000))
+        self._chunk = ptc.COPY_CHUNK
+        ptc.COPY_CHUNK = 1024 * 1024
+        configure(ENABLE_IO_GOVERNOR="False")
+
+    def tearDown(self):
+        ptc.COPY_CHUNK = self._chunk
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_copy_keeps_content_and_metadata(self):
+        ptc.native_transfer(self.src, self.dst, remove_source=False)
+        self.assertEqual(Path(self.dst).read_bytes(), self.data)
+        st = os.stat(self.dst)
+        self.assertEqual(int(st.st_mtime), 1_600_000_000)
+        self.assertEqual(st.st_mode & 0o777, 0o640)
+        self.assertTrue(os.path.exists(self.src))
+        self.assertFalse(os.path.exists(os.path.dirname(ptc._partial_path(self.dst))),
+                         "the partial dir is cleaned up")
+
+    def test_move_removes_the_source(self):
+        ptc.native_transfer(self.src, self.dst, remove_source=True)
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual(Path(self.dst).read_bytes(), self.data)
+
+    def test_a_resume_does_not_read_what_is_already_there(self):
+        half = len(self.data) // 2
+        os.makedirs(os.path.dirname(ptc._partial_path(self.dst)))
+        Path(ptc._partial_path(self.dst)).write_bytes(self.data[:half])
+        offsets = []
+        real = ptc._copy_chunk
+
+        def spy(fd_in, fd_out, offset, count, method):
+            offsets.append(offset)
+            return real(fd_in, fd_out, offset, count, method)
+
+        with mock.patch.object(ptc, '_copy_chunk', side_effect=spy):
+            ptc.native_transfer(self.src, self.dst, remove_source=False)
+        self.assertEqual(offsets[0], half)
+        self.assertEqual(Path(self.dst).read_bytes(), self.data)
+
+    def test_falls_back_when_copy_file_range_is_refused(self):
+        def refuse(*_a, **_k):
+            raise OSError(ptc.errno.EXDEV, "cross-device")
+
+        with mock.patch.object(ptc.os, 'copy_file_range', side_effect=refuse, create=True), \
+             mock.patch.object(ptc.os, 'sendfile', side_effect=refuse):
+            ptc.native_transfer(self.src, self.dst, remove_source=False)
+        self.assertEqual(Path(self.dst).read_bytes(), self.data)
+
+    def test_preemption_keeps_the_partial_data(self):
+        job = ptc.CopyJob(self.src, None, ptc.PRIO_PREFETCH, 1)
+        real = ptc._copy_chunk
+
+        def stop_after_first(fd_in, fd_out, offset, count, method):
+            n = real(fd_in, fd_out, offset, count, method)
+            job.preempt.set()
+            return n
+
+        with mock.patch.object(ptc, '_copy_chunk', side_effect=stop_after_first):
+            with self.assertRaises(ptc.TransferPreempted):
+                ptc.native_transfer(self.src, self.dst, remove_source=False, job=job)
+        self.assertFalse(os.path.exists(self.dst), "nothing under the final name yet")
+        self.assertEqual(os.path.getsize(ptc._partial_path(self.dst)), ptc.COPY_CHUNK)
+        self.assertEqual(job.done, ptc.COPY_CHUNK)
+
+    def test_retries_after_a_transient_error(self):
+        real = ptc._copy_chunk
+        calls = []
+
+        def flaky(*a):
+            calls.append(1)
+            if len(calls) == 2:
+                raise OSError(ptc.errno.EIO, "disk hiccup")
+            return real(*a)
+
+        with mock.patch.object(ptc, '_copy_chunk', side_effect=flaky), \
+             mock.patch.object(ptc.time, 'sleep'):
+            ptc.native_transfer(self.src, self.dst, remove_source=False)
+        self.assertEqual(Path(self.dst).read_bytes(), self.data)
+
+    def test_every_attempt_gets_the_whole_timeout(self):
+        clock = [1000.0]
+        deadlines = []
+
+        def slow_then_fine(src, partial, job, deadline, pacer=None):
+            deadlines.append(deadline - clock[0])
+            if len(deadlines) == 1:
+                clock[0] += 500
+                raise OSError(ptc.errno.EIO, "disk hiccup")
+            Path(partial).parent.mkdir(parents=True, exist_ok=True)
+            Path(partial).write_bytes(self.data)
+
+        with mock.patch.object(ptc, '_native_copy', side_effect=slow_then_fine), \
+             mock.patch.object(ptc.time, 'time', side_effect=lambda: clock[0]), \
+             mock.patch.object(ptc.time, 'sleep'), \
+             mock.patch.object(ptc, 'log'):
+            ptc.native_transfer(self.src, self.dst, remove_source=False)
+        self.assertEqual(deadlines[0], deadlines[1], "the retry starts its own clock")
+
+    def test_rsync_stays_selectable(self):
+        configure(COPY_ENGINE="rsync")
+        with mock.patch.object(ptc, 'rsync_transfer') as rsync, \
+             mock.patch.object(ptc, 'native_transfer') as native:
+            ptc.transfer_file(self.src, self.dst, remove_source=False)
+        rsync.assert_called_once()
+        native.assert_not_called()
+
+
+
+class PageCacheWarming(unittest.TestCase):
+    """Read-ahead covers the region just past the playback position, and no
+    more than the configured amount."""
+
+    def setUp(self):
+        configure(WARM_AHEAD_MB="4", WARM_BUDGET_MB="6")
+        self.tmp = tempfile.mkdtemp()
+        self.film = os.path.join(self.tmp, "film.mkv")
+        with open(self.film, "wb") as fh:
+            fh.truncate(100 * 1048576)
+        self.warmer = ptc.PageCacheWarmer()
+        self.calls = []
+        self._patch = mock.patch.object(
+            ptc.os, 'posix_fadvise', create=True,
+            side_effect=lambda fd, off, length, advice: self.calls.append((off, length)))
+        self._patch.start()
+
+    def tearDown(self):
+        self._patch.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_the_region_after_the_position_is_advised(self):
+        self.warmer.update({self.film: 0.5})
+        self.warmer.warm_once()
+        self.assertEqual(self.calls, [(50 * 1048576, 4 * 1048576)])
+
+    def test_an_advised_region_is_not_advised_again(self):
+        self.warmer.update({self.film: 0.5})
+        self.warmer.warm_once()
+        self.warmer.warm_once()
+        self.assertEqual(len(self.calls), 1)
+
+        self.warmer.update({self.film: 0.51})
+        self.warmer.warm_once()
+        start, length = self.calls[-1]
+        self.assertEqual(start, 54 * 1048576, "continues where the last advice ended")
+
+    def test_the_budget_is_shared_between_streams(self):
+        other = os.path.join(self.tmp, "other.mkv")
+        shutil.copy(self.film, other)
+        self.warmer.update({self.film: 0.0, other: 0.0})
+        self.warmer.warm_once()
+        self.assertEqual([length for _, length in self.calls], [3 * 1048576] * 2)
+
+    def test_many_streams_get_none(self):
+        self.assertEqual(ptc.PageCacheWarmer.window(ptc.WARM_MAX_STREAMS + 1), 0)
+        self.assertEqual(ptc.PageCacheWarmer.window(0), 0)
+
+
+
+class TransferQoS(unittest.TestCase):
+
+    def setUp(self):
+        configure(COPY_RATE_LIMIT_MB="50", MOVE_RATE_LIMIT_MB="20",
+                  STREAM_RATE_LIMIT_MB="10", FULL_SPEED_WINDOW="02:00-07:00",
+                  ENABLE_IO_GOVERNOR="False")
+        ptc.stream_timers.clear()
+
+    def tearDown(self):
+        ptc.stream_timers.clear()
+
+    @staticmethod
+    def _at(hour):
+        return time.mktime((2026, 1, 5, hour, 30, 0, 0, 0, -1))
+
+    def test_each_direction_has_its_own_cap(self):
+        noon = self._at(12)
+        self.assertEqual(ptc.transfer_cap("copy", urgent=True, now=noon), 50 * 1048576)
+        self.assertEqual(ptc.transfer_cap("move", urgent=False, now=noon), 20 * 1048576)
+
+    def test_background_work_runs_free_inside_the_window(self):
+        night = self._at(3)
+        self.assertIsNone(ptc.transfer_cap("move", urgent=False, now=night))
+        self.assertEqual(ptc.transfer_cap("copy", urgent=True, now=night), 50 * 1048576,
+                         "the window is for background work only")
+
+    def test_an_active_stream_tightens_every_cap(self):
+        ptc.stream_timers["/mnt/user/Media/film.mkv"] = time.time()
+        self.assertEqual(ptc.transfer_cap("copy", urgent=True, now=self._at(12)), 10 * 1048576)
+        self.assertEqual(ptc.transfer_cap("move", urgent=False, now=self._at(3)), 10 * 1048576)
+
+    def test_windows_may_cross_midnight(self):
+        self.assertTrue(ptc.in_time_window("22:00-06:00", self._at(23)))
+        self.assertTrue(ptc.in_time_window("22:00-06:00", self._at(1)))
+        self.assertFalse(ptc.in_time_window("22:00-06:00", self._at(12)))
+        self.assertFalse(ptc.in_time_window("garbage", self._at(12)))
+
+    def test_the_pacer_holds_a_transfer_to_its_cap(self):
+        configure(COPY_RATE_LIMIT_MB="4", ENABLE_IO_GOVERNOR="False")
+        clock = [1000.0]
+        slept = []
+
+        def sleep(sec):
+            slept.append(sec)
+            clock[0] += sec
+
+        with mock.patch.object(ptc.time, 'time', side_effect=lambda: clock[0]), \
+             mock.patch.object(ptc.time, 'sleep', side_effect=sleep):
+            pacer = ptc.TransferPacer("copy", urgent=True)
+            for _ in range(4):
+                pacer.after(2 * 1048576)
+        self.assertAlmostEqual(sum(slept), 2.0, places=3)
+
+    def test_rsync_gets_the_cap_as_bwlimit(self):
+        configure(COPY_RATE_LIMIT_MB="8")
+        cmds = []
+        with mock.patch.object(ptc, '_run_rsync', side_effect=lambda cmd, *a: cmds.append(cmd) or (0, "")), \
+             mock.patch.object(ptc.os, 'makedirs'):
+            ptc.rsync_transfer("/mnt/user/a.mkv", "/mnt/cache/a.mkv", remove_source=False)
+        self.assertIn("--bwlimit=8192", cmds[0])
+
+
+
+class IOPressureGovernor(unittest.TestCase):
+    """Driven by fake /proc files: back off when the disks are busy with
+    something else, speed up again when they are not."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._real = (ptc.PROC_PRESSURE_IO, ptc.PROC_DISKSTATS, ptc.PROC_MOUNTS)
+        ptc.PROC_PRESSURE_IO = os.path.join(self.tmp, "pressure")
+        ptc.PROC_DISKSTATS = os.path.join(self.tmp, "diskstats")
+        ptc.PROC_MOUNTS = os.path.join(self.tmp, "mounts")
+        Path(ptc.PROC_MOUNTS).write_text("/dev/nvme0n1p1 /mnt/cache btrfs rw 0 0\n")
+        configure(CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="True")
+        self.gov = ptc.IOGovernor()
+        self.now = 1000.0
+        self.stall_us = 0
+        self.ticks = 0
+        self.sectors = 0
+
+    def tearDown(self):
+        ptc.PROC_PRESSURE_IO, ptc.PROC_DISKSTATS, ptc.PROC_MOUNTS = self._real
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _advance(self, stall_pct=0, busy_pct=0, mb=0, own_mb=0):
+        """Let GOVERNOR_SAMPLE seconds pass with the given load, then sample."""
+        span = ptc.GOVERNOR_SAMPLE
+        self.now += span
+        self.stall_us += int(span * 1e6 * stall_pct / 100)
+        self.ticks += int(span * 1000 * busy_pct / 100)
+        self.sectors += mb * 1048576 // 512
+        Path(ptc.PROC_PRESSURE_IO).write_text(
+            f"some avg10=0.00 avg60=0.00 avg300=0.00 total={self.stall_us}\n"
+            f"full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+        Path(ptc.PROC_DISKSTATS).write_text(
+            f" 259 1 nvme0n1p1 0 0 {self.sectors} 0 0 0 0 0 0 {self.ticks} 0\n")
+        if own_mb:
+            self.gov.account(["/mnt/cache/Media/x.mkv"], own_mb * 1048576)
+        self.gov.sample(self.now)
+
+    def test_quiet_disks_leave_full_speed(self):
+        self._advance()
+        self._advance()
+        self.assertEqual(self.gov.factor_, 1.0)
+        self.assertEqual(self.gov.state, "full")
+
+    def test_high_pressure_pauses_and_recovery_ramps_up(self):
+        self._advance()
+        with mock.patch.object(ptc, 'log') as logged:
+            self._advance(stall_pct=80)
+            self.assertEqual(self.gov.state, "paused")
+            self.assertIn("[Governor] paused", logged.call_args[0][0])
+        with mock.patch.object(self.gov, 'sample'):
+            self.assertEqual(self.gov.factor(urgent=False), 0.0)
+            self.assertEqual(self.gov.factor(urgent=True), ptc.GOVERNOR_URGENT_MIN,
+                             "the playing file keeps moving")
+        self._advance()
+        self.assertEqual(self.gov.factor_, 0.25)
+        for _ in range(3):
+            self._advance()
+        self.assertEqual(self.gov.state, "full")
+
+    def test_moderate_pressure_halves_the_speed(self):
+        self._advance()
+        self._advance(stall_pct=30)
+        self.assertEqual(self.gov.state, "throttled")
+        self.assertEqual(self.gov.factor_, 0.5)
+
+    def test_a_disk_busy_with_our_own_copy_is_not_contention(self):
+        self._advance()
+        self._advance(busy_pct=100, mb=200, own_mb=200)
+        self.assertEqual(self.gov.state, "full")
+        self.assertEqual(self.gov.snapshot()["devices"]["nvme0n1p1"]["util"], 100.0)
+
+    def test_pressure_from_our_own_copy_is_not_contention(self):
+        self._advance()
+        for _ in range(3):
+            self._advance(stall_pct=80, busy_pct=100, mb=200, own_mb=200)
+            self.assertEqual(self.gov.state, "full")
+        self.assertIn("own copies", self.gov.reason)
+
+    def test_pressure_counts_once_someone_else_shares_the_disk(self):
+        self._advance()
+        self._advance(stall_pct=30, busy_pct=50, mb=200, own_mb=100)
+        self.assertEqual(self.gov.state, "throttled")
+
+    def test_a_disk_busy_with_someone_else_is(self):
+        self._advance()
+        self._advance(busy_pct=100, mb=200, own_mb=50)
+        self.assertEqual(self.gov.state, "paused")
+
+    def test_disabled_means_full_speed(self):
+        configure(CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="False")
+        self.gov.factor_ = 0.0
+        self.assertEqual(self.gov.factor(), 1.0)
+
+
+class ThroughputLearning(unittest.TestCase):
+    """Timeouts and ETAs follow the speed transfers actually reach."""
+
+    MB = 1024 * 1024
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        configure(CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="False")
+        self.model = ptc.ThroughputModel()
+        devices = {"/mnt/disk1": "md1p1", "/mnt/disk2": "md2p1", "/mnt/cache": "nvme0n1p1"}
+
+        def device_for(path):
+            return next((d for m, d in devices.items() if ptc._under(path, m)), None)
+
+        patches = [
+            mock.patch.object(ptc.io_governor, 'device_for', side_effect=device_for),
+            mock.patch.object(ptc, 'THROUGHPUT_FILE', os.path.join(self.tmp, "throughput.json")),
+            mock.patch.object(ptc, 'throughput', self.model),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_the_estimate_decays_towards_recent_transfers(self):
+        self.model.record("/mnt/disk1/a.mkv", "/mnt/cache/a.mkv", 1000 * self.MB, 10)
+        self.assertEqual(self.model.estimate("/mnt/disk1/x", "/mnt/cache/y"), 100 * self.MB)
+        self.model.record("/mnt/disk1/b.mkv", "/mnt/cache/b.mkv", 1000 * self.MB, 20)
+        self.assertAlmostEqual(self.model.estimate("/mnt/disk1/x", "/mnt/cache/y"),
+                               (100 - ptc.THROUGHPUT_ALPHA * 50) * self.MB)
+        self.assertIsNone(self.model.estimate("/mnt/disk2/x", "/mnt/cache/y"),
+                          "every device pair is learned separately")
+
+    def test_small_transfers_are_not_learned_from(self):
+        self.model.record("/mnt/disk1/a.srt", "/mnt/cache/a.srt", 40000, 0.01)
+        self.assertIsNone(self.model.estimate("/mnt/disk1/a", "/mnt/cache/a"))
+
+    def test_the_timeout_follows_the_learned_speed(self):
+        src = os.path.join(self.tmp, "film.mkv")
+        with open(src, "wb") as f:
+            f.truncate(10000 * self.MB)
+        fallback = ptc._rsync_timeout_for(src, dst="/mnt/cache/film.mkv")
+        self.assertEqual(fallback, 600 + 1000)
+
+        with mock.patch.object(self.model, 'estimate', return_value=500 * self.MB):
+            fast = ptc._rsync_timeout_for(src, dst="/mnt/cache/film.mkv")
+        self.assertEqual(fast, ptc.TIMEOUT_BASE + 20 * ptc.TIMEOUT_FACTOR)
+        with mock.patch.object(self.model, 'estimate', return_value=5 * self.MB):
+            slow = ptc._rsync_timeout_for(src, dst="/mnt/cache/film.mkv")
+        self.assertGreater(slow, fallback, "a slow disk gets more time than the fixed floor")
+
+    def test_estimates_survive_a_restart_but_are_not_written_every_time(self):
+        self.model.record("/mnt/disk1/a.mkv", "/mnt/cache/a.mkv", 1000 * self.MB, 10)
+        self.assertTrue(os.path.exists(ptc.THROUGHPUT_FILE))
+        self.model.record("/mnt/disk2/a.mkv", "/mnt/cache/a.mkv", 1000 * self.MB, 5)
+        restarted = ptc.ThroughputModel()
+        restarted.load()
+        self.assertIsNone(restarted.estimate("/mnt/disk2/a", "/mnt/cache/a"),
+                          "the second write waits for THROUGHPUT_SAVE_EVERY")
+
+        self.model.save(force=True)
+        restarted = ptc.ThroughputModel()
+        restarted.load()
+        self.assertEqual(restarted.estimate("/mnt/disk2/a", "/mnt/cache/a"), 200 * self.MB)
+
+    def test_a_capped_transfer_is_not_learned_from(self):
+        configure(CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="False", COPY_RATE_LIMIT_MB="10")
+        with mock.patch.object(ptc, 'native_transfer'), \
+             mock.patch.object(ptc.os.path, 'getsize', return_value=1000 * self.MB):
+            ptc.transfer_file("/mnt/disk1/a.mkv", "/mnt/cache/a.mkv", remove_source=False)
+        self.assertIsNone(self.model.estimate("/mnt/disk1/a", "/mnt/cache/a"))
+
+    def test_a_transfer_the_governor_held_back_is_not_learned_from(self):
+        configure(CACHE_ROOT="/mnt/cache", ENABLE_IO_GOVERNOR="False")
+
+        def held_back(*a, **kw):
+            ptc.io_governor.count_wait(30)
+
+        with mock.patch.object(ptc, 'native_transfer', side_effect=held_back), \
+             mock.patch.object(ptc.os.path, 'getsize', return_value=1000 * self.MB), \
+             mock.patch.object(ptc, 'log') as log:
+            ptc.transfer_file("/mnt/disk1/a.mkv", "/mnt/cache/a.mkv", remove_source=False)
+        self.assertIsNone(self.model.estimate("/mnt/disk1/a", "/mnt/cache/a"))
+        self.assertIn("in 0.0s", log.call_args[0][0], "the wait is not part of the timing")
+
+    def test_the_queue_forecast_goes_by_disk(self):
+        configure(CACHE_ROOT="/mnt/cache", COPY_WORKERS="2", COPY_PER_DISK="1")
+        self.model.record("/mnt/disk1/a.mkv", "/mnt/cache/a.mkv", 1000 * self.MB, 10)
+        self.model.record("/mnt/disk2/a.mkv", "/mnt/cache/a.mkv", 1000 * self.MB, 20)
+        pending = {"/mnt/user/A/1.mkv": ("/mnt/disk1", 1000 * self.MB),
+                   "/mnt/user/A/2.mkv": ("/mnt/disk1", 1000 * self.MB),
+                   "/mnt/user/B/1.mkv": ("/mnt/disk2", 1000 * self.MB)}
+        with mock.patch.dict(ptc._pending_sizes, pending, clear=True):
+            self.assertEqual(ptc.queue_forecast(), 20, "two files on disk1 one after the other, "
+                                                       "disk2 side by side")
+        with mock.patch.dict(ptc._pending_sizes, clear=True):
+            self.assertEqual(ptc.queue_forecast(), 0)
+
+
+class _StandIn(http.server.BaseHTTPRequestHandler):
+    """A media server that keeps connections alive unless told otherwise."""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    hang_up = False         # drop the connection after answering, without saying so
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/moved"):
+            self.send_response(301)
+            self.send_header("Location", "/elsewhere" + self.path[len("/moved"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/corrupt"):
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", "9")
+            self.end_headers()
+            self.wfile.write(b"not gzip!")
+            return
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if type(self).hang_up:
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveClient(unittest.TestCase):
+    """The API client reuses one connection per server and survives the
+    server dropping it."""
+
+    def setUp(self):
+        _StandIn.connections = 0
+        _StandIn.hang_up = False
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.pool = ptc.HTTPPool()
+        patcher = mock.patch.object(ptc, 'http_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_share_one_connection(self):
+        for i in range(5):
+            self.assertEqual(ptc.api_get(f"{self.base}/status/sessions?i={i}", {}),
+                             {"path": f"/status/sessions?i={i}"})
+        self.assertEqual(_StandIn.connections, 1)
+        stats = self.pool.snapshot()[f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual((stats["requests"], stats["errors"], stats["reconnects"]), (5, 0, 0))
+        self.assertIsNotNone(stats["avg_ms"])
+
+    def test_gzip_responses_are_decoded(self):
+        status, body = self.pool.request(f"{self.base}/Sessions", {})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {"path": "/Sessions"})
+
+    def test_a_dropped_connection_is_reopened_once(self):
+        _StandIn.hang_up = True
+        self.assertIsNotNone(ptc.api_get(f"{self.base}/a", {}))
+        time.sleep(0.05)
+        self.assertEqual(ptc.api_get(f"{self.base}/b", {}), {"path": "/b"})
+        self.assertEqual(_StandIn.connections, 2)
+        stats = self.pool.snapshot()[f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual((stats["reconnects"], stats["errors"]), (1, 0))
+
+    def test_redirects_are_followed_and_logged_once(self):
+        with mock.patch.object(ptc, 'log') as logged:
+            for _ in range(2):
+                self.assertEqual(ptc.api_get(f"{self.base}/moved/Sessions", {}),
+                                 {"path": "/elsewhere/Sessions"})
+        self.assertEqual(logged.call_count, 1)
+        self.assertIn("redirects to", logged.call_args[0][0])
+
+    def test_a_corrupt_compressed_body_returns_none(self):
+        self.assertIsNone(ptc.api_get(f"{self.base}/corrupt", {}))
+
+    def test_failures_return_none(self):
+        self.assertIsNone(ptc.api_get(f"{self.base}/missing", {}))
+        self.assertIsNotNone(ptc.api_get(f"{self.base}/after", {}),
+                             "a 404 leaves the connection usable")
+        self.assertEqual(_StandIn.connections, 1)
+        with socket.socket() as s:          # a port nothing listens on
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.assertIsNone(ptc.api_get(f"http://127.0.0.1:{port}/gone", {}, timeout=1))
+        self.assertEqual(self.pool.snapshot()[f"127.0.0.1:{port}"]["errors"], 1)
+
+
+class ConcurrentPolling(unittest.TestCase):
+    """A hung media server must not hold up the others, nor end its own
+    streams."""
+
+    def setUp(self):
+        configure(ENABLE_PLEX="True", ENABLE_EMBY="True", ENABLE_JELLYFIN="False")
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        ptc._polls_late.clear()
+        ptc._last_polled.clear()
+        self.addCleanup(ptc._polls_late.clear)
+        self.addCleanup(ptc._last_polled.clear)
+        for name, value in (("POLL_DEADLINE", 0.3), ("POLL_SLOW", 10)):
+            patcher = mock.patch.object(ptc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ptc, 'log')
+        self.log = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_a_hung_server_is_left_behind(self):
+        plex = {"/media/movie.mkv": {"service": "plex", "id": "1", "progress": 0.5}}
+        emby = {"/media/show.mkv": {"service": "emby", "id": "2", "progress": 0.1}}
+        plex_calls = []
+
+        def slow_plex():
+            plex_calls.append(1)
+            if len(plex_calls) > 1:
+                self.release.wait(5)
+            return plex
+
+        with mock.patch.object(ptc, '_poll_plex', side_effect=slow_plex), \
+             mock.patch.object(ptc, '_poll_emby', return_value=emby):
+            self.assertEqual(ptc.get_active_streams(), {**plex, **emby})
+
+            started = time.monotonic()
+            self.assertEqual(ptc.get_active_streams(), {**plex, **emby},
+                             "plex keeps its sessions while it is late")
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertIn("plex", ptc._polls_late)
+
+            self.assertEqual(ptc.get_active_streams(), {**plex, **emby})
+            self.assertEqual(len(plex_calls), 2, "a late poll is not sent again")
+
+            self.release.set()
+            time.sleep(0.1)
+            self.assertEqual(ptc.get_active_streams(), {**plex, **emby})
+            self.assertNotIn("plex", ptc._polls_late)
+        logged = " ".join(str(c.args[0]) for c in self.log.call_args_list)
+        self.assertIn("plex has not answered", logged)
+        self.assertIn("plex answered after", logged)
+
+    def test_a_disabled_service_drops_its_sessions(self):
+        plex = {"/media/movie.mkv": {"service": "plex", "id": "1", "progress": 0.5}}
+        with mock.patch.object(ptc, '_poll_plex', return_value=plex), \
+             mock.patch.object(ptc, '_poll_emby', return_value={}):
+            self.assertEqual(ptc.get_active_streams(), plex)
+            configure(ENABLE_PLEX="False", ENABLE_EMBY="True")
+            self.assertEqual(ptc.get_active_streams(), {})
+
+
+class _FakeWebSocketPeer:
+    """The server end of one WebSocket connection, for the tests to drive."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buf = b""
+
+    def _read(self, n):
+        while len(self.buf) < n:
+            chunk = self.conn.recv(65536)
+            if not chunk:
+                raise ConnectionError("client went away")
+            self.buf += chunk
+        data, self.buf = self.buf[:n], self.buf[n:]
+        return data
+
+    def handshake(self, accept=True):
+        while b"\r\n\r\n" not in self.buf:
+            self.buf += self.conn.recv(4096)
+        head, self.buf = self.buf.split(b"\r\n\r\n", 1)
+        lines = head.decode().split("\r\n")
+        self.path = lines[0].split(" ")[1]
+        key = [l.split(":", 1)[1].strip() for l in lines if l.lower().startswith("sec-websocket-key")][0]
+        digest = hashlib.sha1((key + ptc.WebSocket.GUID).encode()).digest()
+        self.conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                           "Connection: Upgrade\r\nSec-WebSocket-Accept: "
+                           + (base64.b64encode(digest).decode() if accept else "bogus")
+                           + "\r\n\r\n").encode())
+
+    def send(self, opcode, payload, fin=True):
+        n = len(payload)
+        head = bytes([(0x80 if fin else 0) | opcode])
+        if n < 126:
+            head += bytes([n])
+        elif n < 65536:
+            head += bytes([126]) + struct.pack("!H", n)
+        else:
+            head += bytes([127]) + struct.pack("!Q", n)
+        self.conn.sendall(head + payload)
+
+    def frame(self):
+        """(opcode, payload) of the next frame from the client, unmasked."""
+        b1, b2 = self._read(2)
+        n = b2 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", self._read(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", self._read(8))[0]
+        assert b2 & 0x80, "client frames must be masked"
+        key = self._read(4)
+        return b1 & 0x0F, bytes(b ^ key[i % 4] for i, b in enumerate(self._read(n)))
+
+
+class _FakeWebSocketServer:
+    """Hands every connection to script(peer, index) on its own thread."""
+
+    def __init__(self, script):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.script = script
+        self.accepted = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _addr = self.sock.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            threading.Thread(target=self._run, args=(conn, self.accepted - 1), daemon=True).start()
+
+    def _run(self, conn, index):
+        with conn:
+            try:
+                self.script(_FakeWebSocketPeer(conn), index)
+            except (OSError, ConnectionError):
+                pass
+
+    def close(self):
+        self.sock.close()
+
+
+class WebSocketClient(unittest.TestCase):
+    """The stdlib WebSocket client speaks enough RFC 6455 for the feeds."""
+
+    def serve(self, script):
+        server = _FakeWebSocketServer(script)
+        self.addCleanup(server.close)
+        return server
+
+    def test_messages_pings_and_close(self):
+        seen = {}
+        done = threading.Event()
+        big = "x" * 70000
+
+        def script(peer, index):
+            peer.handshake()
+            peer.send(0x9, b"are you there")
+            seen["pong"] = peer.frame()
+            peer.send(0x1, b'{"Messa', fin=False)
+            peer.send(0x0, b'geType": "Sessions"}')
+            peer.send(0x1, big.encode())
+            peer.send(0x1, b"a" * 300)
+            seen["text"] = peer.frame()
+            peer.send(0x8, struct.pack("!H", 1000))
+            seen["close"] = peer.frame()
+            done.set()
+
+        server = self.serve(script)
+        ws = ptc.WebSocket(f"http://127.0.0.1:{server.port}/socket?api_key=k")
+        ws.settimeout(5)
+        self.assertEqual(ws.recv(), '{"MessageType": "Sessions"}', "fragments are joined")
+        self.assertEqual(ws.recv(), big)
+        self.assertEqual(ws.recv(), "a" * 300)
+        ws.send("hello")
+        self.assertIsNone(ws.recv(), "the server closed")
+        ws.sock.close()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(seen["pong"], (0xA, b"are you there"))
+        self.assertEqual(seen["text"], (0x1, b"hello"))
+        self.assertEqual(seen["close"][0], 0x8)
+
+    def test_a_bad_handshake_is_refused(self):
+        server = self.serve(lambda peer, index: peer.handshake(accept=False))
+        with self.assertRaises(ConnectionError):
+            ptc.WebSocket(f"ws://127.0.0.1:{server.port}/")
+
+    def test_an_ipv6_host_keeps_its_brackets(self):
+        sock = mock.Mock()
+        sock.recv.return_value = b""
+        with mock.patch.object(ptc.socket, 'create_connection', return_value=sock) as connect:
+            with self.assertRaises(ConnectionError):
+                ptc.WebSocket("ws://[::1]:8096/socket")
+        self.assertEqual(connect.call_args[0][0], ("::1", 8096))
+        self.assertIn(b"\r\nHost: [::1]:8096\r\n", sock.sendall.call_args[0][0])
+
+    def test_a_listener_must_say_where_and_what(self):
+        class Partial(ptc.NotificationListener):
+            def target(self):
+                return None
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class StreamNotifications(unittest.TestCase):
+    """Notifications wake the main loop for a play or stop, and only update
+    progress otherwise."""
+
+    def setUp(self):
+        ptc._stream_wake.clear()
+        self.addCleanup(ptc._stream_wake.clear)
+        patcher = mock.patch.dict(ptc._last_polled, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ptc, 'log')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def plex_note(rk, state, offset):
+        return {"NotificationContainer": {"type": "playing", "PlaySessionStateNotification": [
+            {"sessionKey": "1", "ratingKey": rk, "state": state, "viewOffset": offset}]}}
+
+    def test_plex_progress_updates_the_known_session(self):
+        session = {"service": "plex", "id": "7", "duration": 1000, "progress": 0.5}
+        ptc._last_polled["plex"] = {"/media/movie.mkv": session}
+        listener = ptc.PlexNotifications()
+
+        listener.handle(self.plex_note("7", "playing", 950))
+        self.assertEqual(session["progress"], 0.95)
+        self.assertFalse(ptc._stream_wake.is_set())
+
+        listener.handle(self.plex_note("8", "playing", 10))
+        self.assertTrue(ptc._stream_wake.is_set(), "an unknown item is a new stream")
+        ptc._stream_wake.clear()
+        listener.handle(self.plex_note("7", "stopped", 990))
+        self.assertTrue(ptc._stream_wake.is_set())
+        self.assertEqual(session["progress"], 0.99, "the stop carries the final position")
+
+    def test_emby_sessions_wake_only_on_a_change(self):
+        session = {"service": "emby", "id": "2", "user": "u", "progress": 0.1}
+        ptc._last_polled["emby"] = {"/media/show.mkv": session}
+        listener = ptc.EmbyNotifications("emby", "ENABLE_EMBY", "EMBY_API_KEY", "EMBY_URL",
+                                         "/embywebsocket")
+        playing = {"NowPlayingItem": {"Path": "/media/show.mkv", "Id": "2", "RunTimeTicks": 100},
+                   "PlayState": {"PositionTicks": 40}, "UserId": "u"}
+        listener.handle({"MessageType": "Sessions", "Data": [playing]})
+        self.assertEqual(session["progress"], 0.4)
+        self.assertFalse(ptc._stream_wake.is_set())
+        listener.handle({"MessageType": "Sessions", "Data": []})
+        self.assertTrue(ptc._stream_wake.is_set())
+
+    def test_a_dropped_socket_is_reconnected(self):
+        sent = []
+
+        def script(peer, index):
+            peer.handshake()
+            sent.append((peer.path, peer.frame()))
+            if index == 0:
+                return          # hang up
+            peer.send(0x1, b'{"MessageType": "PlaybackStart"}')
+            time.sleep(1)
+
+        server = _FakeWebSocketServer(script)
+        self.addCleanup(server.close)
+        configure(ENABLE_NOTIFICATIONS="True", ENABLE_EMBY="True", EMBY_API_KEY="k",
+                  EMBY_URL=f"http://127.0.0.1:{server.port}")
+        listener = ptc.EmbyNotifications("emby", "ENABLE_EMBY", "EMBY_API_KEY", "EMBY_URL",
+                                         "/embywebsocket")
+        stop = threading.Event()
+        with mock.patch.object(ptc, 'NOTIFY_BACKOFF_MIN', 0.05):
+            thread = threading.Thread(target=listener.run, args=(stop,), daemon=True)
+            thread.start()
+            deadline = time.monotonic() + 5
+            while listener.events < 1 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            stop.set()
+            thread.join(5)
+        self.assertEqual(listener.connects, 2)
+        self.assertEqual(listener.events, 1)
+        self.assertTrue(ptc._stream_wake.is_set())
+        self.assertEqual(len(sent), 2)
+        path, (opcode, payload) = sent[0]
+        self.assertTrue(path.startswith("/embywebsocket?api_key=k"))
+        self.assertEqual(json.loads(payload)["MessageType"], "SessionsStart")
+
+    def test_polling_slows_only_when_every_server_listens(self):
+        configure(ENABLE_NOTIFICATIONS="True", ENABLE_PLEX="True", ENABLE_EMBY="True")
+        plex, emby, jellyfin = ptc.notification_listeners
+        with mock.patch.object(plex, 'connected', True), \
+             mock.patch.object(emby, 'connected', False):
+            self.assertFalse(ptc.notifications_cover_all())
+            emby.connected = True
+            self.assertTrue(ptc.notifications_cover_all())
+            configure(ENABLE_NOTIFICATIONS="False", ENABLE_PLEX="True", ENABLE_EMBY="True")
+            self.assertFalse(ptc.notifications_cover_all())
+
+
+class Webhooks(unittest.TestCase):
+    """Playback webhooks start a stream at once, without letting a flood of
+    them reach the main loop."""
+
+    def setUp(self):
+        ptc._stream_wake.clear()
+        self.addCleanup(ptc._stream_wake.clear)
+        for target in (ptc._last_polled, ptc._webhook_sessions):
+            patcher = mock.patch.dict(target, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ptc, 'metadata_cache', ptc.MetadataCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ptc, 'log')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def plex_body(event, rk):
+        payload = json.dumps({"event": event, "Metadata": {
+            "ratingKey": rk, "viewOffset": 500, "duration": 1000}}).encode()
+        boundary = "------------------------abc123"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"payload\"\r\n"
+                f"Content-Type: application/json\r\n\r\n").encode() + payload
+        body += (f"\r\n--{boundary}\r\nContent-Disposition: form-data; name=\"thumb\"; "
+                 f"filename=\"thumb.jpg\"\r\nContent-Type: image/jpeg\r\n\r\n").encode()
+        body += b"\xff\xd8\xff\x00binary" + f"\r\n--{boundary}--\r\n".encode()
+        return f"multipart/form-data; boundary={boundary}", body
+
+    def test_each_server_format_is_read(self):
+        ptc.metadata_cache.put("42", {"path": "/media/Movies/movie.mkv"})
+        event = ptc.parse_webhook(*self.plex_body("media.play", "42"))
+        self.assertEqual((event["service"], event["kind"], event["path"], event["progress"]),
+                         ("plex", "play", "/media/Movies/movie.mkv", 0.5))
+
+        emby = {"Event": "playback.stop", "User": {"Id": "u"},
+                "Item": {"Path": "/media/show.mkv", "Id": "9", "RunTimeTicks": 100},
+                "PlaybackInfo": {"PositionTicks": 95}}
+        event = ptc.parse_webhook("application/json", json.dumps(emby).encode())
+        self.assertEqual((event["service"], event["kind"], event["path"], event["progress"]),
+                         ("emby", "stop", "/media/show.mkv", 0.95))
+
+        jellyfin = {"NotificationType": "PlaybackStart", "ItemId": "3",
+                    "ItemPath": "/media/film.mkv"}
+        event = ptc.parse_webhook("application/json", json.dumps(jellyfin).encode())
+        self.assertEqual((event["service"], event["kind"], event["path"]),
+                         ("jellyfin", "play", "/media/film.mkv"))
+
+        self.assertIsNone(ptc.parse_webhook("application/json", b'{"event": "library.new"}'))
+        with self.assertRaises(ValueError):
+            ptc.parse_webhook("application/json", b"not json")
+
+    def test_a_play_counts_until_the_poll_has_it(self):
+        ptc.webhook_receiver.offer({"service": "emby", "kind": "play", "path": "/media/a.mkv",
+                                    "id": "1", "user": "u", "progress": 0.0})
+        self.assertTrue(ptc._stream_wake.is_set())
+        self.assertTrue(ptc.apply_webhook_events())
+        self.assertFalse(ptc.apply_webhook_events(), "the queue is drained")
+        self.assertIn("/media/a.mkv", ptc.merge_webhook_sessions({}))
+
+        polled = {"/media/a.mkv": {"service": "emby", "id": "1", "progress": 0.1}}
+        self.assertEqual(ptc.merge_webhook_sessions(polled), polled)
+        self.assertNotIn("/media/a.mkv", ptc._webhook_sessions, "the poll took over")
+
+    def test_a_stop_ends_the_stream_with_its_final_position(self):
+        session = {"service": "emby", "id": "1", "progress": 0.5}
+        ptc._last_polled["emby"] = {"/media/a.mkv": session}
+        ptc._webhook_sessions["/media/b.mkv"] = ({"service": "emby", "id": "2"}, time.monotonic())
+        for path, progress in (("/media/a.mkv", 0.97), ("/media/b.mkv", 0.2)):
+            ptc.webhook_receiver.offer({"service": "emby", "kind": "stop", "path": path,
+                                        "id": None, "user": None, "progress": progress})
+        ptc.apply_webhook_events()
+        self.assertEqual(session["progress"], 0.97)
+        self.assertEqual(ptc.merge_webhook_sessions({}), {})
+
+    def test_no_token_no_listener(self):
+        configure(ENABLE_WEBHOOK="True", WEBHOOK_PORT="0", WEBHOOK_TOKEN="")
+        receiver = ptc.WebhookReceiver()
+        receiver.sync()
+        self.addCleanup(receiver.stop)
+        self.assertIsNone(receiver.snapshot())
+
+    def test_a_stalled_client_does_not_hold_up_the_others(self):
+        configure(ENABLE_WEBHOOK="True", WEBHOOK_PORT="0", WEBHOOK_TOKEN="s3cret",
+                  WEBHOOK_BIND="127.0.0.1")
+        receiver = ptc.WebhookReceiver()
+        receiver.sync()
+        self.addCleanup(receiver.stop)
+        port = receiver.snapshot()["port"]
+        stalled = socket.create_connection(("127.0.0.1", port))
+        self.addCleanup(stalled.close)
+        stalled.sendall(b"POST /?token=s3cret HTTP/1.1\r\nContent-Le")
+
+        started = time.monotonic()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("POST", "/?token=s3cret", b'{"NotificationType": "PlaybackStart"}',
+                     {"Content-Type": "application/json"})
+        self.assertEqual(conn.getresponse().status, 202)
+        conn.close()
+        self.assertLess(time.monotonic() - started, 2, "not served after the stalled one")
+
+    def test_paths_are_resolved_before_use(self):
+        ptc.webhook_receiver.offer({"service": "emby", "kind": "play",
+                                    "path": "/mnt/user/../boot/config/x.mkv",
+                                    "id": "1", "user": "u", "progress": 0.0})
+        ptc.apply_webhook_events()
+        self.assertEqual(list(ptc._webhook_sessions), ["/mnt/boot/config/x.mkv"])
+
+    def test_an_unconfirmed_play_expires(self):
+        ptc._webhook_sessions["/media/a.mkv"] = ({"service": "plex", "id": "1"},
+                                                 time.monotonic() - ptc.WEBHOOK_GRACE - 1)
+        self.assertEqual(ptc.merge_webhook_sessions({}), {})
+
+    def test_the_listener_bounds_size_and_queue(self):
+        configure(ENABLE_WEBHOOK="True", WEBHOOK_PORT="0", WEBHOOK_TOKEN="s3cret",
+                  WEBHOOK_BIND="127.0.0.1")
+        with mock.patch.object(ptc, 'WEBHOOK_QUEUE', 1), \
+             mock.patch.object(ptc, 'WEBHOOK_MAX_BODY', 4096):
+            receiver = ptc.WebhookReceiver()
+            receiver.sync()
+        self.addCleanup(receiver.stop)
+        port = receiver.snapshot()["port"]
+
+        def post(content_type, body, length=None, url="/?token=s3cret"):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.putrequest("POST", url)
+            conn.putheader("Content-Type", content_type)
+            conn.putheader("Content-Length", str(len(body) if length is None else length))
+            conn.endheaders()
+            conn.send(body)
+            status = conn.getresponse().status
+            conn.close()
+            return status
+
+        play = json.dumps({"NotificationType": "PlaybackStart", "ItemId": "3"}).encode()
+        with mock.patch.object(ptc, 'WEBHOOK_MAX_BODY', 4096):
+            self.assertEqual(post("application/json", play), 202)
+            self.assertEqual(post("application/json", play), 503, "the queue is full")
+            self.assertEqual(post("application/json", b"x", length=10 ** 9), 413)
+            self.assertEqual(post("application/json", b"{oops"), 400)
+            self.assertEqual(post("application/json", play, url="/"), 403)
+            self.assertEqual(post("application/json", play, url="/?token=guess"), 403)
+        self.assertEqual(receiver.events.qsize(), 1)
+        stats = receiver.snapshot()
+        self.assertEqual((stats["received"], stats["dropped"], stats["rejected"]), (1, 1, 4))
+
+        configure(ENABLE_WEBHOOK="False")
+        receiver.sync()
+        self.assertIsNone(receiver.snapshot())
+
+
+class Shutdown(unittest.TestCase):
+    """A stop signal only flags the stop; the main loop saves on its way out."""
+
+    def test_a_signal_inside_a_locked_section_does_not_deadlock(self):
+        self.addCleanup(ptc._stream_wake.clear)
+        self.addCleanup(ptc._shutting_down.clear)
+        with ptc.metadata_cache._lock, ptc.access_history._lock, \
+             mock.patch.object(ptc, '_shutdown_cleanup') as cleanup:
+            ptc._request_shutdown(ptc.signal.SIGTERM, None)
+        cleanup.assert_not_called()
+        self.assertTrue(ptc._shutting_down.is_set())
+        self.assertTrue(ptc._stream_wake.is_set(), "the main loop wakes up to leave")
+
+
+class MetadataCaching(unittest.TestCase):
+    """Plex lookups are kept, least recently used first out, and survive a
+    restart."""
+
+    def setUp(self):
+        configure(PLEX_URL="http://plex:32400")
+        self.cache = ptc.MetadataCache()
+        patcher = mock.patch.object(ptc, 'metadata_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_least_recently_used_goes_first(self):
+        with mock.patch.object(ptc, 'METADATA_CACHE_LIMIT', 2):
+            self.cache.put("1", {"path": "/a.mkv"})
+            self.cache.put("2", {"path": "/b.mkv"})
+            self.assertEqual(self.cache.path("1"), "/a.mkv")
+            self.cache.put("3", {"path": "/c.mkv"})
+        self.assertEqual(self.cache.lookup("2"), (False, None))
+        self.assertEqual(self.cache.path("1"), "/a.mkv")
+        self.assertEqual(self.cache.snapshot(), {"entries": 2, "hits": 2, "misses": 1})
+
+    def test_entries_expire(self):
+        with mock.patch.object(ptc, 'METADATA_TTL', -1):
+            self.cache.put("1", {"path": "/a.mkv"})
+        self.assertEqual(self.cache.lookup("1"), (False, None))
+        self.assertEqual(self.cache.snapshot()["entries"], 0)
+
+    def test_an_item_without_a_file_is_not_looked_up_every_poll(self):
+        sessions = {"MediaContainer": {"Metadata": [{"ratingKey": "5", "duration": 10}]}}
+        answers = {"http://plex:32400/status/sessions": sessions,
+                   "http://plex:32400/library/metadata/5": {"MediaContainer": {"Metadata": [{}]}}}
+        with mock.patch.object(ptc, 'api_get', side_effect=lambda url, h: answers[url]) as api:
+            self.assertEqual(ptc._poll_plex(), {})
+            self.assertEqual(ptc._poll_plex(), {})
+        urls = [c.args[0] for c in api.call_args_list]
+        self.assertEqual(urls.count("http://plex:32400/library/metadata/5"), 1)
+
+    def test_a_session_path_is_remembered(self):
+        sessions = {"MediaContainer": {"Metadata": [{"ratingKey": "5", "Media": [
+            {"Part": [{"file": "/media/a.mkv"}]}]}]}}
+        with mock.patch.object(ptc, 'api_get', return_value=sessions):
+            self.assertIn("/media/a.mkv", ptc._poll_plex())
+        self.assertEqual(self.cache.path("5"), "/media/a.mkv")
+
+    def test_is_watched_asks_plex_every_time(self):
+        unwatched = {"MediaContainer": {"Metadata": [{"viewCount": 0}]}}
+        self.cache.put("7", {"path": "/a.mkv", "viewCount": 1})
+        with mock.patch.object(ptc, 'api_get', return_value=unwatched) as api:
+            self.assertFalse(ptc.is_watched({"service": "plex", "id": "7", "progress": None}),
+                             "marked as unwatched since it was cached")
+            self.assertFalse(ptc.is_watched({"service": "plex", "id": "7", "progress": None}))
+        self.assertEqual(api.call_count, 2)
+        self.assertEqual(self.cache.lookup("7")[1]["viewCount"], 0)
+
+    def test_a_cache_file_that_is_not_an_object_is_ignored(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, "metadata.json")
+        Path(path).write_text("[1, 2]")
+        with mock.patch.object(ptc, 'METADATA_CACHE_FILE', path):
+            restarted = ptc.MetadataCache()
+            restarted.load()
+        self.assertEqual(restarted.lookup("1"), (False, None))
+
+    def test_entries_survive_a_restart(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with mock.patch.object(ptc, 'METADATA_CACHE_FILE', os.path.join(tmp, "metadata.json")):
+            self.cache.put("1", {"path": "/a.mkv", "viewCount": 2})
+            self.cache.put("2", None)
+            with mock.patch.object(ptc, 'METADATA_TTL', -1):
+                self.cache.put("3", {"path": "/gone.mkv"})
+            self.cache.save()
+            restarted = ptc.MetadataCache()
+            restarted.load()
+        self.assertEqual(restarted.lookup("1"), (True, {"path": "/a.mkv", "viewCount": 2}))
+        self.assertEqual(restarted.lookup("2"), (True, None))
+        self.assertEqual(restarted.lookup("3"), (False, None), "expired entries stay behind")
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)